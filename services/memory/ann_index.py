@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+OMAC Approximate Nearest-Neighbour Index
+Inverted-file (IVF) index over the shared float32 embedding matrix
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import structlog
+
+from vector_index import VectorIndex
+
+logger = structlog.get_logger()
+
+
+class IVFIndex(VectorIndex):
+    """
+    IVF (inverted file) approximate index for OMAC memory search
+
+    Embeddings live in the same contiguous matrix as the exact index. Once
+    enough items have been stored, spherical k-means partitions them into
+    `nlist` cells; every insert afterwards is assigned to its nearest
+    centroid. A query scores the centroids, then only the rows of the
+    `nprobe` closest cells, so `nprobe` is the per-query recall/latency knob:
+    1 is fastest, `nlist` is equivalent to an exact scan.
+
+    Until the first training pass completes, searches fall back to an exact
+    scan, so results are always available.
+    """
+
+    def __init__(self, dimensions: int, max_items: int, nlist: int = 256, nprobe: int = 8,
+                 train_size_per_list: int = 64, initial_capacity: int = 1024):
+        super().__init__(dimensions, max_items, initial_capacity)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size_per_list = train_size_per_list
+        # FAISS' rule of thumb: k-means needs ~39 points per centroid to be stable
+        self.min_train_size = nlist * 39
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._assignments = np.full(self.capacity, -1, dtype=np.int32)
+        self._training = False
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    def _reserve(self, rows: int):
+        super()._reserve(rows)
+        if self._assignments.shape[0] < self.capacity:
+            grown = np.full(self.capacity, -1, dtype=np.int32)
+            grown[:self._assignments.shape[0]] = self._assignments
+            self._assignments = grown
+
+    def _assign(self, normalized: np.ndarray, centroids: np.ndarray, chunk: int = 16384) -> np.ndarray:
+        """Nearest-centroid (max inner product) cell for each row, in chunks"""
+        cells = np.empty(len(normalized), dtype=np.int32)
+        for start in range(0, len(normalized), chunk):
+            cells[start:start + chunk] = np.argmax(normalized[start:start + chunk] @ centroids.T, axis=1)
+        return cells
+
+    def start_training(self, force: bool = False) -> bool:
+        """
+        Train (or retrain, with `force`) on a background thread; returns False
+        if a pass is already running or there is not enough data yet
+        """
+        with self._lock:
+            if self._training or (self.trained and not force):
+                return False
+            if self._size < (self.nlist if force else self.min_train_size):
+                return False
+            self._training = True
+        threading.Thread(target=self.train, name='omac-ivf-train', daemon=True).start()
+        return True
+
+    def _index_rows(self, positions: np.ndarray, normalized: np.ndarray):
+        if self._centroids is None:
+            if not self._training and self._size + len(positions) >= self.min_train_size:
+                self._training = True
+                threading.Thread(target=self.train, name='omac-ivf-train', daemon=True).start()
+            return
+
+        cells = self._assign(normalized, self._centroids)
+        for position, cell in zip(positions.tolist(), cells.tolist()):
+            previous = self._assignments[position]
+            if previous == cell:
+                continue
+            if previous >= 0:
+                self._lists[previous].remove(position)
+            self._lists[cell].append(position)
+            self._assignments[position] = cell
+
+    def _kmeans(self, sample: np.ndarray, k: int, iterations: int = 12, seed: int = 0) -> np.ndarray:
+        """Spherical k-means over unit vectors; returns unit-length centroids"""
+        rng = np.random.default_rng(seed)
+        centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+        for _ in range(iterations):
+            cells = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, cells, sample)
+            empty = np.flatnonzero(np.bincount(cells, minlength=k) == 0)
+            if empty.size:
+                # Re-seed empty cells from random points so every list is used
+                sums[empty] = sample[rng.choice(len(sample), empty.size, replace=False)]
+            centroids = self._normalize(sums)
+        return centroids
+
+    def train(self):
+        """(Re)build centroids from a sample of stored rows and reassign every row"""
+        started = time.perf_counter()
+        try:
+            with self._lock:
+                vectors, size = self._vectors, self._size
+            if size < self.nlist:
+                return
+
+            rng = np.random.default_rng()
+            sample_size = min(size, self.nlist * self.train_size_per_list)
+            sample = vectors[np.sort(rng.choice(size, sample_size, replace=False))]
+            centroids = self._kmeans(sample, self.nlist)
+            cells = self._assign(vectors[:size], centroids)
+
+            with self._lock:
+                # Rows stored while k-means was running are assigned here
+                if self._size > size:
+                    cells = np.concatenate([cells, self._assign(self._vectors[size:self._size], centroids)])
+                self._install(centroids, cells)
+                self._version += 1
+
+            logger.info("IVF index trained", items=len(cells), nlist=self.nlist,
+                       duration_ms=round((time.perf_counter() - started) * 1000, 1))
+        except Exception as e:
+            logger.error("IVF index training failed", error=str(e))
+        finally:
+            self._training = False
+
+    def _install(self, centroids: np.ndarray, cells: np.ndarray):
+        """Replace centroids and rebuild inverted lists from per-row cell IDs"""
+        order = np.argsort(cells, kind='stable')
+        bounds = np.searchsorted(cells[order], np.arange(self.nlist + 1))
+        self._lists = [order[bounds[c]:bounds[c + 1]].tolist() for c in range(self.nlist)]
+        self._assignments[:len(cells)] = cells
+        self._centroids = centroids
+
+    def _candidate_rows(self, query: np.ndarray, size: int, nprobe: Optional[int] = None,
+                        **options) -> Optional[np.ndarray]:
+        centroids, lists = self._centroids, self._lists
+        if centroids is None:
+            return None
+
+        nprobe = max(1, min(int(nprobe or self.nprobe), self.nlist))
+        if nprobe >= self.nlist:
+            return None
+        probe = np.argpartition(centroids @ query, -nprobe)[-nprobe:]
+        rows = np.fromiter((r for c in probe for r in lists[c]), dtype=np.int64)
+        # Rows appended after the caller's snapshot are not visible yet
+        return rows[rows < size]
+
+    def recall_at_k(self, k: int = 10, nprobe_values: Sequence[int] = (1, 4, 8, 16, 32),
+                    samples: int = 100) -> Dict[str, Any]:
+        """
+        Measure recall@k of the IVF path against the exact scan, using
+        randomly chosen stored embeddings as queries
+        """
+        with self._lock:
+            vectors, size = self._vectors, self._size
+        if size == 0:
+            return {'k': k, 'samples': 0, 'trained': self.trained, 'results': []}
+
+        rng = np.random.default_rng()
+        queries = vectors[rng.choice(size, min(samples, size), replace=False)]
+
+        exact_ids, exact_ms = [], 0.0
+        for query in queries:
+            started = time.perf_counter()
+            exact_ids.append({r['id'] for r, _ in self.search(query, k, -1.0, exact=True)})
+            exact_ms += (time.perf_counter() - started) * 1000
+
+        results = []
+        for nprobe in nprobe_values:
+            hits, ann_ms = 0, 0.0
+            for query, truth in zip(queries, exact_ids):
+                started = time.perf_counter()
+                found = {r['id'] for r, _ in self.search(query, k, -1.0, nprobe=nprobe)}
+                ann_ms += (time.perf_counter() - started) * 1000
+                hits += len(found & truth)
+            results.append({
+                'nprobe': int(nprobe),
+                'recall': round(hits / max(1, sum(len(t) for t in exact_ids)), 4),
+                'mean_latency_ms': round(ann_ms / len(queries), 3)
+            })
+
+        return {
+            'k': k,
+            'samples': len(queries),
+            'trained': self.trained,
+            'exact_mean_latency_ms': round(exact_ms / len(queries), 3),
+            'results': results
+        }
+
+    def _state(self, size: int) -> Dict[str, np.ndarray]:
+        state = super()._state(size)
+        if self._centroids is not None:
+            state['centroids'] = self._centroids
+            state['assignments'] = self._assignments[:size]
+        return state
+
+    def _restore_state(self, arrays: Dict[str, np.ndarray]):
+        self._centroids, self._lists = None, []
+        self._assignments = np.full(self.capacity, -1, dtype=np.int32)
+        centroids = arrays.get('centroids')
+        if centroids is not None and centroids.shape == (self.nlist, self.dimensions):
+            self._install(centroids.astype(np.float32), arrays['assignments'].astype(np.int32))
+        elif centroids is not None:
+            logger.warning("Discarding IVF centroids with mismatched shape",
+                          shape=list(centroids.shape), nlist=self.nlist)
+
+    def load(self, path: str) -> bool:
+        loaded = super().load(path)
+        if loaded:
+            self.start_training()
+        return loaded
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({
+            'mode': 'ivf',
+            'trained': self.trained,
+            'nlist': self.nlist,
+            'default_nprobe': self.nprobe,
+            'min_train_size': self.min_train_size
+        })
+        return stats
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+OMAC Embedding Service
+Lazily-loaded sentence-transformers model behind a micro-batching queue
+and an LRU cache keyed by content hash
+"""
+
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+
+from metrics import (EMBEDDING_BATCH_DURATION, EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE_LOOKUPS,
+                     EMBEDDING_QUEUE_DEPTH)
+
+logger = structlog.get_logger()
+
+
+def content_hash(text: str) -> str:
+    """Stable cache key for a piece of content"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Thread-safe LRU mapping content hash -> read-only float32 embedding"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._items.get(key)
+            if vector is None:
+                self.misses += 1
+            else:
+                self._items.move_to_end(key)
+                self.hits += 1
+        EMBEDDING_CACHE_LOOKUPS.labels('miss' if vector is None else 'hit').inc()
+        return vector
+
+    def put(self, key: str, vector: np.ndarray):
+        if self.max_size <= 0:
+            return
+        vector.setflags(write=False)
+        with self._lock:
+            self._items[key] = vector
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class EmbeddingService:
+    """
+    Computes embeddings for OMAC store and search requests
+
+    Concurrent callers enqueue texts; a single worker thread drains the queue
+    into batches of up to `max_batch_size`, waiting at most `max_wait_ms`
+    after the first text for more to arrive, and runs one forward pass per
+    batch. Identical content is served from the cache or coalesced onto the
+    in-flight request, so duplicates never reach the model. The model is only
+    loaded when the first text is embedded.
+    """
+
+    def __init__(self, model_name: str, dimensions: int, max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, cache_size: int = 1000):
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.cache = EmbeddingCache(cache_size)
+
+        self._model = None
+        self._queue: 'queue.Queue[Tuple[str, str]]' = queue.Queue()
+        self._pending: Dict[str, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+        self.batches = 0
+        self.batched_texts = 0
+        self.max_observed_batch = 0
+
+    @property
+    def model_loaded(self) -> bool:
+        return self._model is not None
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='omac-embedding-batcher', daemon=True)
+                self._worker.start()
+
+    def _load_model(self):
+        if self._model is None:
+            started = time.perf_counter()
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+            logger.info("Embedding model loaded", model=self.model_name,
+                       duration_ms=round((time.perf_counter() - started) * 1000, 1))
+        return self._model
+
+    def _submit(self, key: str, text: str) -> Future:
+        """Future for one text, coalescing with an identical in-flight request"""
+        with self._pending_lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = Future()
+                self._pending[key] = future
+                self._queue.put((key, text))
+                EMBEDDING_QUEUE_DEPTH.inc()
+        self._ensure_worker()
+        return future
+
+    def _next_batch(self) -> List[Tuple[str, str]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        EMBEDDING_QUEUE_DEPTH.dec(len(batch))
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            keys = [key for key, _ in batch]
+            try:
+                model = self._load_model()
+                started = time.perf_counter()
+                vectors = model.encode([text for _, text in batch], batch_size=len(batch),
+                                       convert_to_numpy=True, show_progress_bar=False)
+                vectors = np.asarray(vectors, dtype=np.float32)
+                EMBEDDING_BATCH_DURATION.observe(time.perf_counter() - started)
+                EMBEDDING_BATCH_SIZE.observe(len(batch))
+                self.batches += 1
+                self.batched_texts += len(batch)
+                self.max_observed_batch = max(self.max_observed_batch, len(batch))
+                # Own copies: a row view would pin the whole batch matrix in the cache
+                results = [(key, vectors[i].copy(), None) for i, key in enumerate(keys)]
+            except Exception as e:
+                logger.error("Embedding batch failed", batch_size=len(batch), error=str(e))
+                results = [(key, None, e) for key in keys]
+
+            for key, vector, error in results:
+                if vector is not None:
+                    self.cache.put(key, vector)
+                with self._pending_lock:
+                    future = self._pending.pop(key, None)
+                if future is not None:
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(vector)
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embedding for one text; blocks until its batch has been computed"""
+        key = content_hash(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        return self._submit(key, text).result()
+
+    def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        """Embeddings for many texts as an (n, dimensions) float32 matrix"""
+        vectors = np.empty((len(texts), self.dimensions), dtype=np.float32)
+        waiting = []
+        for i, text in enumerate(texts):
+            key = content_hash(text)
+            cached = self.cache.get(key)
+            if cached is not None:
+                vectors[i] = cached
+            else:
+                waiting.append((i, self._submit(key, text)))
+        for i, future in waiting:
+            vectors[i] = future.result()
+        return vectors
+
+    def stats(self) -> Dict[str, Any]:
+        """Batching and cache counters for status endpoints"""
+        lookups = self.cache.hits + self.cache.misses
+        return {
+            'model': self.model_name,
+            'model_loaded': self.model_loaded,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'batches': self.batches,
+            'mean_batch_size': round(self.batched_texts / self.batches, 2) if self.batches else 0.0,
+            'max_observed_batch': self.max_observed_batch,
+            'queue_depth': self._queue.qsize(),
+            'cache': {
+                'size': len(self.cache),
+                'max_size': self.cache.max_size,
+                'hits': self.cache.hits,
+                'misses': self.cache.misses,
+                'hit_rate': round(self.cache.hits / lookups, 4) if lookups else 0.0
+            }
+        }
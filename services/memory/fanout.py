@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+OMAC Concurrent Fan-Out
+Runs per-target coordination calls in parallel with per-target timeouts
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+import structlog
+
+logger = structlog.get_logger()
+
+
+class FanOut:
+    """
+    Bounded thread pool for cross-service and MCP fan-out
+
+    Every target's call is submitted at once, so the request takes about as
+    long as the slowest target rather than the sum of all of them. Targets
+    that fail or exceed the timeout are reported individually alongside the
+    ones that succeeded. One keep-alive HTTP session is shared by all calls.
+    """
+
+    def __init__(self, max_workers: int = 16, timeout: float = 10.0):
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='omac-fanout')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post_json(self, url: str, payload: Dict[str, Any], timeout: float,
+                  headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """POST a JSON payload and return the decoded body (or {} if not JSON)"""
+        response = self.session.post(url, json=payload, timeout=timeout, headers=headers)
+        response.raise_for_status()
+        try:
+            return response.json()
+        except ValueError:
+            return {}
+
+    def _timed(self, call: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            body = call()
+            return {'status': 'success', 'body': body, 'elapsed': time.perf_counter() - started}
+        except Exception as e:
+            return {'status': 'failed', 'error': str(e), 'elapsed': time.perf_counter() - started}
+
+    def run(self, calls: Dict[str, Optional[Callable[[], Dict[str, Any]]]],
+            timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Run one call per target concurrently. A target mapped to None has no
+        configured endpoint and is reported as 'unconfigured' without a call.
+        Results keep the order of `calls`.
+        """
+        timeout = timeout or self.timeout
+        started = time.perf_counter()
+        futures = {name: self.executor.submit(self._timed, call) for name, call in calls.items() if call}
+        wait(list(futures.values()), timeout=timeout)
+
+        results = []
+        for name in calls:
+            future = futures.get(name)
+            if future is None:
+                outcome = {'status': 'unconfigured', 'error': 'No endpoint configured', 'elapsed': 0.0}
+            elif future.done():
+                outcome = future.result()
+            else:
+                # The worker keeps running until its own HTTP timeout fires; we stop waiting now
+                outcome = {'status': 'timeout', 'error': f'No response within {timeout}s',
+                           'elapsed': time.perf_counter() - started}
+
+            elapsed_ms = round(outcome['elapsed'] * 1000, 1)
+            result = {
+                'target': name,
+                'status': outcome['status'],
+                'response_time': f"{elapsed_ms:.0f}ms",
+                'response_time_ms': elapsed_ms,
+                'timestamp': datetime.now().isoformat()
+            }
+            if 'error' in outcome:
+                result['error'] = outcome['error']
+            if isinstance(outcome.get('body'), dict):
+                result['items_processed'] = outcome['body'].get('items_processed')
+            results.append(result)
+
+        logger.info("Fan-out completed", targets=len(calls),
+                   succeeded=sum(1 for r in results if r['status'] == 'success'),
+                   duration_ms=round((time.perf_counter() - started) * 1000, 1))
+        return results
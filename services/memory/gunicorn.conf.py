@@ -0,0 +1,32 @@
+# Gunicorn settings for the memory service
+#   PROMETHEUS_MULTIPROC_DIR=/tmp/omac-metrics gunicorn -c gunicorn.conf.py 'memory_api:create_app()'
+#
+# With PROMETHEUS_MULTIPROC_DIR set, each worker writes its metrics to files
+# in that directory and /metrics aggregates them, whichever worker answers.
+#
+# Without pgvector each worker would hold its own in-process index and its
+# snapshots would replace the others', so the in-process mode runs one worker.
+
+import os
+import shutil
+
+bind = f"0.0.0.0:{os.getenv('PORT', '3003')}"
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+if os.getenv('PGVECTOR_ENABLED', 'true').lower() != 'true':
+    workers = 1
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+
+
+def on_starting(server):
+    # Files left by a previous run would be merged into this one's counters
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
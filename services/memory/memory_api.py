@@ -5,14 +5,30 @@ AI Memory Coordination Layer with Semantic Search and MCP Integration
 """
 
 import os
+import re
 import sys
+import json
+import base64
+import binascii
+import time
+import uuid
+import atexit
 import logging
+import threading
 from datetime import datetime
 from typing import Dict, List, Optional, Any
-from flask import Flask, request, jsonify, g
+from flask import Flask, Response, request, jsonify, g, stream_with_context
 from flask_cors import CORS
+import numpy as np
 import structlog
 
+from vector_index import VectorIndex, IndexFullError
+from ann_index import IVFIndex
+from embeddings import EmbeddingService
+from fanout import FanOut
+import metrics
+import tracing
+
 # Add the dependencies path for SPELWork integration
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'dependencies'))
 
@@ -23,6 +39,13 @@ except ImportError:
     print("SPELWork integration not available - running without ethical framework")
     ETHICS_AVAILABLE = False
 
+try:
+    from webhook_outbox import WebhookOutbox
+    OUTBOX_AVAILABLE = True
+except ImportError:
+    print("aiohttp not available - memory events will not be delivered to n8n")
+    OUTBOX_AVAILABLE = False
+
 # Configure structured logging
 structlog.configure(
     processors=[
@@ -43,6 +66,38 @@ structlog.configure(
 
 logger = structlog.get_logger()
 
+# Fan-out operations are interpolated into target URLs
+_OPERATION_NAME = re.compile(r'^[a-z_]+$')
+
+# Upper bounds for /api/memory/index/recall, which runs synchronously on the request thread
+RECALL_MAX_K = 100
+RECALL_MAX_SAMPLES = 1000
+RECALL_MAX_NPROBE_VALUES = 8
+
+def format_result(record: Dict[str, Any], score: float) -> Dict[str, Any]:
+    """Public JSON shape of a search hit"""
+    return {
+        'id': record['id'],
+        'content': record['content'],
+        'source': record['source'],
+        'similarity_score': score,
+        'timestamp': record['timestamp'],
+        'metadata': record['metadata']
+    }
+
+def encode_cursor(score: float, memory_id: str) -> str:
+    """Opaque pagination cursor carrying the last (score, id) returned"""
+    payload = json.dumps({'s': float(score), 'i': memory_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError on malformed input"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(payload['s']), str(payload['i'])
+    except (KeyError, TypeError, UnicodeError, binascii.Error, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
 class TwinningMemoryService:
     """
     OMAC (Online Memory Access Coordinator) for Twinning
@@ -58,7 +113,14 @@ class TwinningMemoryService:
         self.app = Flask(__name__)
         self.setup_cors()
         self.setup_config()
+        self.setup_tracing()
         self.setup_ethics()
+        self.setup_embeddings()
+        self.setup_index()
+        self.setup_cache()
+        self.setup_outbox()
+        self.fanout = FanOut(max_workers=self.config['fanout_max_workers'],
+                             timeout=self.config['fanout_timeout'])
         self.setup_routes()
         
         logger.info("Twinning Memory Service (OMAC) initialized", 
@@ -76,25 +138,91 @@ class TwinningMemoryService:
             'service_name': os.getenv('SERVICE_NAME', 'memory'),
             'database_url': os.getenv('DATABASE_URL', 'postgresql://localhost:5432/twinning_memory'),
             'pgvector_enabled': os.getenv('PGVECTOR_ENABLED', 'true').lower() == 'true',
+            'pgvector_index_type': os.getenv('PGVECTOR_INDEX_TYPE', 'hnsw').lower(),
+            'pgvector_hnsw_m': int(os.getenv('PGVECTOR_HNSW_M', '16')),
+            'pgvector_hnsw_ef_construction': int(os.getenv('PGVECTOR_HNSW_EF_CONSTRUCTION', '64')),
+            'pgvector_ivfflat_lists': int(os.getenv('PGVECTOR_IVFFLAT_LISTS', '100')),
+            'db_pool_min': int(os.getenv('DB_POOL_MIN', '1')),
+            'db_pool_max': int(os.getenv('DB_POOL_MAX', '10')),
+            'db_pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '5')),
+            'index_mode': os.getenv('INDEX_MODE', 'exact').lower(),
+            'ivf_nlist': int(os.getenv('IVF_NLIST', '256')),
+            'ivf_nprobe': int(os.getenv('IVF_NPROBE', '8')),
+            'index_data_dir': os.getenv('INDEX_DATA_DIR', '/app/data'),
+            'index_persist_interval': int(os.getenv('INDEX_PERSIST_INTERVAL', '60')),
             'redis_enabled': os.getenv('REDIS_ENABLED', 'true').lower() == 'true',
+            'redis_url': os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+            'search_cache_ttl': int(os.getenv('SEARCH_CACHE_TTL', '300')),
+            'search_cache_max_entries': int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '1000')),
             'semantic_search_enabled': os.getenv('SEMANTIC_SEARCH_ENABLED', 'true').lower() == 'true',
             'ethics_enabled': os.getenv('ETHICS_ENABLED', 'true').lower() == 'true' and ETHICS_AVAILABLE,
             'mcp_servers_enabled': os.getenv('MCP_SERVERS_ENABLED', 'true').lower() == 'true',
             'embedding_model': os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2'),
+            'vector_dimensions': int(os.getenv('VECTOR_DIMENSIONS', '384')),
+            'embedding_batch_size': int(os.getenv('EMBEDDING_BATCH_SIZE', '32')),
+            'embedding_batch_wait_ms': float(os.getenv('EMBEDDING_BATCH_WAIT_MS', '5')),
+            'embedding_cache_size': int(os.getenv('EMBEDDING_CACHE_SIZE', '1000')),
+            'ingest_chunk_size': int(os.getenv('INGEST_CHUNK_SIZE', '256')),
+            'search_stream_page_size': int(os.getenv('SEARCH_STREAM_PAGE_SIZE', '100')),
+            'ingest_max_chunk_size': int(os.getenv('INGEST_MAX_CHUNK_SIZE', '2048')),
             'similarity_threshold': float(os.getenv('SIMILARITY_THRESHOLD', '0.7')),
             'max_memory_items': int(os.getenv('MAX_MEMORY_ITEMS', '100000')),
             'twinning_core_url': os.getenv('TWINNING_CORE_URL', 'http://localhost:3000'),
             'intelligence_service_url': os.getenv('INTELLIGENCE_SERVICE_URL', 'http://localhost:3002'),
-            'social_service_url': os.getenv('SOCIAL_SERVICE_URL', 'http://localhost:3001')
+            'social_service_url': os.getenv('SOCIAL_SERVICE_URL', 'http://localhost:3001'),
+            'mcp_server_urls': {
+                'apple': os.getenv('MCP_APPLE_SERVER_URL'),
+                'notion': os.getenv('MCP_NOTION_SERVER_URL'),
+                'github': os.getenv('MCP_GITHUB_SERVER_URL'),
+                'rss': os.getenv('MCP_RSS_SERVER_URL')
+            },
+            'fanout_max_workers': int(os.getenv('FANOUT_MAX_WORKERS', '16')),
+            'fanout_timeout': float(os.getenv('FANOUT_TIMEOUT_SECONDS', '10')),
+            'fanout_operations': frozenset(
+                op.strip() for op in os.getenv('FANOUT_OPERATIONS', 'sync,status').split(',') if op.strip()),
+            'webhook_outbox_enabled': os.getenv('WEBHOOK_OUTBOX_ENABLED', 'true').lower() == 'true' and OUTBOX_AVAILABLE,
+            'webhook_base_url': f"{os.getenv('N8N_PROTOCOL', 'http')}://{os.getenv('N8N_HOST', 'n8n.localhost')}/webhook/",
+            'webhook_outbox_workers': int(os.getenv('WEBHOOK_OUTBOX_WORKERS', '4')),
+            'webhook_outbox_batch_size': int(os.getenv('WEBHOOK_OUTBOX_BATCH_SIZE', '50')),
+            'webhook_outbox_max_attempts': int(os.getenv('WEBHOOK_OUTBOX_MAX_ATTEMPTS', '8')),
+            'metrics_enabled': os.getenv('METRICS_ENABLED', 'true').lower() == 'true',
+            'metrics_path': os.getenv('PROMETHEUS_METRICS_PATH', '/metrics'),
+            'tracing_enabled': os.getenv('TRACING_ENABLED', 'false').lower() == 'true',
+            'tracing_sample_rate': float(os.getenv('TRACING_SAMPLE_RATE', '0.1')),
+            'tracing_exporter': os.getenv('TRACING_EXPORTER', 'console').lower(),
+            'tracing_file': os.getenv('TRACING_FILE', os.path.join(os.getenv('INDEX_DATA_DIR', '/app/data'), 'traces.jsonl'))
         }
+        self.config['service_urls'] = {
+            'intelligence': self.config['intelligence_service_url'],
+            'social': self.config['social_service_url'],
+            'core': self.config['twinning_core_url']
+        }
+        
+        if self.config['pgvector_index_type'] not in ('hnsw', 'ivfflat'):
+            logger.warning("Unknown PGVECTOR_INDEX_TYPE, falling back to hnsw",
+                          index_type=self.config['pgvector_index_type'])
+            self.config['pgvector_index_type'] = 'hnsw'
+        
+        if self.config['index_mode'] not in ('exact', 'ivf'):
+            logger.warning("Unknown INDEX_MODE, falling back to exact", index_mode=self.config['index_mode'])
+            self.config['index_mode'] = 'exact'
         
         logger.info("Configuration loaded", config_summary={
             'pgvector_enabled': self.config['pgvector_enabled'],
+            'index_mode': self.config['index_mode'],
             'semantic_search_enabled': self.config['semantic_search_enabled'],
             'ethics_enabled': self.config['ethics_enabled'],
             'mcp_servers_enabled': self.config['mcp_servers_enabled']
         })
     
+    def setup_tracing(self):
+        """Opt-in OpenTelemetry spans around search, storage, ethics and fan-out"""
+        if tracing.configure(self.config['service_name'], self.config['tracing_enabled'],
+                             sample_rate=self.config['tracing_sample_rate'],
+                             exporter=self.config['tracing_exporter'],
+                             file_path=self.config['tracing_file']):
+            tracing.instrument_app(self.app, exclude=('/health', self.config['metrics_path']))
+    
     def setup_ethics(self):
         """Initialize SPELWork ethical framework integration"""
         if self.config['ethics_enabled']:
@@ -107,8 +235,345 @@ class TwinningMemoryService:
         else:
             self.ethics = None
     
+    def setup_embeddings(self):
+        """Initialize the batching embedding service; the model itself loads on first use"""
+        self.embeddings = EmbeddingService(
+            model_name=self.config['embedding_model'],
+            dimensions=self.config['vector_dimensions'],
+            max_batch_size=self.config['embedding_batch_size'],
+            max_wait_ms=self.config['embedding_batch_wait_ms'],
+            cache_size=self.config['embedding_cache_size']
+        )
+    
+    def setup_index(self):
+        """
+        Initialize the memory store: pgvector when enabled and reachable,
+        otherwise the in-process vector index restored from its last snapshot
+        """
+        self.index = None
+        self.index_path = None
+        self.storage_backend = 'in-process'
+        
+        if self.config['pgvector_enabled']:
+            try:
+                from pgvector_store import PgVectorStore
+                store = PgVectorStore(
+                    database_url=self.config['database_url'],
+                    dimensions=self.config['vector_dimensions'],
+                    min_connections=self.config['db_pool_min'],
+                    max_connections=self.config['db_pool_max'],
+                    acquire_timeout=self.config['db_pool_timeout'],
+                    index_type=self.config['pgvector_index_type'],
+                    hnsw_m=self.config['pgvector_hnsw_m'],
+                    hnsw_ef_construction=self.config['pgvector_hnsw_ef_construction'],
+                    ivfflat_lists=self.config['pgvector_ivfflat_lists'],
+                    max_items=self.config['max_memory_items']
+                )
+                store.setup_schema()
+                self.index = store
+                self.storage_backend = 'pgvector'
+                logger.info("pgvector storage engine initialized",
+                           index_type=self.config['pgvector_index_type'],
+                           pool_max=self.config['db_pool_max'])
+                return
+            except Exception as e:
+                logger.error("pgvector unavailable, falling back to in-process index", error=str(e))
+        
+        if self.config['index_mode'] == 'ivf':
+            self.index = IVFIndex(
+                dimensions=self.config['vector_dimensions'],
+                max_items=self.config['max_memory_items'],
+                nlist=self.config['ivf_nlist'],
+                nprobe=self.config['ivf_nprobe']
+            )
+        else:
+            self.index = VectorIndex(
+                dimensions=self.config['vector_dimensions'],
+                max_items=self.config['max_memory_items']
+            )
+        
+        self.index_path = os.path.join(self.config['index_data_dir'], f"omac_index_{self.config['index_mode']}")
+        try:
+            if self.index.load(self.index_path):
+                logger.info("Vector index restored from snapshot", path=self.index_path, items=len(self.index))
+        except Exception as e:
+            logger.error("Failed to restore vector index snapshot", path=self.index_path, error=str(e))
+        self._persisted_version = self.index.version
+        
+        if self.config['index_persist_interval'] > 0:
+            threading.Thread(target=self._persist_loop, name='omac-index-persist', daemon=True).start()
+        atexit.register(self.persist_index)
+        
+        logger.info("Vector index initialized",
+                   mode=self.config['index_mode'],
+                   dimensions=self.config['vector_dimensions'],
+                   max_items=self.config['max_memory_items'])
+    
+    def setup_cache(self):
+        """Initialize the Redis search result cache when REDIS_ENABLED"""
+        self.result_cache = None
+        if not self.config['redis_enabled']:
+            return
+        
+        try:
+            from result_cache import SearchResultCache
+            self.result_cache = SearchResultCache(
+                redis_url=self.config['redis_url'],
+                ttl=self.config['search_cache_ttl'],
+                max_entries=self.config['search_cache_max_entries']
+            )
+            if self.result_cache.ping():
+                logger.info("Search result cache initialized", ttl=self.config['search_cache_ttl'],
+                           max_entries=self.config['search_cache_max_entries'])
+            else:
+                logger.warning("Redis not reachable yet; search cache will miss until it is",
+                              redis_url=self.config['redis_url'])
+        except Exception as e:
+            logger.error("Failed to initialize search result cache", error=str(e))
+            self.result_cache = None
+    
+    def setup_outbox(self):
+        """Open the webhook outbox on the data volume and start draining it"""
+        self.outbox = None
+        if not self.config['webhook_outbox_enabled']:
+            return
+        
+        try:
+            self.outbox = WebhookOutbox(
+                db_path=os.path.join(self.config['index_data_dir'], 'webhook_outbox.db'),
+                webhook_base_url=self.config['webhook_base_url'],
+                workers=self.config['webhook_outbox_workers'],
+                batch_size=self.config['webhook_outbox_batch_size'],
+                max_attempts=self.config['webhook_outbox_max_attempts']
+            )
+            self.outbox.start()
+            atexit.register(self.outbox.stop)
+            logger.info("Webhook outbox initialized", webhook_base_url=self.config['webhook_base_url'],
+                       workers=self.config['webhook_outbox_workers'])
+        except Exception as e:
+            logger.error("Failed to initialize webhook outbox", error=str(e))
+            self.outbox = None
+    
+    def publish_events(self, records: List[Dict[str, Any]]):
+        """Queue stored memories for their registered n8n workflows; never fails the write"""
+        if not self.outbox:
+            return
+        try:
+            with tracing.span('memory.outbox.enqueue', count=len(records)):
+                self.outbox.enqueue(records)
+        except Exception as e:
+            logger.error("Failed to queue memory events for webhooks", count=len(records), error=str(e))
+    
+    def persist_index(self):
+        """Write an index snapshot to the data volume if anything changed since the last one"""
+        if self.index_path is None or self.index.version == self._persisted_version:
+            return
+        try:
+            self._persisted_version = self.index.save(self.index_path)
+            logger.info("Vector index snapshot written", path=self.index_path, items=len(self.index))
+        except Exception as e:
+            logger.error("Failed to persist vector index", path=self.index_path, error=str(e))
+    
+    def _persist_loop(self):
+        """Background snapshotting so restarts don't re-embed or retrain"""
+        while True:
+            time.sleep(self.config['index_persist_interval'])
+            self.persist_index()
+    
+    def evaluate_storage(self, context: Dict[str, Any], user_id: str):
+        """Run the SPELWork storage wish; returns None when ethics is disabled"""
+        if not self.ethics:
+            return None
+        
+        wish = WishDefinition(
+            objective="Store content in semantic memory",
+            context=context,
+            domain='ai-memory-coordination',
+            user_identity=user_id,
+            safeguards=['bias-detection', 'human-override', 'privacy-protection']
+        )
+        with tracing.span('memory.ethics.evaluate') as current:
+            evaluation = self.ethics.evaluate_wish(wish)
+            if current is not None:
+                current.set_attribute('ethics.ethically_sound', bool(evaluation.ethically_sound))
+        
+        if not evaluation.ethically_sound:
+            logger.warning("Memory storage blocked by ethical evaluation", 
+                         reasoning=evaluation.reasoning)
+        return evaluation
+    
+    def allocate_memory_ids(self, count: int) -> List[str]:
+        """Allocate `count` unique memory IDs sharing one random prefix"""
+        prefix = uuid.uuid4().hex[:24]
+        return [f"memory-{prefix}{i:08x}" for i in range(count)]
+    
+    def _ingest_chunk(self, chunk: List[Any], user_id: str, totals: Dict[str, Any]):
+        """
+        Parse, evaluate, embed and insert one chunk of NDJSON lines, yielding
+        an NDJSON result line per item. One ethics evaluation, one embedding
+        pass and one index write cover the whole chunk.
+        """
+        items, results, full = [], {}, None
+        for line_number, line in chunk:
+            totals['received'] += 1
+            try:
+                item = json.loads(line)
+                if not isinstance(item, dict) or not item.get('content'):
+                    raise ValueError('Content is required')
+                # Checked here so a malformed line fails alone instead of the whole chunk
+                if not isinstance(item['content'], str):
+                    raise ValueError('Content must be a string')
+                if not isinstance(item.get('source', 'api'), str):
+                    raise ValueError('Source must be a string')
+                if not isinstance(item.get('metadata', {}), dict):
+                    raise ValueError('Metadata must be an object')
+                items.append((line_number, item))
+            except ValueError as e:
+                results[line_number] = {'line': line_number, 'success': False, 'error': str(e)}
+        
+        if items:
+            evaluation = self.evaluate_storage({
+                'batch_size': len(items),
+                'content_length': sum(len(item['content']) for _, item in items),
+                'sources': sorted({item.get('source', 'api') for _, item in items}),
+                'metadata': {'ingest': 'batch'}
+            }, user_id)
+            
+            if evaluation is not None and not evaluation.ethically_sound:
+                for line_number, _ in items:
+                    results[line_number] = {
+                        'line': line_number,
+                        'success': False,
+                        'error': 'Memory storage blocked by ethical evaluation',
+                        'reasoning': evaluation.reasoning
+                    }
+            else:
+                memory_ids = self.allocate_memory_ids(len(items))
+                with tracing.span('memory.embed', count=len(items)):
+                    vectors = self.embeddings.embed_many([item['content'] for _, item in items])
+                stored_at = datetime.now().isoformat()
+                records = [
+                    {
+                        'id': memory_id,
+                        'content': item['content'],
+                        'source': item.get('source', 'api'),
+                        'metadata': item.get('metadata', {}),
+                        'user_id': user_id,
+                        'timestamp': stored_at
+                    }
+                    for memory_id, (_, item) in zip(memory_ids, items)
+                ]
+                try:
+                    with tracing.span('memory.index.add', backend=self.storage_backend, count=len(records)):
+                        self.index.add_batch(memory_ids, vectors, records)
+                    if self.result_cache:
+                        with tracing.span('memory.cache.invalidate'):
+                            self.result_cache.invalidate(vectors)
+                    self.publish_events(records)
+                    for (line_number, item), record in zip(items, records):
+                        results[line_number] = {
+                            'line': line_number,
+                            'success': True,
+                            'memory_id': record['id'],
+                            'content_length': len(item['content']),
+                            'source': record['source'],
+                            'stored_at': stored_at
+                        }
+                except IndexFullError as e:
+                    logger.warning("Batch memory storage rejected", reason=str(e))
+                    full = e
+                    for line_number, _ in items:
+                        results[line_number] = {'line': line_number, 'success': False, 'error': str(e)}
+        
+        for line_number, _ in chunk:
+            result = results[line_number]
+            totals['stored' if result['success'] else 'failed'] += 1
+            yield json.dumps(result) + '\n'
+        
+        if full is not None:
+            raise full
+    
+    def _fanout_timeout(self, data: Dict[str, Any]) -> float:
+        """Per-target timeout for a fan-out request, capped by FANOUT_TIMEOUT_SECONDS"""
+        try:
+            requested = float(data.get('timeout', self.config['fanout_timeout']))
+        except (TypeError, ValueError):
+            requested = self.config['fanout_timeout']
+        return max(0.1, min(requested, self.config['fanout_timeout']))
+    
+    def _fanout_operation(self, data: Dict[str, Any]) -> Optional[str]:
+        """The requested operation if it is safe to put in a target URL and allowed by FANOUT_OPERATIONS"""
+        operation = data.get('operation', 'sync')
+        if not isinstance(operation, str) or not _OPERATION_NAME.match(operation):
+            return None
+        return operation if operation in self.config['fanout_operations'] else None
+    
+    def _fanout_call(self, url: str, payload: Dict[str, Any], timeout: float, headers: Dict[str, str]):
+        """Deferred POST for one fan-out target"""
+        headers = tracing.inject(dict(headers))
+        return lambda: self.fanout.post_json(url, payload, timeout, headers)
+    
+    def _fanout_summary(self, operation: str, results: List[Dict[str, Any]], ok_status: str,
+                        extra: Dict[str, Any]) -> Dict[str, Any]:
+        """Response body shared by the coordination and orchestration endpoints"""
+        succeeded = sum(1 for r in results if r['status'] == ok_status)
+        return {
+            'success': succeeded == len(results),
+            'partial': 0 < succeeded < len(results),
+            'operation': operation,
+            **extra,
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'total_time_ms': max((r['response_time_ms'] for r in results), default=0.0),
+            'results': results,
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    def _stream_results(self, query: str, threshold: float, pages, limit: int):
+        """
+        NDJSON generator: one line per result as pages are ranked, then a
+        summary line. `pages` must be fetched with limit + 1; the extra match
+        is not emitted and only tells whether another page exists.
+        """
+        count, last, has_more = 0, None, False
+        for page in pages:
+            for record, score in page:
+                if count == limit:
+                    has_more = True
+                    break
+                yield json.dumps(format_result(record, score)) + '\n'
+                last = (score, record['id'])
+                count += 1
+        
+        yield json.dumps({
+            'summary': True,
+            'query': query,
+            'results_count': count,
+            'similarity_threshold': threshold,
+            'next_cursor': encode_cursor(*last) if has_more else None,
+            'timestamp': datetime.now().isoformat()
+        }) + '\n'
+    
+    def refresh_metrics(self):
+        """Set the gauges that are read from shared state rather than recorded as they change"""
+        if self.outbox:
+            outbox = self.outbox.stats()
+            for state in ('pending', 'in_flight', 'dead_letters'):
+                metrics.WEBHOOK_OUTBOX_DEPTH.labels(state).set(outbox[state])
+        items = self.index.stats().get('items')
+        if items is not None:
+            metrics.INDEX_ITEMS.set(items)
+    
     def setup_routes(self):
         """Setup Flask routes for the memory service"""
+        if self.config['metrics_enabled']:
+            metrics.instrument_app(self.app, exclude=(self.config['metrics_path'],))
+            
+            # Prometheus exposition, aggregated across Gunicorn workers in multiprocess mode
+            @self.app.route(self.config['metrics_path'], methods=['GET'])
+            def prometheus_metrics():
+                payload, content_type = metrics.render(self.refresh_metrics)
+                return Response(payload, content_type=content_type)
         
         # Health and status endpoints
         @self.app.route('/health', methods=['GET'])
@@ -120,7 +585,7 @@ class TwinningMemoryService:
                 'timestamp': datetime.now().isoformat(),
                 'capabilities': {
                     'semantic_search': self.config['semantic_search_enabled'],
-                    'pgvector': self.config['pgvector_enabled'],
+                    'pgvector': self.storage_backend == 'pgvector',
                     'ethics_framework': self.config['ethics_enabled'],
                     'mcp_integration': self.config['mcp_servers_enabled']
                 }
@@ -134,38 +599,77 @@ class TwinningMemoryService:
                 query = data.get('query', '')
                 limit = data.get('limit', 10)
                 threshold = data.get('threshold', self.config['similarity_threshold'])
+                nprobe = data.get('nprobe')
+                cursor = data.get('cursor')
+                stream = bool(data.get('stream', False))
                 user_id = request.headers.get('X-User-Id', 'anonymous')
                 
                 if not query:
                     return jsonify({'error': 'Query is required'}), 400
                 
+                if not self.config['semantic_search_enabled']:
+                    return jsonify({'error': 'Semantic search is disabled'}), 503
+                
+                try:
+                    limit = max(1, int(limit))
+                    threshold = float(threshold)
+                    nprobe = int(nprobe) if nprobe is not None else None
+                except (TypeError, ValueError):
+                    return jsonify({'error': 'limit, threshold and nprobe must be numeric'}), 400
+                limit = min(limit, self.config['max_memory_items'])
+                
+                try:
+                    after = decode_cursor(cursor) if cursor else None
+                except ValueError:
+                    return jsonify({'error': 'Invalid cursor'}), 400
+                
                 logger.info("Memory search requested", 
-                           query=query, limit=limit, user_id=user_id)
+                           query=query, limit=limit, user_id=user_id, paged=after is not None, stream=stream)
                 
-                # Mock semantic search results
-                results = [
-                    {
-                        'id': f'memory-{i}',
-                        'content': f'Mock memory content related to: {query}',
-                        'source': 'notion' if i % 2 == 0 else 'github',
-                        'similarity_score': 0.9 - (i * 0.1),
-                        'timestamp': datetime.now().isoformat(),
-                        'metadata': {
-                            'type': 'document',
-                            'tags': ['ai', 'memory', 'search']
-                        }
-                    }
-                    for i in range(min(limit, 5))  # Return up to 5 mock results
-                ]
+                if stream:
+                    pages = self.index.iter_search(self.embeddings.embed(query), threshold,
+                                                   self.config['search_stream_page_size'],
+                                                   limit=limit + 1, after=after, nprobe=nprobe)
+                    return Response(stream_with_context(self._stream_results(query, threshold, pages, limit)),
+                                    mimetype='application/x-ndjson')
                 
-                return jsonify({
+                cache_key, generation = None, None
+                if self.result_cache and not data.get('no_cache', False):
+                    cache_key = self.result_cache.make_key(query, limit, threshold, user_id, cursor, nprobe)
+                    with tracing.span('memory.cache.lookup'):
+                        cached, generation = self.result_cache.get(cache_key)
+                    if cached is not None:
+                        cached.update({'cached': True, 'timestamp': datetime.now().isoformat()})
+                        return jsonify(cached)
+                
+                with tracing.span('memory.embed', count=1):
+                    query_vector = self.embeddings.embed(query)
+                
+                # Fetch one extra match to know whether another page exists
+                with tracing.span('memory.index.search', backend=self.storage_backend, limit=limit):
+                    matches = self.index.search(query_vector, limit + 1, threshold, after=after, nprobe=nprobe)
+                has_more = len(matches) > limit
+                matches = matches[:limit]
+                results = [format_result(record, score) for record, score in matches]
+                
+                response = {
                     'success': True,
                     'query': query,
                     'results_count': len(results),
                     'similarity_threshold': threshold,
                     'results': results,
+                    'next_cursor': encode_cursor(matches[-1][1], matches[-1][0]['id']) if has_more else None,
+                    'cached': False,
                     'timestamp': datetime.now().isoformat()
-                })
+                }
+                
+                if cache_key is not None:
+                    with tracing.span('memory.cache.store'):
+                        self.result_cache.put(cache_key, response, query_vector, threshold,
+                                              [score for _, score in matches], limit,
+                                              after[0] if after else None, generation)
+                
+                return jsonify(response)
                 
             except Exception as e:
                 logger.error("Memory search failed", error=str(e))
@@ -185,41 +689,52 @@ class TwinningMemoryService:
                     return jsonify({'error': 'Content is required'}), 400
                 
                 # Create ethical wish for memory storage
-                if self.ethics:
-                    wish = WishDefinition(
-                        objective="Store content in semantic memory",
-                        context={
-                            'content_length': len(content),
-                            'source': source,
-                            'metadata': metadata
-                        },
-                        domain='ai-memory-coordination',
-                        user_identity=user_id,
-                        safeguards=['bias-detection', 'human-override', 'privacy-protection']
-                    )
-                    
-                    evaluation = self.ethics.evaluate_wish(wish)
-                    
-                    if not evaluation.ethically_sound:
-                        logger.warning("Memory storage blocked by ethical evaluation", 
-                                     reasoning=evaluation.reasoning)
-                        return jsonify({
-                            'error': 'Memory storage blocked by ethical evaluation',
-                            'reasoning': evaluation.reasoning
-                        }), 403
+                evaluation = self.evaluate_storage({
+                    'content_length': len(content),
+                    'source': source,
+                    'metadata': metadata
+                }, user_id)
+                
+                if evaluation is not None and not evaluation.ethically_sound:
+                    return jsonify({
+                        'error': 'Memory storage blocked by ethical evaluation',
+                        'reasoning': evaluation.reasoning
+                    }), 403
                 
                 logger.info("Memory storage requested", 
                            content_length=len(content), source=source, user_id=user_id)
                 
-                # Mock memory storage
-                memory_id = f"memory-{datetime.now().timestamp()}"
+                memory_id = self.allocate_memory_ids(1)[0]
+                stored_at = datetime.now().isoformat()
+                
+                with tracing.span('memory.embed', count=1):
+                    vector = self.embeddings.embed(content)
+                record = {
+                    'id': memory_id,
+                    'content': content,
+                    'source': source,
+                    'metadata': metadata,
+                    'user_id': user_id,
+                    'timestamp': stored_at
+                }
+                try:
+                    with tracing.span('memory.index.add', backend=self.storage_backend, count=1):
+                        self.index.add(memory_id, vector, record)
+                except IndexFullError as e:
+                    logger.warning("Memory storage rejected", reason=str(e))
+                    return jsonify({'error': str(e)}), 507
+                
+                if self.result_cache:
+                    with tracing.span('memory.cache.invalidate'):
+                        self.result_cache.invalidate(vector)
+                self.publish_events([record])
                 
                 return jsonify({
                     'success': True,
                     'memory_id': memory_id,
                     'content_length': len(content),
                     'source': source,
-                    'stored_at': datetime.now().isoformat(),
+                    'stored_at': stored_at,
                     'ethical_evaluation': {
                         'approved': True,
                         'trust_score': evaluation.trust_score if self.ethics else 1.0
@@ -230,36 +745,191 @@ class TwinningMemoryService:
                 logger.error("Memory storage failed", error=str(e))
                 return jsonify({'error': 'Memory storage failed'}), 500
         
+        # Bulk ingestion: NDJSON in, per-item NDJSON results streamed back
+        @self.app.route('/api/memory/store/batch', methods=['POST'])
+        def store_memory_batch():
+            user_id = request.headers.get('X-User-Id', 'anonymous')
+            try:
+                chunk_size = max(1, min(int(request.args.get('chunk_size', self.config['ingest_chunk_size'])),
+                                        self.config['ingest_max_chunk_size']))
+            except ValueError:
+                return jsonify({'error': 'chunk_size must be an integer'}), 400
+            
+            logger.info("Batch memory storage requested", chunk_size=chunk_size, user_id=user_id)
+            
+            def generate():
+                totals = {'received': 0, 'stored': 0, 'failed': 0}
+                chunk = []
+                try:
+                    for line_number, line in enumerate(request.stream, start=1):
+                        if not line.strip():
+                            continue
+                        chunk.append((line_number, line))
+                        if len(chunk) >= chunk_size:
+                            yield from self._ingest_chunk(chunk, user_id, totals)
+                            chunk = []
+                    if chunk:
+                        yield from self._ingest_chunk(chunk, user_id, totals)
+                except IndexFullError as e:
+                    totals['stopped'] = str(e)
+                except Exception as e:
+                    logger.error("Batch memory storage failed", error=str(e), **totals)
+                    totals['stopped'] = 'Batch memory storage failed'
+                
+                logger.info("Batch memory storage completed", user_id=user_id, **totals)
+                yield json.dumps({'summary': True, **totals, 'timestamp': datetime.now().isoformat()}) + '\n'
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        # Search result cache counters, shared across workers
+        @self.app.route('/api/memory/cache/stats', methods=['GET'])
+        def cache_stats():
+            if not self.result_cache:
+                return jsonify({'enabled': False, 'timestamp': datetime.now().isoformat()})
+            
+            return jsonify({
+                'enabled': True,
+                **self.result_cache.stats(),
+                'timestamp': datetime.now().isoformat()
+            })
+        
+        # n8n webhook registrations, keyed by memory type ('*' matches all)
+        @self.app.route('/api/memory/webhooks', methods=['GET', 'POST', 'DELETE'])
+        def memory_webhooks():
+            if not self.outbox:
+                return jsonify({'error': 'Webhook outbox is not enabled'}), 503
+            
+            if request.method == 'GET':
+                return jsonify({
+                    'registrations': self.outbox.registrations(),
+                    'timestamp': datetime.now().isoformat()
+                })
+            
+            data = request.get_json() or {}
+            memory_type = data.get('memory_type')
+            workflow_id = data.get('workflow_id')
+            if not memory_type or not workflow_id:
+                return jsonify({'error': 'memory_type and workflow_id are required'}), 400
+            
+            if request.method == 'DELETE':
+                removed = self.outbox.unregister(memory_type, workflow_id)
+                return jsonify({'success': removed, 'memory_type': memory_type,
+                                'workflow_id': workflow_id}), 200 if removed else 404
+            
+            created = self.outbox.register(memory_type, workflow_id)
+            logger.info("Webhook registered", memory_type=memory_type, workflow_id=workflow_id)
+            return jsonify({
+                'status': 'registered' if created else 'already_registered',
+                'memory_type': memory_type,
+                'workflow_id': workflow_id,
+                'webhook_url': f"{self.config['webhook_base_url']}{workflow_id}"
+            }), 201 if created else 200
+        
+        # Outbox depth, delivery counters and dead letters
+        @self.app.route('/api/memory/webhooks/outbox', methods=['GET'])
+        def webhook_outbox_stats():
+            if not self.outbox:
+                return jsonify({'enabled': False, 'timestamp': datetime.now().isoformat()})
+            try:
+                limit = max(1, min(int(request.args.get('limit', 20)), 100))
+            except ValueError:
+                return jsonify({'error': 'limit must be an integer'}), 400
+            
+            return jsonify({
+                'enabled': True,
+                **self.outbox.stats(),
+                'recent_dead_letters': self.outbox.dead_letters(limit=limit),
+                'timestamp': datetime.now().isoformat()
+            })
+        
+        # Requeue dead-lettered events (all, or the given outbox IDs)
+        @self.app.route('/api/memory/webhooks/dead-letters/replay', methods=['POST'])
+        def replay_dead_letters():
+            if not self.outbox:
+                return jsonify({'error': 'Webhook outbox is not enabled'}), 503
+            
+            ids = (request.get_json(silent=True) or {}).get('ids')
+            replayed = self.outbox.replay_dead_letters(ids)
+            logger.info("Dead-lettered webhook events replayed", count=replayed)
+            return jsonify({'success': True, 'replayed': replayed, 'timestamp': datetime.now().isoformat()})
+        
+        # ANN recall report against the exact path, for choosing IVF settings
+        @self.app.route('/api/memory/index/recall', methods=['GET'])
+        def index_recall():
+            if not isinstance(self.index, IVFIndex):
+                return jsonify({'error': 'Recall reporting requires INDEX_MODE=ivf'}), 400
+            
+            try:
+                k = int(request.args.get('k', 10))
+                samples = int(request.args.get('samples', 100))
+                nprobe_values = [int(v) for v in request.args.get('nprobe', '1,4,8,16,32').split(',') if v]
+            except ValueError:
+                return jsonify({'error': 'k, samples and nprobe must be integers'}), 400
+            
+            # Every sample costs an exact scan plus one ANN search per nprobe value
+            k = max(1, min(k, RECALL_MAX_K))
+            samples = max(1, min(samples, RECALL_MAX_SAMPLES))
+            nprobe_values = sorted({max(1, min(v, self.index.nlist)) for v in nprobe_values})[:RECALL_MAX_NPROBE_VALUES]
+            
+            report = self.index.recall_at_k(k=k, nprobe_values=nprobe_values, samples=samples)
+            report['timestamp'] = datetime.now().isoformat()
+            return jsonify(report)
+        
+        # Retrain IVF centroids after the corpus has drifted or grown
+        @self.app.route('/api/memory/index/rebuild', methods=['POST'])
+        def index_rebuild():
+            if not isinstance(self.index, IVFIndex):
+                return jsonify({'error': 'Index rebuild requires INDEX_MODE=ivf'}), 400
+            
+            if not self.index.start_training(force=True):
+                return jsonify({
+                    'error': 'Index training already running or not enough items stored',
+                    'index': self.index.stats()
+                }), 409
+            
+            return jsonify({
+                'success': True,
+                'status': 'training',
+                'index': self.index.stats(),
+                'timestamp': datetime.now().isoformat()
+            }), 202
+        
         # Cross-service memory coordination
         @self.app.route('/api/memory/coordinate', methods=['POST'])
         def coordinate_memory():
             try:
                 data = request.get_json()
                 services = data.get('services', ['intelligence', 'social'])
-                operation = data.get('operation', 'sync')
+                operation = self._fanout_operation(data)
+                if operation is None:
+                    return jsonify({'error': 'Unknown operation',
+                                    'allowed': sorted(self.config['fanout_operations'])}), 400
                 user_id = request.headers.get('X-User-Id', 'anonymous')
                 
                 logger.info("Memory coordination requested", 
                            services=services, operation=operation, user_id=user_id)
                 
-                # Mock cross-service coordination
+                timeout = self._fanout_timeout(data)
+                headers = {'X-User-Id': user_id}
+                payload = {'operation': operation, 'source': 'memory', 'user_id': user_id}
+                calls = {
+                    service: self._fanout_call(
+                        f"{self.config['service_urls'][service].rstrip('/')}/api/memory/{operation}",
+                        payload, timeout, headers
+                    ) if self.config['service_urls'].get(service) else None
+                    for service in services
+                }
+                
                 coordination_results = []
-                for service in services:
-                    result = {
-                        'service': service,
-                        'status': 'synchronized',
-                        'items_processed': 42,  # Mock number
-                        'timestamp': datetime.now().isoformat()
-                    }
+                for result in self.fanout.run(calls, timeout):
+                    result['service'] = result.pop('target')
+                    if result['status'] == 'success':
+                        result['status'] = 'synchronized'
                     coordination_results.append(result)
                 
-                return jsonify({
-                    'success': True,
-                    'operation': operation,
-                    'services_coordinated': len(services),
-                    'results': coordination_results,
-                    'timestamp': datetime.now().isoformat()
-                })
+                return jsonify(self._fanout_summary(operation, coordination_results, 'synchronized', {
+                    'services_coordinated': len(services)
+                }))
                 
             except Exception as e:
                 logger.error("Memory coordination failed", error=str(e))
@@ -281,12 +951,18 @@ class TwinningMemoryService:
                 ],
                 'configuration': {
                     'pgvector_enabled': self.config['pgvector_enabled'],
+                    'storage_backend': self.storage_backend,
+                    'index_mode': self.config['index_mode'],
                     'semantic_search_enabled': self.config['semantic_search_enabled'],
                     'ethics_enabled': self.config['ethics_enabled'],
                     'mcp_servers_enabled': self.config['mcp_servers_enabled'],
                     'embedding_model': self.config['embedding_model'],
-                    'similarity_threshold': self.config['similarity_threshold']
+                    'similarity_threshold': self.config['similarity_threshold'],
+                    'max_memory_items': self.config['max_memory_items']
                 },
+                'index': self.index.stats(),
+                'embeddings': self.embeddings.stats(),
+                'webhook_outbox': self.outbox.stats() if self.outbox else None,
                 'integrations': {
                     'intelligence_service': self.config['intelligence_service_url'],
                     'social_service': self.config['social_service_url'],
@@ -301,32 +977,35 @@ class TwinningMemoryService:
             try:
                 data = request.get_json()
                 servers = data.get('servers', ['notion', 'github', 'apple'])
-                operation = data.get('operation', 'sync')
+                operation = self._fanout_operation(data)
+                if operation is None:
+                    return jsonify({'error': 'Unknown operation',
+                                    'allowed': sorted(self.config['fanout_operations'])}), 400
                 user_id = request.headers.get('X-User-Id', 'anonymous')
                 
                 logger.info("MCP orchestration requested", 
                            servers=servers, operation=operation, user_id=user_id)
                 
-                # Mock MCP orchestration
+                timeout = self._fanout_timeout(data)
+                headers = {'X-User-Id': user_id}
+                payload = {'operation': operation, 'source': 'memory', 'user_id': user_id}
+                calls = {
+                    server: self._fanout_call(
+                        f"{self.config['mcp_server_urls'][server].rstrip('/')}/{operation}",
+                        payload, timeout, headers
+                    ) if self.config['mcp_server_urls'].get(server) else None
+                    for server in servers
+                }
+                
                 orchestration_results = []
-                for server in servers:
-                    result = {
-                        'server': server,
-                        'status': 'success',
-                        'operation': operation,
-                        'items_processed': 15,  # Mock number
-                        'response_time': '250ms',
-                        'timestamp': datetime.now().isoformat()
-                    }
+                for result in self.fanout.run(calls, timeout):
+                    result['server'] = result.pop('target')
+                    result['operation'] = operation
                     orchestration_results.append(result)
                 
-                return jsonify({
-                    'success': True,
-                    'operation': operation,
-                    'servers_orchestrated': len(servers),
-                    'results': orchestration_results,
-                    'timestamp': datetime.now().isoformat()
-                })
+                return jsonify(self._fanout_summary(operation, orchestration_results, 'success', {
+                    'servers_orchestrated': len(servers)
+                }))
                 
             except Exception as e:
                 logger.error("MCP orchestration failed", error=str(e))
@@ -345,6 +1024,10 @@ class TwinningMemoryService:
             debug=os.getenv('FLASK_ENV') == 'development'
         )
 
+def create_app() -> Flask:
+    """WSGI entry point for Gunicorn: gunicorn -c gunicorn.conf.py 'memory_api:create_app()'"""
+    return TwinningMemoryService().app
+
 if __name__ == '__main__':
     # Load environment variables
     from dotenv import load_dotenv
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Prometheus instrumentation for the memory service
+
+Metrics are module-level so any component can record without plumbing.
+When PROMETHEUS_MULTIPROC_DIR is set (Gunicorn), every worker writes to
+shared files and /metrics aggregates them; see gunicorn.conf.py for the
+cleanup hook. Without prometheus-client every metric is a no-op.
+"""
+
+import os
+import time
+from typing import Callable, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+try:
+    from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                                   Histogram, generate_latest, multiprocess)
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _NoopMetric:
+    """Stands in for any metric when prometheus-client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, *args, **kwargs):
+        pass
+
+    def inc(self, *args, **kwargs):
+        pass
+
+    def dec(self, *args, **kwargs):
+        pass
+
+    def set(self, *args, **kwargs):
+        pass
+
+
+if METRICS_AVAILABLE:
+    HTTP_REQUEST_DURATION = Histogram(
+        'memory_http_request_duration_seconds', 'HTTP request latency by route',
+        ['method', 'route', 'status'],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+    EMBEDDING_BATCH_SIZE = Histogram(
+        'memory_embedding_batch_size', 'Texts encoded per embedding model call',
+        buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+    EMBEDDING_BATCH_DURATION = Histogram(
+        'memory_embedding_batch_duration_seconds', 'Embedding model call latency',
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+    EMBEDDING_CACHE_LOOKUPS = Counter(
+        'memory_embedding_cache_lookups_total', 'Embedding cache lookups', ['result'])
+    SEARCH_CACHE_LOOKUPS = Counter(
+        'memory_search_cache_lookups_total', 'Search result cache lookups', ['result'])
+    EMBEDDING_QUEUE_DEPTH = Gauge(
+        'memory_embedding_queue_depth', 'Texts waiting for an embedding batch',
+        multiprocess_mode='livesum')
+    # Read from the shared outbox at scrape time, so the latest reading is the answer
+    WEBHOOK_OUTBOX_DEPTH = Gauge(
+        'memory_webhook_outbox_depth', 'Webhook deliveries by state', ['state'],
+        multiprocess_mode='mostrecent')
+    INDEX_ITEMS = Gauge(
+        'memory_index_items', 'Memories held by the storage backend',
+        multiprocess_mode='mostrecent')
+else:
+    HTTP_REQUEST_DURATION = EMBEDDING_BATCH_SIZE = EMBEDDING_BATCH_DURATION = _NoopMetric()
+    EMBEDDING_CACHE_LOOKUPS = SEARCH_CACHE_LOOKUPS = _NoopMetric()
+    EMBEDDING_QUEUE_DEPTH = WEBHOOK_OUTBOX_DEPTH = INDEX_ITEMS = _NoopMetric()
+
+
+def instrument_app(app, exclude: Tuple[str, ...] = ('/metrics',)):
+    """Record every request's latency under its route template (not the raw path)"""
+    if not METRICS_AVAILABLE:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        started = getattr(g, '_metrics_started', None)
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        if started is not None and route not in exclude:
+            HTTP_REQUEST_DURATION.labels(request.method, route, str(response.status_code)).observe(
+                time.perf_counter() - started)
+        return response
+
+
+def render(refresh: Optional[Callable[[], None]] = None) -> Tuple[bytes, str]:
+    """Exposition payload and content type; `refresh` updates scrape-time gauges first"""
+    if not METRICS_AVAILABLE:
+        return b'# prometheus-client not installed\n', CONTENT_TYPE_LATEST
+    if refresh is not None:
+        try:
+            refresh()
+        except Exception as e:
+            logger.warning("Metrics refresh failed", error=str(e))
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+OMAC pgvector Storage Engine
+Durable PostgreSQL + pgvector backend for semantic memory
+"""
+
+import io
+import os
+import csv
+import json
+import threading
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import psycopg2
+import psycopg2.extras
+from psycopg2.pool import ThreadedConnectionPool
+from pgvector.psycopg2 import register_vector
+import structlog
+
+from vector_index import IndexFullError
+
+logger = structlog.get_logger()
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no pooled connection became free within the configured timeout"""
+
+
+class _RetainingPool(ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool that keeps returned connections open up to maxconn
+
+    psycopg2 closes every connection handed back while `minconn` are already
+    idle, so under concurrency most requests would reconnect (and re-prepare).
+    Only `minconn` connections are opened up front; the rest are opened on
+    demand and then kept.
+    """
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.minconn = maxconn
+
+
+class PgVectorStore:
+    """
+    pgvector-backed store with the same search/insert surface as VectorIndex
+
+    Each process owns one bounded ThreadedConnectionPool shared by all of its
+    request threads; callers beyond `max_connections` wait on a semaphore
+    instead of failing. The pool is created lazily and re-created after a
+    fork, so Gunicorn workers never share sockets with the master. Every
+    pooled connection prepares the top-k statement once, and bulk writes go
+    through COPY into a staging table. The item count lives in a one-row
+    `<table>_count` table that writes lock and update, so the MAX_MEMORY_ITEMS
+    cap is exact across workers and neither writes nor stats() scan the table.
+    """
+
+    TOPK_STATEMENT = 'omac_topk'
+    # hnsw.ef_search bounds how many candidates an HNSW scan returns (pgvector default 40, max 1000)
+    HNSW_EF_SEARCH_DEFAULT = 40
+    HNSW_EF_SEARCH_MAX = 1000
+
+    def __init__(self, database_url: str, dimensions: int, table: str = 'omac_memories',
+                 min_connections: int = 1, max_connections: int = 10, acquire_timeout: float = 5.0,
+                 index_type: str = 'hnsw', hnsw_m: int = 16, hnsw_ef_construction: int = 64,
+                 ivfflat_lists: int = 100, max_items: Optional[int] = None, connect_timeout: int = 3):
+        self.database_url = database_url
+        self.dimensions = dimensions
+        self.table = table
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.acquire_timeout = acquire_timeout
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.ivfflat_lists = ivfflat_lists
+        self.max_items = max_items
+        self.connect_timeout = connect_timeout
+
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._pool_pid: Optional[int] = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        # Keyed by the connection object itself: ids of closed connections get reused
+        self._prepared: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+        self._in_use = 0
+        self._index_ready = False
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with self._pool_lock:
+                if self._pool is None or self._pool_pid != pid:
+                    # A pool inherited across fork() belongs to the parent; drop it without closing its sockets
+                    self._pool = _RetainingPool(self.min_connections, self.max_connections,
+                                                self.database_url, connect_timeout=self.connect_timeout)
+                    self._pool_pid = pid
+                    self._slots = threading.BoundedSemaphore(self.max_connections)
+                    self._prepared = weakref.WeakKeyDictionary()
+        return self._pool
+
+    def _prepare(self, conn):
+        """Register the vector type and prepare hot statements once per connection"""
+        if conn in self._prepared:
+            return
+        register_vector(conn)
+        with conn.cursor() as cur:
+            cur.execute(
+                f"PREPARE {self.TOPK_STATEMENT} (vector, float8, int) AS "
+                f"SELECT id, content, source, metadata, user_id, created_at, 1 - (embedding <=> $1) AS score "
+                f"FROM {self.table} WHERE (embedding <=> $1) <= $2 "
+                f"ORDER BY embedding <=> $1, id LIMIT $3"
+            )
+        conn.commit()
+        self._prepared[conn] = True
+
+    @contextmanager
+    def connection(self, prepare: bool = True):
+        """Borrow a pooled connection, waiting up to acquire_timeout for a free slot"""
+        pool = self._get_pool()
+        slots = self._slots
+        if not slots.acquire(timeout=self.acquire_timeout):
+            raise PoolExhaustedError(f"No database connection free after {self.acquire_timeout}s")
+        self._in_use += 1
+        conn = None
+        try:
+            conn = pool.getconn()
+            if prepare:
+                self._prepare(conn)
+            yield conn
+            conn.commit()
+        except Exception:
+            if conn is not None and not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            if conn is not None:
+                if conn.closed:
+                    self._prepared.pop(conn, None)
+                pool.putconn(conn, close=bool(conn.closed))
+            self._in_use -= 1
+            slots.release()
+
+    def setup_schema(self):
+        """Create the extension, table and (when possible) the ANN index"""
+        # The vector type and table must exist before connections can be prepared
+        with self.connection(prepare=False) as conn, conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    id TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    source VARCHAR(100) NOT NULL,
+                    metadata JSONB NOT NULL DEFAULT '{{}}'::jsonb,
+                    user_id TEXT,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    embedding vector({self.dimensions}) NOT NULL
+                )
+            """)
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_source_idx ON {self.table} (source)")
+            # Row count maintained by add()/add_batch(), so capacity checks and stats never scan the table
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table}_count (
+                    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+                    items BIGINT NOT NULL
+                )
+            """)
+            cur.execute(f"INSERT INTO {self.table}_count (items) VALUES (0) ON CONFLICT (singleton) DO NOTHING")
+            # Resynchronise once per start, in case rows were deleted outside this service
+            cur.execute(f"SELECT items FROM {self.table}_count FOR UPDATE")
+            cur.execute(f"UPDATE {self.table}_count SET items = (SELECT count(*) FROM {self.table})")
+        self.ensure_index()
+        logger.info("pgvector schema ready", table=self.table, index_type=self.index_type,
+                   ann_index_ready=self._index_ready)
+
+    def ensure_index(self):
+        """
+        Build the server-side ANN index. HNSW can be built on an empty table;
+        IVFFlat clusters existing rows, so it waits until there is data to train on.
+        """
+        if self._index_ready:
+            return
+        index_name = f"{self.table}_embedding_{self.index_type}_idx"
+        with self.connection() as conn, conn.cursor() as cur:
+            if self.index_type == 'ivfflat':
+                if self._count(cur) < self.ivfflat_lists * 39:
+                    return
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {self.table} "
+                            f"USING ivfflat (embedding vector_cosine_ops) WITH (lists = %s)", (self.ivfflat_lists,))
+            else:
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {self.table} "
+                            f"USING hnsw (embedding vector_cosine_ops) WITH (m = %s, ef_construction = %s)",
+                            (self.hnsw_m, self.hnsw_ef_construction))
+        self._index_ready = True
+        logger.info("pgvector ANN index ready", index=index_name)
+
+    def _count(self, cur) -> int:
+        cur.execute(f"SELECT items FROM {self.table}_count")
+        row = cur.fetchone()
+        return int(row[0]) if row else 0
+
+    def _lock_count(self, cur) -> int:
+        """Lock the row counter until commit, serialising writers so the cap is exact"""
+        cur.execute(f"SELECT items FROM {self.table}_count FOR UPDATE")
+        return int(cur.fetchone()[0])
+
+    def _record_inserts(self, cur, items: int, inserted: int):
+        """Apply the rows a locked write added; ids that were replaced don't count"""
+        if self.max_items is not None and inserted and items + inserted > self.max_items:
+            raise IndexFullError(f"Memory store is full ({items}/{self.max_items} items)")
+        if inserted:
+            cur.execute(f"UPDATE {self.table}_count SET items = items + %s", (inserted,))
+
+    def add(self, memory_id: str, vector: np.ndarray, record: Dict[str, Any]):
+        """Insert or replace a single memory item"""
+        with self.connection() as conn, conn.cursor() as cur:
+            items = self._lock_count(cur)
+            # xmax is 0 only for a freshly inserted row, not for one the upsert replaced
+            cur.execute(
+                f"INSERT INTO {self.table} (id, content, source, metadata, user_id, created_at, embedding) "
+                f"VALUES (%s, %s, %s, %s, %s, %s, %s) "
+                f"ON CONFLICT (id) DO UPDATE SET content = EXCLUDED.content, source = EXCLUDED.source, "
+                f"metadata = EXCLUDED.metadata, user_id = EXCLUDED.user_id, embedding = EXCLUDED.embedding "
+                f"RETURNING (xmax = 0)",
+                (memory_id, record['content'], record['source'], psycopg2.extras.Json(record['metadata']),
+                 record.get('user_id'), record['timestamp'], np.asarray(vector, dtype=np.float32))
+            )
+            self._record_inserts(cur, items, int(cur.fetchone()[0]))
+        self._version += 1
+
+        if not self._index_ready:
+            self.ensure_index()
+
+    def add_batch(self, memory_ids: Sequence[str], vectors: np.ndarray, records: Sequence[Dict[str, Any]]):
+        """Bulk insert via COPY into a temporary staging table, then one upsert"""
+        if not (len(memory_ids) == len(vectors) == len(records)):
+            raise ValueError("memory_ids, vectors and records must have the same length")
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for memory_id, vector, record in zip(memory_ids, np.asarray(vectors, dtype=np.float32), records):
+            writer.writerow([
+                memory_id, record['content'], record['source'], json.dumps(record['metadata'], default=str),
+                record.get('user_id') or '', record['timestamp'],
+                '[' + ','.join(repr(float(x)) for x in vector) + ']'
+            ])
+        buffer.seek(0)
+
+        with self.connection() as conn, conn.cursor() as cur:
+            items = self._lock_count(cur)
+            cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {self.table}_staging "
+                        f"(LIKE {self.table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+            cur.copy_expert(
+                f"COPY {self.table}_staging (id, content, source, metadata, user_id, created_at, embedding) "
+                f"FROM STDIN WITH (FORMAT csv)", buffer)
+            cur.execute(
+                f"INSERT INTO {self.table} SELECT * FROM {self.table}_staging "
+                f"ON CONFLICT (id) DO UPDATE SET content = EXCLUDED.content, source = EXCLUDED.source, "
+                f"metadata = EXCLUDED.metadata, user_id = EXCLUDED.user_id, embedding = EXCLUDED.embedding "
+                f"RETURNING (xmax = 0)")
+            self._record_inserts(cur, items, sum(1 for (inserted,) in cur.fetchall() if inserted))
+        self._version += 1
+
+        if not self._index_ready:
+            self.ensure_index()
+
+    def _row_to_result(self, row) -> Tuple[Dict[str, Any], float]:
+        memory_id, content, source, metadata, user_id, created_at, score = row
+        return {
+            'id': memory_id,
+            'content': content,
+            'source': source,
+            'metadata': metadata or {},
+            'user_id': user_id,
+            'timestamp': created_at.isoformat() if isinstance(created_at, datetime) else str(created_at)
+        }, float(score)
+
+    def _query(self, query: np.ndarray, limit: int, threshold: float, after: Optional[Tuple[float, str]],
+               exact: bool, nprobe: Optional[int]) -> List[Tuple[Dict[str, Any], float]]:
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self.connection() as conn, conn.cursor() as cur:
+            if exact:
+                cur.execute("SET LOCAL enable_indexscan = off")
+            elif self.index_type == 'ivfflat':
+                if nprobe is not None:
+                    cur.execute("SET LOCAL ivfflat.probes = %s", (max(1, int(nprobe)),))
+            else:
+                # An HNSW scan yields at most ef_search rows, which would silently truncate larger pages
+                ef_search = max(int(nprobe) if nprobe is not None else self.HNSW_EF_SEARCH_DEFAULT, limit + 1)
+                cur.execute("SET LOCAL hnsw.ef_search = %s", (max(1, min(ef_search, self.HNSW_EF_SEARCH_MAX)),))
+
+            if after is None:
+                cur.execute(f"EXECUTE {self.TOPK_STATEMENT} (%s, %s, %s)", (query, 1.0 - threshold, limit))
+            else:
+                # Keyset continuation strictly after the cursor's row in (distance, id) order. The
+                # boundary distance is recomputed from that row's stored embedding, so it is exactly
+                # the value the previous page was ordered by (1 - score would not round-trip).
+                cur.execute(
+                    f"SELECT id, content, source, metadata, user_id, created_at, 1 - (embedding <=> %s) AS score "
+                    f"FROM {self.table} WHERE (embedding <=> %s) <= %s "
+                    f"AND ((embedding <=> %s), id) > ("
+                    f"COALESCE((SELECT embedding <=> %s FROM {self.table} WHERE id = %s), %s), %s) "
+                    f"ORDER BY embedding <=> %s, id LIMIT %s",
+                    (query, query, 1.0 - threshold, query, query, after[1], 1.0 - after[0], after[1],
+                     query, limit))
+            rows = cur.fetchall()
+
+        # Already in (distance, id) order, the order continuation cursors are compared in
+        return [self._row_to_result(row) for row in rows]
+
+    def search(self, query: np.ndarray, limit: int, threshold: float,
+               after: Optional[Tuple[float, str]] = None, exact: bool = False,
+               nprobe: Optional[int] = None, **options) -> List[Tuple[Dict[str, Any], float]]:
+        """Top-k cosine search executed server-side through the prepared statement"""
+        if limit <= 0:
+            return []
+        return self._query(query, limit, threshold, after, exact, nprobe)
+
+    def iter_search(self, query: np.ndarray, threshold: float, page_size: int, limit: Optional[int] = None,
+                    after: Optional[Tuple[float, str]] = None, exact: bool = False,
+                    nprobe: Optional[int] = None, **options) -> Iterator[List[Tuple[Dict[str, Any], float]]]:
+        """Pages of results fetched lazily with keyset pagination"""
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            page = self._query(query, size, threshold, after, exact, nprobe)
+            if not page:
+                return
+            yield page
+            if len(page) < size:
+                return
+            after = (page[-1][1], page[-1][0]['id'])
+            if remaining is not None:
+                remaining -= len(page)
+
+    def get(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute(f"SELECT id, content, source, metadata, user_id, created_at, 1.0 "
+                        f"FROM {self.table} WHERE id = %s", (memory_id,))
+            row = cur.fetchone()
+        return self._row_to_result(row)[0] if row else None
+
+    def __len__(self) -> int:
+        with self.connection() as conn, conn.cursor() as cur:
+            return self._count(cur)
+
+    def stats(self) -> Dict[str, Any]:
+        """Store and pool summary for status endpoints"""
+        try:
+            items = len(self)
+        except Exception as e:
+            logger.warning("Failed to count pgvector rows", error=str(e))
+            items = None
+        return {
+            'mode': 'pgvector',
+            'items': items,
+            'max_items': self.max_items,
+            'dimensions': self.dimensions,
+            'index_type': self.index_type,
+            'ann_index_ready': self._index_ready,
+            'pool': {
+                'min_connections': self.min_connections,
+                'max_connections': self.max_connections,
+                'in_use': self._in_use
+            }
+        }
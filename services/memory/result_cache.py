@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+OMAC Search Result Cache
+Redis-backed cache of /api/memory/search responses with precise invalidation
+"""
+
+import hashlib
+import json
+import re
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import redis
+import structlog
+
+from metrics import SEARCH_CACHE_LOOKUPS
+
+logger = structlog.get_logger()
+
+_WHITESPACE = re.compile(r'\s+')
+
+# threshold, floor, ceiling followed by the float32 query embedding
+_META_HEADER = struct.Struct('<fff')
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form used in cache keys: trimmed, case-folded, single-spaced"""
+    return _WHITESPACE.sub(' ', query.strip()).casefold()
+
+
+class SearchResultCache:
+    """
+    Shared cache of search responses for all memory service workers
+
+    Entries are keyed by normalized query, limit, threshold, user, cursor and
+    nprobe, expire after `ttl` seconds, and are bounded to `max_entries` by
+    evicting the oldest. Next to every entry the cache keeps the query
+    embedding and the score window the cached answer covers. When new
+    content is stored, only entries whose window the new embedding falls into
+    are deleted: score at or above the threshold, at or above the lowest
+    cached score when the page was full, and not above the cursor a
+    continuation page started after.
+
+    Each worker mirrors the cached embeddings and windows in memory. Puts
+    and evictions append the touched key to a shared change log that the
+    mirror replays incrementally; only invalidations (and compacting a log
+    that has grown past `LOG_COMPACT_FACTOR` times `max_entries`) make
+    workers re-read every entry.
+
+    Redis failures degrade to cache misses; search never fails because of
+    the cache.
+    """
+
+    LOG_COMPACT_FACTOR = 10
+
+    def __init__(self, redis_url: str, ttl: int = 300, max_entries: int = 1000,
+                 namespace: str = 'omac:search', socket_timeout: float = 0.25):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self.redis = redis.Redis.from_url(redis_url, socket_timeout=socket_timeout,
+                                          socket_connect_timeout=socket_timeout)
+        self._entries_key = f"{namespace}:entries"
+        self._meta_key = f"{namespace}:meta"
+        self._version_key = f"{namespace}:version"
+        self._changes_key = f"{namespace}:changes"
+        self._writes_key = f"{namespace}:writes"
+        self._stats_key = f"{namespace}:stats"
+
+        self._mirror_lock = threading.Lock()
+        self._mirror_version = None
+        self._mirror_changes = 0
+        self._mirror: Optional[Tuple[List[bytes], np.ndarray, np.ndarray]] = None
+
+    def ping(self) -> bool:
+        try:
+            return bool(self.redis.ping())
+        except redis.RedisError:
+            return False
+
+    def make_key(self, query: str, limit: int, threshold: float, user_id: str,
+                 cursor: Optional[str] = None, nprobe: Optional[int] = None) -> str:
+        raw = json.dumps([normalize_query(query), limit, round(threshold, 6), user_id, cursor, nprobe])
+        return f"{self.namespace}:entry:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """
+        Return (cached payload or None, write generation). Pass the generation
+        to put() so answers computed before a concurrent store are not cached.
+        """
+        try:
+            payload, generation = self.redis.mget(key, self._writes_key)
+            self.redis.hincrby(self._stats_key, 'hits' if payload else 'misses', 1)
+        except redis.RedisError as e:
+            logger.warning("Search cache lookup failed", error=str(e))
+            SEARCH_CACHE_LOOKUPS.labels('error').inc()
+            return None, None
+        SEARCH_CACHE_LOOKUPS.labels('hit' if payload else 'miss').inc()
+        return (json.loads(payload) if payload else None), int(generation or 0)
+
+    def put(self, key: str, payload: Dict[str, Any], query_vector: np.ndarray, threshold: float,
+            scores: List[float], limit: int, ceiling: Optional[float], generation: Optional[int]):
+        """Cache a response together with the score window it depends on"""
+        if generation is None:
+            return
+        floor = min(scores) if len(scores) >= limit else threshold
+        meta = _META_HEADER.pack(threshold, floor, np.inf if ceiling is None else ceiling) + \
+            np.asarray(query_vector, dtype=np.float32).tobytes()
+        now = time.time()
+        try:
+            # WATCH makes the generation check and the write one step: a store
+            # that bumps the generation in between aborts the transaction
+            with self.redis.pipeline() as pipe:
+                pipe.watch(self._writes_key)
+                if int(pipe.get(self._writes_key) or 0) != generation:
+                    return
+                pipe.multi()
+                pipe.set(key, json.dumps(payload, default=str), ex=self.ttl)
+                pipe.hset(self._meta_key, key, meta)
+                pipe.zadd(self._entries_key, {key: now})
+                pipe.rpush(self._changes_key, key)
+                changes = pipe.execute()[-1]
+            self._evict(now)
+            if changes > self.LOG_COMPACT_FACTOR * self.max_entries:
+                self._compact_log()
+        except redis.WatchError:
+            return
+        except redis.RedisError as e:
+            logger.warning("Search cache store failed", error=str(e))
+
+    def _evict(self, now: float):
+        """Drop expired and over-capacity entries (oldest first) with their metadata"""
+        expired = self.redis.zrangebyscore(self._entries_key, '-inf', now - self.ttl)
+        overflow = self.redis.zcard(self._entries_key) - len(expired) - self.max_entries
+        if overflow > 0:
+            expired += [k for k, _ in self.redis.zpopmin(self._entries_key, overflow + len(expired))][len(expired):]
+        if expired:
+            # Logged as changes: mirrors drop these rows without a full rebuild
+            pipe = self.redis.pipeline()
+            pipe.delete(*expired)
+            pipe.hdel(self._meta_key, *expired)
+            pipe.zrem(self._entries_key, *expired)
+            pipe.rpush(self._changes_key, *expired)
+            pipe.hincrby(self._stats_key, 'evictions', len(expired))
+            pipe.execute()
+
+    def _delete(self, keys: List[bytes]):
+        pipe = self.redis.pipeline()
+        pipe.delete(*keys)
+        pipe.hdel(self._meta_key, *keys)
+        pipe.zrem(self._entries_key, *keys)
+        # Workers rebuild their mirrors after an invalidation, so the change log starts over
+        pipe.delete(self._changes_key)
+        pipe.incr(self._version_key)
+        pipe.hincrby(self._stats_key, 'invalidations', len(keys))
+        pipe.execute()
+
+    def _compact_log(self):
+        """Start the change log over; each worker re-reads the metadata hash once"""
+        pipe = self.redis.pipeline()
+        pipe.delete(self._changes_key)
+        pipe.incr(self._version_key)
+        pipe.execute()
+
+    def _load_mirror(self) -> Optional[Tuple[List[bytes], np.ndarray, np.ndarray]]:
+        """
+        Decoded (keys, windows, embeddings) for every cached entry. Keys put
+        or evicted since the last call are read from the change log and
+        applied; the whole metadata hash is only re-read after the log was
+        started over.
+        """
+        with self._mirror_lock:
+            version, changes = self.redis.pipeline().get(self._version_key).llen(self._changes_key).execute()
+            if version == self._mirror_version:
+                if changes == self._mirror_changes:
+                    return self._mirror
+                pipe = self.redis.pipeline()
+                pipe.get(self._version_key)
+                pipe.lrange(self._changes_key, self._mirror_changes, changes - 1)
+                current, changed_keys = pipe.execute()
+                if current == version:
+                    changed_keys = list(dict.fromkeys(changed_keys))
+                    self._apply_to_mirror(changed_keys, self.redis.hmget(self._meta_key, changed_keys))
+                    self._mirror_changes = changes
+                    return self._mirror
+
+            pipe = self.redis.pipeline()
+            pipe.get(self._version_key)
+            pipe.llen(self._changes_key)
+            pipe.hgetall(self._meta_key)
+            version, changes, raw = pipe.execute()
+            self._mirror, self._mirror_version, self._mirror_changes = None, version, changes
+            self._apply_to_mirror(list(raw.keys()), list(raw.values()))
+            return self._mirror
+
+    def _apply_to_mirror(self, keys: List[bytes], metas: List[Optional[bytes]]):
+        """Add or replace mirror rows for keys with metadata, drop rows for keys without (caller holds the mirror lock)"""
+        rows = {k: m for k, m in zip(keys, metas) if m is not None}
+        if self._mirror is not None:
+            old_keys, old_windows, old_vectors = self._mirror
+            touched = set(keys)
+            keep = [i for i, k in enumerate(old_keys) if k not in touched]
+            if len(keep) < len(old_keys):
+                self._mirror = ([old_keys[i] for i in keep], old_windows[keep], old_vectors[keep]) if keep else None
+        if not rows:
+            return
+        windows = np.array([_META_HEADER.unpack_from(m) for m in rows.values()], dtype=np.float32)
+        vectors = np.stack([np.frombuffer(m, dtype=np.float32, offset=_META_HEADER.size) for m in rows.values()])
+        if self._mirror is None:
+            self._mirror = (list(rows), windows, vectors)
+            return
+        old_keys, old_windows, old_vectors = self._mirror
+        self._mirror = (old_keys + list(rows),
+                        np.concatenate([old_windows, windows]),
+                        np.concatenate([old_vectors, vectors]))
+
+    def invalidate(self, vectors: np.ndarray):
+        """Delete cached answers that newly stored embeddings could change"""
+        try:
+            self.redis.incr(self._writes_key)
+            mirror = self._load_mirror()
+            if mirror is None:
+                return
+            keys, windows, cached = mirror
+            vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            queries = cached / np.maximum(np.linalg.norm(cached, axis=1, keepdims=True), 1e-12)
+            scores = vectors @ queries.T
+            lower = np.maximum(windows[:, 0], windows[:, 1])
+            affected = ((scores >= lower) & (scores <= windows[:, 2])).any(axis=0)
+            stale = [keys[i] for i in np.flatnonzero(affected)]
+            if stale:
+                self._delete(stale)
+                logger.info("Search cache entries invalidated", count=len(stale))
+        except redis.RedisError as e:
+            logger.warning("Search cache invalidation failed", error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        """Shared hit/miss/eviction counters across all workers"""
+        try:
+            counters = {k.decode(): int(v) for k, v in self.redis.hgetall(self._stats_key).items()}
+            entries = self.redis.zcard(self._entries_key)
+        except redis.RedisError as e:
+            return {'available': False, 'error': str(e)}
+        hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+        return {
+            'available': True,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'invalidations': counters.get('invalidations', 0),
+            'evictions': counters.get('evictions', 0)
+        }
@@ -5,12 +5,132 @@ This module provides integration between the OMAC Memory Service and n8n for wor
 
 import os
 import json
+import random
+import asyncio
 import logging
-import requests
-from typing import Dict, Any, Optional
+import aiohttp
+from typing import Dict, Any, List, Optional
 
 logger = logging.getLogger(__name__)
 
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+class WebhookDeliveryError(Exception):
+    """Raised when a webhook could not be delivered after all retries"""
+    def __init__(self, message: str, status: Optional[int] = None, attempts: int = 0):
+        super().__init__(message)
+        self.status = status
+        self.attempts = attempts
+
+class WebhookDispatcher:
+    """
+    Non-blocking n8n webhook sender
+    
+    All calls share one aiohttp session whose connector keeps connections
+    alive and pools them per host, so a burst of memory events reuses a
+    handful of TCP connections instead of opening one per event. A semaphore
+    caps in-flight requests, every attempt has its own timeout, and
+    retryable failures (connection errors, timeouts, 408/429/5xx) back off
+    exponentially with full jitter, honouring Retry-After when n8n sends it.
+    """
+    
+    def __init__(self, max_concurrency: int = 200, pool_size: int = 100, pool_size_per_host: int = 0,
+                 timeout: float = 10.0, connect_timeout: float = 3.0, max_retries: int = 3,
+                 backoff_base: float = 0.25, backoff_max: float = 10.0, keepalive_timeout: float = 30.0):
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.pool_size_per_host = pool_size_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    @classmethod
+    def from_env(cls) -> 'WebhookDispatcher':
+        """Build a dispatcher from N8N_WEBHOOK_* environment variables"""
+        return cls(
+            max_concurrency=int(os.environ.get("N8N_WEBHOOK_CONCURRENCY", "200")),
+            pool_size=int(os.environ.get("N8N_WEBHOOK_POOL_SIZE", "100")),
+            timeout=float(os.environ.get("N8N_WEBHOOK_TIMEOUT", "10")),
+            max_retries=int(os.environ.get("N8N_WEBHOOK_MAX_RETRIES", "3")),
+            backoff_base=float(os.environ.get("N8N_WEBHOOK_BACKOFF_BASE", "0.25"))
+        )
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Shared session for the running event loop, created on first use"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={"Content-Type": "application/json"},
+                json_serialize=lambda obj: json.dumps(obj, default=str)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._session
+    
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(self.backoff_max, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    async def post(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        POST a JSON payload, retrying transient failures
+        
+        Returns the decoded JSON response (or {"status": "ok", "body": text}
+        for non-JSON replies); raises WebhookDeliveryError once retries are
+        exhausted or on a non-retryable HTTP status.
+        """
+        session = await self._get_session()
+        last_error, last_status = None, None
+        
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    async with session.post(url, json=payload) as response:
+                        if response.status < 400:
+                            try:
+                                return await response.json(content_type=None)
+                            except (ValueError, aiohttp.ContentTypeError):
+                                return {"status": "ok", "body": await response.text()}
+                        
+                        last_status = response.status
+                        last_error = f"HTTP {response.status}: {(await response.text())[:200]}"
+                        if response.status not in RETRYABLE_STATUSES:
+                            raise WebhookDeliveryError(last_error, last_status, attempt + 1)
+                        retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = str(e) or type(e).__name__
+            
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt, retry_after)
+                logger.warning(f"Webhook {url} attempt {attempt + 1} failed ({last_error}); retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        
+        raise WebhookDeliveryError(last_error or "Webhook delivery failed", last_status, self.max_retries + 1)
+    
+    async def close(self):
+        """Close the pooled session and its connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
 class McpServer:
     """Base MCP Server class"""
     def __init__(self, name: str):
@@ -27,11 +147,15 @@ class WorkflowTriggerRequest:
 class OMACMemoryServer(McpServer):
     """OMAC Memory Server with n8n Integration"""
     
-    def __init__(self):
+    def __init__(self, outbox=None):
         super().__init__("omac-memory")
+        # Optional webhook_outbox.WebhookOutbox; when set, registrations are
+        # persisted and failed triggers are queued for redelivery
+        self.outbox = outbox
         self.n8n_host = os.environ.get("N8N_HOST", "n8n.localhost")
         self.n8n_protocol = os.environ.get("N8N_PROTOCOL", "http")
         self.webhook_base_url = f"{self.n8n_protocol}://{self.n8n_host}/webhook/"
+        self.dispatcher = WebhookDispatcher.from_env()
     
     async def handle_workflow_trigger(self, request: WorkflowTriggerRequest) -> Dict[str, Any]:
         """
@@ -57,16 +181,31 @@ class OMACMemoryServer(McpServer):
         logger.info(f"Triggering n8n workflow {request.workflow_id} with memory {request.memory_id}")
         
         try:
-            response = requests.post(
-                webhook_url,
-                headers={"Content-Type": "application/json"},
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return await self.dispatcher.post(webhook_url, payload)
+        except WebhookDeliveryError as e:
+            if self.outbox is not None and (e.status is None or e.status in RETRYABLE_STATUSES):
+                # SQLite write: keep it off the event loop
+                await asyncio.to_thread(self.outbox.enqueue_delivery, request.workflow_id, request.memory_id, payload)
+                logger.warning(f"n8n workflow {request.workflow_id} unavailable, queued for redelivery: {str(e)}")
+                return {"error": str(e), "status": "queued", "attempts": e.attempts}
             logger.error(f"Error triggering n8n workflow: {str(e)}")
-            return {"error": str(e), "status": "failed"}
+            return {"error": str(e), "status": "failed", "attempts": e.attempts}
+    
+    async def handle_workflow_triggers(self, requests: List[WorkflowTriggerRequest]) -> List[Dict[str, Any]]:
+        """
+        Trigger many workflows concurrently over the shared connection pool
+        
+        Args:
+            requests: Workflow trigger requests, e.g. a burst of memory events
+            
+        Returns:
+            One result per request, in the same order
+        """
+        return await asyncio.gather(*(self.handle_workflow_trigger(r) for r in requests))
+    
+    async def close(self):
+        """Release pooled webhook connections"""
+        await self.dispatcher.close()
     
     async def register_memory_webhook(self, memory_type: str, workflow_id: str) -> Dict[str, Any]:
         """
@@ -79,10 +218,14 @@ class OMACMemoryServer(McpServer):
         Returns:
             Registration status
         """
-        # In a real implementation, this would store the registration in a database
+        if self.outbox is not None:
+            created = self.outbox.register(memory_type, workflow_id)
+            status = "registered" if created else "already_registered"
+        else:
+            status = "registered"
         logger.info(f"Registered webhook for memory type {memory_type} to workflow {workflow_id}")
         return {
-            "status": "registered",
+            "status": status,
             "memory_type": memory_type,
             "workflow_id": workflow_id,
             "webhook_url": f"{self.webhook_base_url}{workflow_id}"
@@ -109,5 +252,8 @@ async def trigger_workflow_example():
     )
     
     # Trigger the workflow
-    result = await server.handle_workflow_trigger(request)
-    print(f"Workflow trigger result: {json.dumps(result, indent=2)}")
+    try:
+        result = await server.handle_workflow_trigger(request)
+        print(f"Workflow trigger result: {json.dumps(result, indent=2)}")
+    finally:
+        await server.close()
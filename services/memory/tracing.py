@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+OMAC Tracing
+Opt-in OpenTelemetry spans for the memory service; continues callers' W3C
+trace context and passes it on in fan-out calls
+"""
+
+import contextlib
+from typing import Any, Dict, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+try:
+    from opentelemetry import propagate, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    TRACING_AVAILABLE = True
+except ImportError:
+    TRACING_AVAILABLE = False
+
+_NOOP = contextlib.nullcontext()
+_tracer = None
+
+
+def _exporter(kind: str, file_path: Optional[str]):
+    if kind == 'otlp':
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    if kind == 'file':
+        out = open(file_path, 'a', buffering=1)
+        return ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + '\n')
+    return ConsoleSpanExporter()
+
+
+def configure(service_name: str, enabled: bool, sample_rate: float = 0.1, exporter: str = 'console',
+              file_path: Optional[str] = None) -> bool:
+    """
+    Set up the tracer provider when TRACING_ENABLED; returns whether spans
+    are recorded. Requests arriving with a traceparent keep the caller's
+    sampling decision, new ones are sampled at `sample_rate`.
+    """
+    global _tracer
+    if not enabled:
+        return False
+    if not TRACING_AVAILABLE:
+        logger.warning("Tracing enabled but opentelemetry-sdk is not installed - running without spans")
+        return False
+    try:
+        span_exporter = _exporter(exporter, file_path)
+    except Exception as e:
+        logger.error("Tracing exporter unavailable, running without spans", exporter=exporter, error=str(e))
+        return False
+
+    provider = TracerProvider(
+        resource=Resource.create({'service.name': service_name}),
+        sampler=ParentBased(TraceIdRatioBased(max(0.0, min(1.0, sample_rate))))
+    )
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer(service_name)
+    logger.info("Tracing enabled", exporter=exporter, sample_rate=sample_rate)
+    return True
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, **attributes: Any):
+    """Context manager timing `name` as a child of the current span; free when tracing is off"""
+    if _tracer is None:
+        return _NOOP
+    return _tracer.start_as_current_span(name, attributes=attributes or None)
+
+
+def inject(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Add traceparent/tracestate for the current span to outgoing Twinning service `headers`"""
+    headers = {} if headers is None else headers
+    if _tracer is not None:
+        propagate.inject(headers)
+    return headers
+
+
+def instrument_app(app, exclude=('/health', '/metrics')):
+    """Server span per request under the caller's traceparent, tagged with X-User-Id"""
+    if _tracer is None:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_span():
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        if route in exclude:
+            return
+        manager = _tracer.start_as_current_span(
+            f"{request.method} {route}",
+            context=propagate.extract(request.headers),
+            kind=trace.SpanKind.SERVER,
+            attributes={'http.request.method': request.method, 'http.route': route,
+                        'enduser.id': request.headers.get('X-User-Id', 'anonymous')})
+        g._trace_span = manager.__enter__()
+        g._trace_manager = manager
+
+    @app.after_request
+    def _record_status(response):
+        current = getattr(g, '_trace_span', None)
+        if current is not None:
+            current.set_attribute('http.response.status_code', response.status_code)
+            if response.status_code >= 500:
+                current.set_status(trace.Status(trace.StatusCode.ERROR))
+        return response
+
+    @app.teardown_request
+    def _end_span(error=None):
+        manager = g.pop('_trace_manager', None)
+        if manager is not None:
+            g.pop('_trace_span', None)
+            if error is not None:
+                manager.__exit__(type(error), error, error.__traceback__)
+            else:
+                manager.__exit__(None, None, None)
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+OMAC Vector Index
+In-process semantic index over a contiguous float32 embedding matrix
+"""
+
+import os
+import json
+import glob
+import uuid
+import fcntl
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class IndexFullError(Exception):
+    """Raised when a write would exceed the configured MAX_MEMORY_ITEMS"""
+
+
+class SnapshotConflictError(Exception):
+    """Raised when another process has written the snapshot this index would replace"""
+
+
+class VectorIndex:
+    """
+    Exact cosine-similarity index for OMAC memory items
+
+    Embeddings are L2-normalised on insert and stored row-wise in a single
+    contiguous float32 matrix, so a top-k query is one matrix-vector product
+    followed by a partial sort. Writers append under a lock; readers take a
+    snapshot of the matrix reference and row count and score without holding
+    the lock, which lets concurrent searches run in parallel while NumPy has
+    released the GIL.
+    """
+
+    def __init__(self, dimensions: int, max_items: int, initial_capacity: int = 1024):
+        self.dimensions = dimensions
+        self.max_items = max_items
+        self._lock = threading.RLock()
+        self._vectors = np.zeros((max(1, min(initial_capacity, max_items)), dimensions), dtype=np.float32)
+        self._ids: List[str] = []
+        self._records: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._size = 0
+        self._version = 0
+        self._generation: Optional[str] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._vectors.shape[0]
+
+    @property
+    def version(self) -> int:
+        """Monotonic write counter, used to decide when a snapshot is stale"""
+        return self._version
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        """Return float32 unit-length copies of the given row vector(s)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[-1] != self.dimensions:
+            raise ValueError(f"Expected {self.dimensions}-dimensional embeddings, got {vectors.shape[-1]}")
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _reserve(self, rows: int):
+        """Grow the embedding matrix (doubling) so that `rows` more items fit"""
+        required = self._size + rows
+        if required > self.max_items:
+            raise IndexFullError(
+                f"Memory index is full ({self._size}/{self.max_items} items)")
+        if required <= self.capacity:
+            return
+        new_capacity = min(self.max_items, max(required, self.capacity * 2))
+        grown = np.zeros((new_capacity, self.dimensions), dtype=np.float32)
+        grown[:self._size] = self._vectors[:self._size]
+        # Swap the reference last so in-flight readers keep a consistent snapshot
+        self._vectors = grown
+
+    def add(self, memory_id: str, vector: np.ndarray, record: Dict[str, Any]):
+        """Insert or replace a single memory item"""
+        self.add_batch([memory_id], np.asarray(vector)[np.newaxis, :], [record])
+
+    def add_batch(self, memory_ids: Sequence[str], vectors: np.ndarray, records: Sequence[Dict[str, Any]]):
+        """Insert or replace many memory items with one matrix write"""
+        if not (len(memory_ids) == len(vectors) == len(records)):
+            raise ValueError("memory_ids, vectors and records must have the same length")
+        normalized = self._normalize(vectors).reshape(-1, self.dimensions)
+
+        with self._lock:
+            new_rows, positions = [], np.empty(len(memory_ids), dtype=np.int64)
+            for row, memory_id in enumerate(memory_ids):
+                position = self._positions.get(memory_id)
+                if position is not None:
+                    self._vectors[position] = normalized[row]
+                    self._records[position] = records[row]
+                    positions[row] = position
+                else:
+                    new_rows.append(row)
+
+            if new_rows:
+                self._reserve(len(new_rows))
+                start = self._size
+                self._vectors[start:start + len(new_rows)] = normalized[new_rows]
+                for offset, row in enumerate(new_rows):
+                    self._ids.append(memory_ids[row])
+                    self._records.append(records[row])
+                    self._positions[memory_ids[row]] = start + offset
+                    positions[row] = start + offset
+
+            self._index_rows(positions, normalized)
+            # Publish the new rows only after they are fully written and indexed
+            self._size += len(new_rows)
+            self._version += 1
+
+    def _index_rows(self, positions: np.ndarray, normalized: np.ndarray):
+        """Hook for subclasses that maintain secondary structures over rows"""
+
+    def _candidate_rows(self, query: np.ndarray, size: int, **options) -> Optional[np.ndarray]:
+        """Rows to score for a query; None means a full exact scan"""
+        return None
+
+    def get(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored record for a memory ID, if present"""
+        position = self._positions.get(memory_id)
+        return self._records[position] if position is not None else None
+
+    def _eligible(self, query: np.ndarray, threshold: float, after: Optional[Tuple[float, str]],
+                  exact: bool, options: Dict[str, Any]):
+        """
+        Score the candidate rows and keep those at or above `threshold` that
+        rank strictly after the `after` (score, id) cursor. Returns
+        (scores, positions, ids, records) snapshots, or None if empty.
+        """
+        query = self._normalize(query)
+        with self._lock:
+            vectors, size, ids, records = self._vectors, self._size, self._ids, self._records
+
+        if size == 0:
+            return None
+
+        rows = None if exact else self._candidate_rows(query, size, **options)
+        scores = vectors[:size] @ query if rows is None else vectors[rows] @ query
+
+        keep = scores >= threshold
+        if after is not None:
+            after_score, after_id = np.float32(after[0]), after[1]
+            ties = np.flatnonzero(keep & (scores == after_score))
+            keep &= scores < after_score
+            tie_positions = ties if rows is None else rows[ties]
+            keep[np.array([t for t, p in zip(ties, tie_positions) if ids[p] > after_id], dtype=np.int64)] = True
+
+        candidates = np.flatnonzero(keep)
+        positions = candidates if rows is None else rows[candidates]
+        return scores[candidates], positions, ids, records
+
+    def _take_top(self, scores: np.ndarray, positions: np.ndarray, ids: List[str], limit: int) -> List[int]:
+        """
+        Indices (into `scores`) of the best `limit` entries ordered by score
+        descending then memory ID ascending, so equal scores page stably
+        """
+        if scores.size > limit:
+            kth = np.partition(scores, -limit)[-limit]
+            top = np.flatnonzero(scores >= kth)
+        else:
+            top = np.arange(scores.size)
+        values = scores[top].tolist()
+        order = sorted(range(len(top)), key=lambda j: (-values[j], ids[positions[top[j]]]))
+        return [int(top[j]) for j in order[:limit]]
+
+    def search(self, query: np.ndarray, limit: int, threshold: float,
+               after: Optional[Tuple[float, str]] = None, exact: bool = False,
+               **options) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Return up to `limit` (record, cosine similarity) pairs scoring at or
+        above `threshold`, best match first. `after` is the (score, id) of the
+        last result of the previous page. `exact` forces a full scan even
+        when a subclass narrows the candidate set.
+        """
+        if limit <= 0:
+            return []
+        eligible = self._eligible(query, threshold, after, exact, options)
+        if eligible is None:
+            return []
+
+        scores, positions, ids, records = eligible
+        return [(records[positions[i]], float(scores[i])) for i in self._take_top(scores, positions, ids, limit)]
+
+    def iter_search(self, query: np.ndarray, threshold: float, page_size: int, limit: Optional[int] = None,
+                    after: Optional[Tuple[float, str]] = None, exact: bool = False,
+                    **options) -> Iterator[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Yield successive pages of at most `page_size` results, in the same
+        order as search(), from a single scoring pass; stops after `limit`
+        results in total when given
+        """
+        eligible = self._eligible(query, threshold, after, exact, options)
+        if eligible is None:
+            return
+
+        scores, positions, ids, records = eligible
+        remaining = scores.size if limit is None else min(limit, scores.size)
+        while remaining > 0:
+            top = self._take_top(scores, positions, ids, min(page_size, remaining))
+            yield [(records[positions[i]], float(scores[i])) for i in top]
+            remaining -= len(top)
+            rest = np.ones(scores.size, dtype=bool)
+            rest[top] = False
+            scores, positions = scores[rest], positions[rest]
+
+    def _state(self, size: int) -> Dict[str, np.ndarray]:
+        """Arrays persisted by save(); subclasses extend with their own structures"""
+        return {'vectors': self._vectors[:size]}
+
+    def _restore_state(self, arrays: Dict[str, np.ndarray]):
+        """Counterpart of _state() applied by load() after rows are restored"""
+
+    def save(self, path: str):
+        """
+        Atomically persist embeddings and records under `path`
+
+        Each snapshot is a generation: `path.<gen>.npz` and `path.<gen>.jsonl`
+        are written in full, then `path.current` is switched to name the new
+        generation with a single rename, so a reader never pairs the arrays of
+        one snapshot with the records of another. The previous generation is
+        kept for readers that are still opening it.
+
+        A snapshot has a single writer: the index lives in one process, and two
+        processes saving to the same path would each replace the other's items.
+        The lock file only serialises overlapping saves; if `path.current` names
+        a generation this index neither loaded nor wrote, SnapshotConflictError
+        is raised rather than overwriting it.
+        """
+        with self._lock:
+            size, version = self._size, self._version
+            arrays = {k: np.array(v, copy=True) for k, v in self._state(size).items()}
+            ids, records = self._ids[:size], self._records[:size]
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        generation = uuid.uuid4().hex
+        with open(f"{path}.lock", 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(f"{path}.{generation}.npz", 'wb') as f:
+                    np.savez(f, ids=np.array(ids, dtype=str), **arrays)
+                with open(f"{path}.{generation}.jsonl", 'w', encoding='utf-8') as f:
+                    for record in records:
+                        f.write(json.dumps(record, default=str))
+                        f.write('\n')
+                previous = self._current_generation(path)
+                if previous is not None and previous != self._generation:
+                    os.remove(f"{path}.{generation}.npz")
+                    os.remove(f"{path}.{generation}.jsonl")
+                    raise SnapshotConflictError(
+                        f"Snapshot at {path} was written by another process (generation {previous})")
+                tmp_pointer = f"{path}.current.{os.getpid()}.{generation}.tmp"
+                with open(tmp_pointer, 'w', encoding='utf-8') as f:
+                    f.write(generation)
+                os.replace(tmp_pointer, f"{path}.current")
+                self._generation = generation
+                self._remove_generations(path, keep={generation, previous})
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return version
+
+    @staticmethod
+    def _current_generation(path: str) -> Optional[str]:
+        try:
+            with open(f"{path}.current", encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _remove_generations(path: str, keep: set):
+        for name in glob.glob(f"{glob.escape(path)}.*.npz") + glob.glob(f"{glob.escape(path)}.*.jsonl"):
+            generation = name[len(path) + 1:].rsplit('.', 1)[0]
+            if generation not in keep:
+                try:
+                    os.remove(name)
+                except OSError:
+                    pass
+        # Pre-generation snapshots are superseded by the first generation written
+        for legacy in (f"{path}.npz", f"{path}.jsonl"):
+            if os.path.exists(legacy):
+                os.remove(legacy)
+
+    def load(self, path: str) -> bool:
+        """Restore a snapshot written by save(); returns False if none exists"""
+        generation = self._current_generation(path)
+        # A snapshot this index has read is one it may replace, even if unreadable
+        self._generation = generation
+        prefix = f"{path}.{generation}" if generation else path
+        if not (os.path.exists(f"{prefix}.npz") and os.path.exists(f"{prefix}.jsonl")):
+            return False
+
+        with np.load(f"{prefix}.npz", allow_pickle=False) as data:
+            arrays = {k: data[k] for k in data.files}
+        with open(f"{prefix}.jsonl", encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+
+        ids = [str(i) for i in arrays.pop('ids')]
+        vectors = arrays.pop('vectors')
+        if len(ids) != len(records) or len(ids) != len(vectors):
+            raise ValueError(f"Index snapshot at {path} is inconsistent")
+        if vectors.shape[1:] != (self.dimensions,):
+            raise ValueError(f"Index snapshot at {path} has {vectors.shape[1]} dimensions, expected {self.dimensions}")
+
+        with self._lock:
+            self._vectors = np.zeros((min(self.max_items, max(len(ids), self.capacity)), self.dimensions), dtype=np.float32)
+            self._size = 0
+            self._reserve(len(ids))
+            self._vectors[:len(ids)] = vectors
+            self._ids, self._records = ids, records
+            self._positions = {memory_id: i for i, memory_id in enumerate(ids)}
+            self._restore_state(arrays)
+            self._size = len(ids)
+            self._version += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size and footprint summary for status endpoints"""
+        return {
+            'mode': 'exact',
+            'items': self._size,
+            'capacity': self.capacity,
+            'max_items': self.max_items,
+            'dimensions': self.dimensions,
+            'matrix_bytes': int(self._vectors.nbytes)
+        }
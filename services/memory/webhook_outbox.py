@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+OMAC Webhook Outbox
+Durable SQLite queue of memory events awaiting delivery to n8n workflows
+"""
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import structlog
+
+from src.mcp.workflow_integration import WebhookDispatcher, WebhookDeliveryError, RETRYABLE_STATUSES
+
+logger = structlog.get_logger()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_registrations (
+    memory_type TEXT NOT NULL,
+    workflow_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (memory_type, workflow_id)
+);
+CREATE TABLE IF NOT EXISTS webhook_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    workflow_id TEXT NOT NULL,
+    memory_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    leased_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS webhook_outbox_due ON webhook_outbox (next_attempt_at);
+CREATE TABLE IF NOT EXISTS webhook_dead_letters (
+    id INTEGER PRIMARY KEY,
+    workflow_id TEXT NOT NULL,
+    memory_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+# Registrations under this memory type receive every stored memory
+WILDCARD_TYPE = '*'
+
+
+def memory_type_of(source: str, metadata: Dict[str, Any]) -> str:
+    """Memory type used to match registrations: metadata 'type', else the source"""
+    return str(metadata.get('type') or source)
+
+
+class WebhookOutbox:
+    """
+    Durable delivery queue between memory writes and n8n
+
+    Storing a memory only inserts one row per matching registration into a
+    SQLite file on the data volume, so writes never wait on n8n. The insert
+    happens after the memory write and is not atomic with it: if it fails,
+    the write still succeeds, the error is logged and those events are not
+    delivered. A drain
+    thread runs `workers` concurrent loops that each lease a batch of due
+    rows, deliver them over the shared pooled webhook session, and delete
+    what succeeded. Failures are rescheduled with jittered exponential
+    backoff; rows that exhaust `max_attempts` or get a non-retryable status
+    move to the dead-letter table, from where they can be replayed.
+
+    Leases make it safe for several service processes to drain the same
+    file, and rows leased by a process that died become due again once the
+    lease expires.
+    """
+
+    def __init__(self, db_path: str, webhook_base_url: str, workers: int = 4, batch_size: int = 50,
+                 max_attempts: int = 8, backoff_base: float = 1.0, backoff_max: float = 300.0,
+                 poll_interval: float = 1.0, lease_seconds: float = 60.0,
+                 dispatcher: Optional[WebhookDispatcher] = None):
+        self.db_path = db_path
+        self.webhook_base_url = webhook_base_url
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        # The outbox owns the retry schedule, so each dispatch is a single attempt
+        self.dispatcher = dispatcher or WebhookDispatcher(max_retries=0)
+
+        self._local = threading.local()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self._types_lock = threading.Lock()
+        self._types: Optional[set] = None
+        self._types_loaded_at = 0.0
+
+        self.enqueued = 0
+        self.delivered = 0
+        self.retried = 0
+        self.dead_lettered = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self, mode: str = ''):
+        """Explicit transaction on the thread's autocommit connection"""
+        conn = self._connection()
+        conn.execute(f'BEGIN {mode}')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    # Registrations
+
+    def register(self, memory_type: str, workflow_id: str) -> bool:
+        """Route memories of `memory_type` to `workflow_id`; False if already registered"""
+        cursor = self._connection().execute(
+            'INSERT OR IGNORE INTO webhook_registrations (memory_type, workflow_id, created_at) VALUES (?, ?, ?)',
+            (memory_type, workflow_id, time.time()))
+        self._types = None
+        return cursor.rowcount > 0
+
+    def unregister(self, memory_type: str, workflow_id: str) -> bool:
+        cursor = self._connection().execute(
+            'DELETE FROM webhook_registrations WHERE memory_type = ? AND workflow_id = ?',
+            (memory_type, workflow_id))
+        self._types = None
+        return cursor.rowcount > 0
+
+    def registrations(self) -> List[Dict[str, Any]]:
+        rows = self._connection().execute(
+            'SELECT memory_type, workflow_id, created_at FROM webhook_registrations ORDER BY memory_type, workflow_id')
+        return [{'memory_type': t, 'workflow_id': w, 'webhook_url': f"{self.webhook_base_url}{w}", 'registered_at': c}
+                for t, w, c in rows]
+
+    def _registered_types(self) -> set:
+        """
+        Memory types with at least one registration, re-read every few seconds
+        so stores skip the database entirely when nothing is listening
+        """
+        with self._types_lock:
+            if self._types is None or time.monotonic() - self._types_loaded_at > 5:
+                self._types = {row[0] for row in self._connection().execute(
+                    'SELECT DISTINCT memory_type FROM webhook_registrations')}
+                self._types_loaded_at = time.monotonic()
+            return self._types
+
+    # Producing
+
+    def enqueue(self, records: Sequence[Dict[str, Any]]) -> int:
+        """
+        Queue one delivery per (stored memory, matching registration) in a
+        single transaction; returns the number of rows queued
+        """
+        types = self._registered_types()
+        if not types:
+            return 0
+        wanted = [r for r in records if WILDCARD_TYPE in types
+                  or memory_type_of(r.get('source', ''), r.get('metadata') or {}) in types]
+        if not wanted:
+            return 0
+
+        conn = self._connection()
+        routes: Dict[str, List[str]] = {}
+        for memory_type, workflow_id in conn.execute('SELECT memory_type, workflow_id FROM webhook_registrations'):
+            routes.setdefault(memory_type, []).append(workflow_id)
+
+        now = time.time()
+        rows = []
+        for record in wanted:
+            metadata = record.get('metadata') or {}
+            memory_type = memory_type_of(record.get('source', ''), metadata)
+            payload = json.dumps({
+                'memory_id': record['id'],
+                'memory_type': memory_type,
+                'content': record.get('content'),
+                'metadata': metadata,
+                'timestamp': record.get('timestamp'),
+                'source': record.get('source'),
+                'tags': metadata.get('tags', [])
+            }, default=str)
+            for workflow_id in set(routes.get(memory_type, []) + routes.get(WILDCARD_TYPE, [])):
+                rows.append((workflow_id, record['id'], payload, now, now))
+
+        return self._insert(rows)
+
+    def enqueue_delivery(self, workflow_id: str, memory_id: str, payload: Dict[str, Any],
+                         delay: float = 0.0) -> int:
+        """Queue a payload for one specific workflow, e.g. after a direct trigger failed"""
+        now = time.time()
+        return self._insert([(workflow_id, memory_id, json.dumps(payload, default=str), now + delay, now)])
+
+    def _insert(self, rows: List[Tuple[str, str, str, float, float]]) -> int:
+        if rows:
+            with self._transaction() as conn:
+                conn.executemany(
+                    'INSERT INTO webhook_outbox (workflow_id, memory_id, payload, next_attempt_at, created_at) '
+                    'VALUES (?, ?, ?, ?, ?)', rows)
+            self.enqueued += len(rows)
+            self._notify()
+        return len(rows)
+
+    # Draining
+
+    def start(self):
+        """Start the background drain thread (idempotent)"""
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='omac-webhook-outbox', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping = True
+        self._notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _notify(self):
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None:
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def _run(self):
+        asyncio.run(self._drain())
+
+    async def _drain(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        logger.info("Webhook outbox draining", db_path=self.db_path, workers=self.workers,
+                   batch_size=self.batch_size)
+        try:
+            await asyncio.gather(*(self._worker() for _ in range(self.workers)))
+        finally:
+            await self.dispatcher.close()
+            self._loop = None
+
+    async def _worker(self):
+        # One bad iteration must not end the worker: gather() would stop the whole drain thread
+        while not self._stopping:
+            try:
+                batch = await asyncio.to_thread(self._claim)
+                if batch:
+                    await self._deliver_batch(batch)
+                    continue
+            except Exception as e:
+                # Leased rows are retried once their lease expires
+                logger.error("Webhook outbox iteration failed", error=str(e), error_type=type(e).__name__)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claim(self) -> List[Tuple[int, str, str, int]]:
+        """Lease up to `batch_size` due rows so no other worker delivers them"""
+        now = time.time()
+        with self._transaction('IMMEDIATE') as conn:
+            rows = conn.execute(
+                'SELECT id, workflow_id, payload, attempts FROM webhook_outbox '
+                'WHERE next_attempt_at <= ? AND leased_until <= ? ORDER BY next_attempt_at LIMIT ?',
+                (now, now, self.batch_size)).fetchall()
+            if rows:
+                conn.executemany('UPDATE webhook_outbox SET leased_until = ? WHERE id = ?',
+                                 [(now + self.lease_seconds, row[0]) for row in rows])
+        return rows
+
+    async def _deliver_batch(self, batch: List[Tuple[int, str, str, int]]):
+        async def deliver(row):
+            row_id, workflow_id, payload, attempts = row
+            try:
+                await self.dispatcher.post(f"{self.webhook_base_url}{workflow_id}", json.loads(payload))
+                return row_id, attempts, None, None
+            except WebhookDeliveryError as e:
+                return row_id, attempts, str(e), e.status
+            except Exception as e:
+                return row_id, attempts, str(e) or type(e).__name__, None
+
+        outcomes = await asyncio.gather(*(deliver(row) for row in batch))
+        await asyncio.to_thread(self._settle, outcomes)
+
+    def _backoff(self, attempts: int) -> float:
+        return random.uniform(0.5, 1.0) * min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+
+    def _settle(self, outcomes: List[Tuple[int, int, Optional[str], Optional[int]]]):
+        """Delete delivered rows, reschedule retryable failures, dead-letter the rest"""
+        now = time.time()
+        delivered, retry, dead = [], [], []
+        for row_id, attempts, error, status in outcomes:
+            attempts += 1
+            if error is None:
+                delivered.append((row_id,))
+            elif attempts >= self.max_attempts or (status is not None and status not in RETRYABLE_STATUSES):
+                dead.append((attempts, error, now, row_id))
+            else:
+                retry.append((attempts, now + self._backoff(attempts), error, row_id))
+
+        with self._transaction() as conn:
+            if delivered:
+                conn.executemany('DELETE FROM webhook_outbox WHERE id = ?', delivered)
+            if retry:
+                conn.executemany('UPDATE webhook_outbox SET attempts = ?, next_attempt_at = ?, leased_until = 0, '
+                                 'last_error = ? WHERE id = ?', retry)
+            if dead:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO webhook_dead_letters '
+                    '(id, workflow_id, memory_id, payload, attempts, last_error, created_at, failed_at) '
+                    'SELECT id, workflow_id, memory_id, payload, ?, ?, created_at, ? FROM webhook_outbox WHERE id = ?',
+                    dead)
+                conn.executemany('DELETE FROM webhook_outbox WHERE id = ?', [(d[3],) for d in dead])
+
+        self.delivered += len(delivered)
+        self.retried += len(retry)
+        self.dead_lettered += len(dead)
+        for attempts, error, _, row_id in dead:
+            logger.warning("Webhook event dead-lettered", outbox_id=row_id, attempts=attempts, error=error)
+
+    # Operations
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        rows = self._connection().execute(
+            'SELECT id, workflow_id, memory_id, attempts, last_error, created_at, failed_at '
+            'FROM webhook_dead_letters ORDER BY failed_at DESC LIMIT ?', (limit,))
+        keys = ('id', 'workflow_id', 'memory_id', 'attempts', 'last_error', 'created_at', 'failed_at')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def replay_dead_letters(self, ids: Optional[Sequence[int]] = None) -> int:
+        """Move dead letters (all, or the given IDs) back into the outbox with a fresh attempt budget"""
+        where, params = '', ()
+        if ids is not None:
+            if not ids:
+                return 0
+            where = f" WHERE id IN ({','.join('?' * len(ids))})"
+            params = tuple(ids)
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'INSERT INTO webhook_outbox (workflow_id, memory_id, payload, next_attempt_at, created_at) '
+                f'SELECT workflow_id, memory_id, payload, ?, created_at FROM webhook_dead_letters{where}',
+                (now,) + params)
+            conn.execute(f'DELETE FROM webhook_dead_letters{where}', params)
+        if cursor.rowcount:
+            self._notify()
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        now = time.time()
+        pending, leased, oldest = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(leased_until > ?), 0), MIN(created_at) FROM webhook_outbox',
+            (now,)).fetchone()
+        dead = conn.execute('SELECT COUNT(*) FROM webhook_dead_letters').fetchone()[0]
+        registrations = conn.execute('SELECT COUNT(*) FROM webhook_registrations').fetchone()[0]
+        return {
+            'registrations': registrations,
+            'pending': pending,
+            'in_flight': leased,
+            'dead_letters': dead,
+            'oldest_pending_age_seconds': round(now - oldest, 1) if oldest else 0.0,
+            'workers': self.workers,
+            'draining': self._thread is not None,
+            'process_counters': {
+                'enqueued': self.enqueued,
+                'delivered': self.delivered,
+                'retried': self.retried,
+                'dead_lettered': self.dead_lettered
+            }
+        }
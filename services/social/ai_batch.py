@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Scuttle AI Batch Processing
+Async provider clients with per-provider concurrency and tokens-per-minute limits
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Tuple
+
+from config import AIProvider, config
+from metrics import AI_BATCH_IN_FLIGHT, AI_REQUEST_DURATION, record_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt size (about four characters a token), enough for budgeting"""
+    return len(text) // 4 + 1
+
+
+class TokensPerMinute:
+    """Async token bucket over model tokens; debits are estimated up front and settled on the response"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.rate = tokens_per_minute / 60.0
+        self.capacity = float(tokens_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: int):
+        # A single request larger than the whole budget waits for a full bucket rather than forever
+        tokens = min(tokens, self.capacity)
+        self._refill()
+        while self.tokens < tokens:
+            delay = (tokens - self.tokens) / self.rate
+            self.waited_seconds += delay
+            await asyncio.sleep(delay)
+            self._refill()
+        self.tokens -= tokens
+
+    def settle(self, estimated: int, actual: int):
+        self.tokens -= actual - estimated
+
+
+class AIBatchProcessor:
+    """
+    Runs many AI rewrites at once on a background event loop
+
+    Each provider gets one async SDK client (AsyncAnthropic / AsyncOpenAI),
+    an asyncio semaphore sized by its `max_concurrency`, and, when
+    `tokens_per_minute` is set, a token bucket that holds requests back
+    before they would exceed the provider's TPM quota. `submit` can be
+    called from any thread and returns a concurrent Future, so request
+    handlers can stream results with `as_completed` as each one finishes.
+    Clients and limits are rebuilt when a config reload changes the
+    provider's key, timeout or limits.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Lock()
+        # Per provider type: (settings fingerprint, object built from those settings)
+        self._clients: Dict[str, Tuple[Tuple, Any]] = {}
+        self._limiters: Dict[str, Tuple[Tuple, asyncio.Semaphore, Optional[TokensPerMinute]]] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._started:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='scuttle-ai-batch', daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def _client(self, provider: AIProvider):
+        """Async SDK client for the provider, created on the loop thread and again when its key or timeout changes"""
+        api_key = config.getenv(provider.api_key_env)
+        timeout = config.service_config['ai_request_timeout']
+        key = (api_key, timeout)
+        cached = self._clients.get(provider.type)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        if provider.type == 'anthropic':
+            import anthropic
+            client = anthropic.AsyncAnthropic(api_key=api_key, timeout=timeout)
+        elif provider.type == 'openai':
+            import openai
+            client = openai.AsyncOpenAI(api_key=api_key, timeout=timeout)
+        else:
+            raise Exception(f"AI provider type '{provider.type}' not implemented")
+        # Requests already holding the old client finish on it
+        self._clients[provider.type] = (key, client)
+        return client
+
+    def _limits(self, provider: AIProvider):
+        key = (provider.max_concurrency, provider.tokens_per_minute)
+        cached = self._limiters.get(provider.type)
+        if cached is None or cached[0] != key:
+            budget = TokensPerMinute(provider.tokens_per_minute) if provider.tokens_per_minute else None
+            cached = self._limiters[provider.type] = (key, asyncio.Semaphore(max(1, provider.max_concurrency)), budget)
+            stats = self._stats.setdefault(provider.type, {'requests': 0, 'failed': 0, 'in_flight': 0, 'tokens': 0})
+            stats.update(max_concurrency=provider.max_concurrency, tokens_per_minute=provider.tokens_per_minute)
+        return cached[1], cached[2]
+
+    async def _complete(self, provider: AIProvider, prompt: str) -> Dict[str, Any]:
+        semaphore, budget = self._limits(provider)
+        stats = self._stats[provider.type]
+        estimated = estimate_tokens(prompt) + provider.max_tokens
+        if budget is not None:
+            await budget.acquire(estimated)
+
+        # Without a response, only the prompt is charged; the output reservation is returned
+        used = estimate_tokens(prompt)
+        try:
+            async with semaphore:
+                client = self._client(provider)
+                stats['in_flight'] += 1
+                AI_BATCH_IN_FLIGHT.labels(provider.type).inc()
+                started = time.perf_counter()
+                outcome = 'error'
+                try:
+                    if provider.type == 'anthropic':
+                        response = await client.messages.create(
+                            model=provider.model,
+                            max_tokens=provider.max_tokens,
+                            messages=[{"role": "user", "content": prompt}]
+                        )
+                        text = response.content[0].text.strip()
+                        used = response.usage.input_tokens + response.usage.output_tokens
+                        record_tokens(provider.type, response.usage.input_tokens, response.usage.output_tokens)
+                    else:
+                        response = await client.chat.completions.create(
+                            model=provider.model,
+                            max_tokens=provider.max_tokens,
+                            messages=[{"role": "user", "content": prompt}]
+                        )
+                        text = response.choices[0].message.content.strip()
+                        used = response.usage.total_tokens if response.usage else estimated
+                        if response.usage:
+                            record_tokens(provider.type, response.usage.prompt_tokens, response.usage.completion_tokens)
+                    outcome = 'ok'
+                except Exception:
+                    stats['failed'] += 1
+                    raise
+                finally:
+                    stats['in_flight'] -= 1
+                    stats['requests'] += 1
+                    AI_BATCH_IN_FLIGHT.labels(provider.type).dec()
+                    AI_REQUEST_DURATION.labels(provider.type, 'batch', outcome).observe(time.perf_counter() - started)
+        finally:
+            if budget is not None:
+                budget.settle(estimated, used)
+        stats['tokens'] += used
+        return {
+            'generated_content': text,
+            'tokens': used,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    def submit(self, provider: AIProvider, prompt: str) -> Future:
+        """Queue one completion; the Future resolves to generated_content, tokens and duration_ms"""
+        return asyncio.run_coroutine_threadsafe(self._complete(provider, prompt), self._ensure_loop())
+
+    def _tpm_wait(self, provider_type: str) -> float:
+        cached = self._limiters.get(provider_type)
+        return round(cached[2].waited_seconds, 1) if cached is not None and cached[2] is not None else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            provider_type: dict(stats, tpm_wait_seconds=self._tpm_wait(provider_type))
+            for provider_type, stats in list(self._stats.items())
+        }
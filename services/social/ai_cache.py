@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Scuttle AI Response Cache
+LRU memory cache of AI rewrites with an optional SQLite tier
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from metrics import AI_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ai_responses_expiry ON ai_responses (expires_at);
+"""
+
+# Expired rows are swept from disk once every this many writes
+_SWEEP_EVERY = 500
+
+
+def response_key(provider_type: str, model: str, max_tokens: int, prompt: str) -> str:
+    """Deterministic cache key for one completion request"""
+    material = json.dumps([provider_type, model, max_tokens, prompt], ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class AIResponseCache:
+    """
+    Rewrites keyed by provider, model, max_tokens and the full prompt
+
+    Lookups hit an in-memory LRU of `max_entries` first; with `db_path` set,
+    misses fall through to SQLite, so cached rewrites survive restarts and
+    are shared by every worker, and disk hits are promoted into memory.
+    Entries expire after `ttl` seconds on both tiers. Only successful
+    rewrites are stored.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 86400, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        """Insert into the LRU (caller holds the lock)"""
+        self._entries[key] = (response, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    AI_CACHE_LOOKUPS.labels('memory_hit').inc()
+                    return entry[0]
+                del self._entries[key]
+
+        if self.db_path:
+            try:
+                row = self._connection().execute(
+                    'SELECT response, expires_at FROM ai_responses WHERE key = ? AND expires_at > ?',
+                    (key, now)).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"AI cache disk lookup failed: {e}")
+                row = None
+            if row is not None:
+                with self._lock:
+                    self._remember(key, row[0], row[1])
+                    self.disk_hits += 1
+                AI_CACHE_LOOKUPS.labels('disk_hit').inc()
+                return row[0]
+
+        with self._lock:
+            self.misses += 1
+        AI_CACHE_LOOKUPS.labels('miss').inc()
+        return None
+
+    def put(self, key: str, response: str):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, response, expires_at)
+            self._writes += 1
+            sweep = self._writes % _SWEEP_EVERY == 0
+
+        if self.db_path:
+            try:
+                conn = self._connection()
+                conn.execute('INSERT OR REPLACE INTO ai_responses (key, response, expires_at) VALUES (?, ?, ?)',
+                             (key, response, expires_at))
+                if sweep:
+                    conn.execute('DELETE FROM ai_responses WHERE expires_at <= ?', (time.time(),))
+            except sqlite3.Error as e:
+                logger.warning(f"AI cache disk write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'persistent': bool(self.db_path),
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Scuttle AI Provider Router
+Rolling per-provider health with failover and hedged requests
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from config import AIProvider
+from metrics import AI_REQUEST_DURATION, AI_ROUTER_EVENTS
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Fewer samples than this and a provider's error rate and p95 are not trusted yet
+_MIN_SAMPLES = 5
+
+
+class ProviderStats:
+    """Latency and outcome of a provider's last `window` calls"""
+
+    def __init__(self, window: int):
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+        self.last_failure = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.hedges_won = 0
+
+    def record(self, latency: float, ok: bool):
+        self.samples.append((latency, ok))
+        self.calls += 1
+        if not ok:
+            self.failures += 1
+            self.last_failure = time.monotonic()
+
+    def error_rate(self) -> float:
+        if len(self.samples) < _MIN_SAMPLES:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        latencies = sorted(latency for latency, ok in self.samples if ok)
+        if len(latencies) < _MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+
+class ProviderRouter:
+    """
+    Sends each completion to the healthiest configured provider
+
+    Every call's latency and outcome feed a rolling window per provider.
+    A provider whose error rate reaches `error_threshold` is tried last until
+    `cooldown` seconds pass without a new failure, after which it gets
+    traffic again as a probe. If the chosen provider fails, the next one is
+    tried. With hedging on, a request still unanswered after the primary's
+    p95 latency (bounded below by `hedge_min_delay`, and `hedge_default_delay`
+    until enough samples exist) is also sent to the next provider, and
+    whichever answers first wins. The losing call finishes in the background
+    and still counts towards its provider's stats. A call unanswered after
+    `request_timeout` seconds is given up on and treated as a failure.
+
+    Calls run on a pool of `max_workers` threads. Deadlines and hedge delays
+    count from when a call starts running, not from when it was queued, and
+    no hedge is sent while calls are waiting for a thread. A call still
+    queued at its deadline is cancelled; one already running cannot be
+    interrupted and keeps its thread until the client's own timeout.
+    """
+
+    def __init__(self, window: int = 100, error_threshold: float = 0.5, cooldown: float = 30.0,
+                 failover: bool = True, hedge: bool = False, hedge_min_delay: float = 1.0,
+                 hedge_default_delay: float = 5.0, request_timeout: float = 60.0, max_workers: int = 8):
+        self.window = window
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.failover = failover
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.request_timeout = request_timeout
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scuttle-ai')
+        self._stats: Dict[str, ProviderStats] = {}
+        self._lock = threading.Lock()
+        self.hedged = 0
+        self.failovers = 0
+        self._queued = 0
+
+    def _provider_stats(self, provider: AIProvider) -> ProviderStats:
+        stats = self._stats.get(provider.type)
+        if stats is None:
+            stats = self._stats[provider.type] = ProviderStats(self.window)
+        return stats
+
+    def _healthy(self, stats: ProviderStats) -> bool:
+        return (stats.error_rate() < self.error_threshold
+                or time.monotonic() - stats.last_failure > self.cooldown)
+
+    def order(self, providers: List[AIProvider], preferred: Optional[AIProvider] = None) -> List[AIProvider]:
+        """Providers to try, best first: the preferred one if healthy, then by error rate and p50"""
+        with self._lock:
+            def rank(provider: AIProvider):
+                stats = self._provider_stats(provider)
+                return (not self._healthy(stats), provider is not preferred, stats.error_rate(),
+                        stats.percentile(0.5) or 0.0)
+            ordered = sorted(providers, key=rank)
+        if not self.failover:
+            return [preferred] if preferred is not None else ordered[:1]
+        return ordered
+
+    def _hedge_delay(self, provider: AIProvider) -> float:
+        with self._lock:
+            p95 = self._provider_stats(provider).percentile(0.95)
+        return max(self.hedge_min_delay, p95 if p95 is not None else self.hedge_default_delay)
+
+    def _timed(self, provider: AIProvider, invoke: Callable[[AIProvider], str], start: Future) -> str:
+        with self._lock:
+            self._queued -= 1
+        start.set_result(time.monotonic())
+        started = time.perf_counter()
+        ok = False
+        try:
+            with tracing.span('ai.complete', provider=provider.type, model=provider.model):
+                result = invoke(provider)
+            ok = True
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._provider_stats(provider).record(elapsed, ok)
+            AI_REQUEST_DURATION.labels(provider.type, 'sync', 'ok' if ok else 'error').observe(elapsed)
+
+    def call(self, providers: List[AIProvider], invoke: Callable[[AIProvider], str],
+             preferred: Optional[AIProvider] = None) -> Tuple[str, AIProvider]:
+        """Run `invoke(provider)` until one provider answers; returns (result, provider that answered)"""
+        candidates = self.order(providers, preferred)
+        if not candidates:
+            raise Exception("No active AI provider available")
+
+        pending: Dict[Any, AIProvider] = {}
+        starts: Dict[Any, Future] = {}
+        submitted: Dict[Any, float] = {}
+        errors: List[str] = []
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            provider = candidates[next_index]
+            next_index += 1
+            start = Future()
+            with self._lock:
+                self._queued += 1
+            future = self._executor.submit(tracing.bind(self._timed), provider, invoke, start)
+            pending[future] = provider
+            starts[future] = start
+            submitted[future] = time.monotonic()
+
+        def deadline(future) -> float:
+            start = starts[future]
+            return (start.result() if start.done() else submitted[future]) + self.request_timeout
+
+        launch()
+        while pending:
+            now = time.monotonic()
+            timeout = max(0.0, min(deadline(f) for f in pending) - now)
+            # Also wake when a queued call starts, to move its deadline and arm the hedge
+            waiting = set(pending) | {starts[f] for f in pending if not starts[f].done()}
+            hedge_at = None
+            if self.hedge and next_index < len(candidates) and len(pending) == 1:
+                primary = next(iter(pending))
+                with self._lock:
+                    backlog = self._queued
+                if starts[primary].done() and not backlog:
+                    hedge_at = starts[primary].result() + self._hedge_delay(pending[primary])
+                    timeout = min(timeout, max(0.0, hedge_at - now))
+                elif backlog:
+                    # Check again once the pool may have caught up
+                    timeout = min(timeout, self.hedge_min_delay)
+            done, _ = wait(waiting, timeout=timeout, return_when=FIRST_COMPLETED)
+            done = {f for f in done if f in pending}
+
+            if not done:
+                now = time.monotonic()
+                expired = [f for f in pending if deadline(f) <= now]
+                if expired:
+                    for future in expired:
+                        provider = pending.pop(future)
+                        if future.cancel():
+                            # Never started, so _timed will not release its queue slot
+                            with self._lock:
+                                self._queued -= 1
+                            errors.append(f"{provider.name}: no free worker within {self.request_timeout:g}s")
+                            logger.warning(f"AI provider {provider.name} call cancelled: no free worker "
+                                           f"within {self.request_timeout:g}s")
+                        else:
+                            # Given up on: the call finishes in the background and is recorded then
+                            errors.append(f"{provider.name}: no answer within {self.request_timeout:g}s")
+                            logger.warning(f"AI provider {provider.name} timed out after {self.request_timeout:g}s")
+                elif hedge_at is not None and now >= hedge_at:
+                    # Primary is slower than its usual p95: race the next provider against it
+                    with self._lock:
+                        self.hedged += 1
+                    AI_ROUTER_EVENTS.labels('hedged').inc()
+                    launch()
+                    continue
+
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(f"{provider.name}: {e}")
+                    logger.warning(f"AI provider {provider.name} failed: {e}")
+                    continue
+                if pending:
+                    with self._lock:
+                        self._provider_stats(provider).hedges_won += 1
+                if provider is not candidates[0]:
+                    logger.info(f"AI request answered by {provider.name} instead of {candidates[0].name}")
+                return result, provider
+
+            if not pending and next_index < len(candidates):
+                with self._lock:
+                    self.failovers += 1
+                AI_ROUTER_EVENTS.labels('failover').inc()
+                launch()
+
+        raise Exception(f"All AI providers failed: {'; '.join(errors)}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            providers = {}
+            for provider_type, stats in self._stats.items():
+                p50, p95 = stats.percentile(0.5), stats.percentile(0.95)
+                providers[provider_type] = {
+                    'healthy': self._healthy(stats),
+                    'calls': stats.calls,
+                    'failures': stats.failures,
+                    'error_rate': round(stats.error_rate(), 4),
+                    'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+                    'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+                    'hedges_won': stats.hedges_won
+                }
+            return {
+                'failover': self.failover,
+                'hedge': self.hedge,
+                'max_workers': self.max_workers,
+                'queued': self._queued,
+                'hedged_requests': self.hedged,
+                'failovers': self.failovers,
+                'providers': providers
+            }
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Scuttle Bluesky Sessions
+Encrypted on-disk Bluesky sessions shared by every worker and restart
+"""
+
+import fcntl
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from identity_cache import credential_fingerprint
+
+logger = logging.getLogger(__name__)
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    ENCRYPTION_AVAILABLE = True
+except ImportError:
+    ENCRYPTION_AVAILABLE = False
+    logger.warning("cryptography not installed - Bluesky sessions will not be persisted")
+
+
+def _token_expiry(jwt_exp: Optional[int]) -> float:
+    return float(jwt_exp or 0)
+
+
+class BlueskySessions:
+    """
+    Bluesky clients whose sessions outlive the process
+
+    Each account's session string (tokens, DID, PDS) is stored Fernet
+    encrypted under `directory`, so a restart or another Gunicorn worker
+    imports it instead of doing a password login. Access tokens are refreshed
+    `refresh_margin` seconds before they expire, both on use and by a
+    background thread, well ahead of the client library's own last-minute
+    refresh. A per-account file lock makes refresh single-flight across
+    workers: whoever gets the lock second finds the fresh session already on
+    disk and adopts it. A password login only happens when there is no
+    usable stored session or the refresh token itself has been rejected.
+    """
+
+    def __init__(self, directory: str, key: Optional[str] = None, refresh_margin: float = 1800,
+                 check_interval: float = 300):
+        self.directory = directory
+        self.refresh_margin = refresh_margin
+        self.check_interval = check_interval
+        self._accounts: Dict[str, Dict[str, Any]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.logins = 0
+        self.restored = 0
+        self.refreshes = 0
+        self.adopted = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._fernet = Fernet(key.encode() if key else self._local_key()) if ENCRYPTION_AVAILABLE else None
+
+    def _local_key(self) -> bytes:
+        """
+        Key file shared by all workers on this host, created by the first one.
+        The key is written to a temporary file and hard-linked into place, so
+        the key file never exists half-written and a worker that loses the
+        race reads the winner's key instead of replacing it.
+        """
+        path = os.path.join(self.directory, 'session.key')
+        key = Fernet.generate_key()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            with open(path, 'rb') as f:
+                return f.read().strip()
+        finally:
+            os.unlink(tmp_path)
+        logger.warning(f"BLUESKY_SESSION_KEY not set - generated a local session key at {path}")
+        return key
+
+    def _path(self, handle: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"bluesky-{credential_fingerprint(handle)}.{suffix}")
+
+    @contextmanager
+    def _file_lock(self, handle: str):
+        """Exclusive per-account lock, held across processes while a session is created or refreshed"""
+        with open(self._path(handle, 'lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self, handle: str) -> Optional[str]:
+        if self._fernet is None:
+            return None
+        try:
+            with open(self._path(handle, 'session'), 'rb') as f:
+                return self._fernet.decrypt(f.read()).decode('utf-8')
+        except FileNotFoundError:
+            return None
+        except InvalidToken:
+            logger.warning(f"Stored Bluesky session for {handle} cannot be decrypted with the current key")
+            return None
+
+    def _save(self, handle: str, session_string: str):
+        if self._fernet is None:
+            return
+        path = self._path(handle, 'session')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self._fernet.encrypt(session_string.encode('utf-8')))
+        os.replace(tmp_path, path)
+
+    def _session_expiries(self, session_string: str):
+        """(access, refresh) token expiry as epoch seconds"""
+        from atproto_client.client.session import Session
+        session = Session.decode(session_string)
+        return (_token_expiry(session.access_jwt_payload.exp),
+                _token_expiry(session.refresh_jwt_payload.exp))
+
+    def _on_session_change(self, handle: str, event, session):
+        from atproto_client.client.session import SessionEvent
+        account = self._accounts.get(handle)
+        if account is not None:
+            account['expires_at'] = _token_expiry(session.access_jwt_payload.exp)
+        # Imported sessions came from the store already
+        if event in (SessionEvent.CREATE, SessionEvent.REFRESH):
+            self._save(handle, session.encode())
+
+    def login(self, handle: str, password: str):
+        """A logged-in client for the account, restored from the store when possible"""
+        from atproto import Client as BlueSkyClient
+        client = BlueSkyClient()
+        client.on_session_change(lambda event, session: self._on_session_change(handle, event, session))
+        self._accounts[handle] = {'client': client, 'password': password, 'expires_at': 0.0}
+
+        with self._file_lock(handle):
+            stored = self._load(handle)
+            if stored and self._session_expiries(stored)[1] > time.time() + 60:
+                try:
+                    # Refreshes on the spot if the stored access token is close to expiry
+                    client.login(session_string=stored)
+                    self.restored += 1
+                    logger.info(f"Bluesky session for {handle} restored from store")
+                    return client
+                except Exception as e:
+                    logger.warning(f"Stored Bluesky session for {handle} rejected ({e}); logging in")
+            client.login(handle, password)
+            self.logins += 1
+        return client
+
+    def ensure_fresh(self, handle: str, force: bool = False):
+        """
+        Refresh the account's access token if it expires within the margin.
+        `force` renews regardless, for a session the PDS has just rejected.
+        """
+        account = self._accounts.get(handle)
+        if account is None or (not force and account['expires_at'] - time.time() > self.refresh_margin):
+            return
+        client = account['client']
+
+        with self._file_lock(handle):
+            current = client.export_session_string()
+            if not force and account['expires_at'] - time.time() > self.refresh_margin:
+                return
+
+            # Another worker may already have refreshed; its refresh token is now the live one
+            stored = self._load(handle)
+            if stored and stored != current and self._session_expiries(stored)[0] - time.time() > self.refresh_margin:
+                client.login(session_string=stored)
+                self.adopted += 1
+                logger.info(f"Bluesky session for {handle} adopted from store")
+                return
+
+            try:
+                # atproto has no public call that forces a refresh; this private one is
+                # why requirements.txt pins atproto. Check it still exists when upgrading.
+                client._refresh_and_set_session()
+                self.refreshes += 1
+                logger.info(f"Bluesky session for {handle} refreshed")
+                return
+            except Exception as e:
+                logger.warning(f"Bluesky session refresh for {handle} failed ({e}); logging in")
+            client.login(handle, account['password'])
+            self.logins += 1
+
+    def start(self):
+        """Start the background refresher"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='scuttle-bluesky-sessions', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            for handle in list(self._accounts):
+                try:
+                    self.ensure_fresh(handle)
+                except Exception as e:
+                    logger.error(f"Background Bluesky session refresh for {handle} failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            'persisted': self._fernet is not None,
+            'refresh_margin_seconds': self.refresh_margin,
+            'logins': self.logins,
+            'restored': self.restored,
+            'refreshes': self.refreshes,
+            'adopted': self.adopted,
+            'accounts': {
+                handle: {'access_expires_in_seconds': round(account['expires_at'] - now)}
+                for handle, account in list(self._accounts.items())
+            }
+        }
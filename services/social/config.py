@@ -6,11 +6,16 @@ Handles user-configurable AI providers and MCP server suggestions
 
 import os
 import json
+import hashlib
+import threading
+import time
 from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict
-from dotenv import load_dotenv
+from dataclasses import dataclass, asdict, replace
+from dotenv import load_dotenv, dotenv_values, find_dotenv
 
-load_dotenv()
+# Variables set by the container or shell, as opposed to ones the env file supplies
+_PROCESS_ENV_KEYS = frozenset(os.environ)
+load_dotenv(os.getenv('SCUTTLE_ENV_FILE'))
 
 @dataclass
 class AIProvider:
@@ -21,6 +26,8 @@ class AIProvider:
     model: str
     max_tokens: int = 500
     enabled: bool = True
+    max_concurrency: int = 4  # Requests in flight at once for batch processing
+    tokens_per_minute: int = 0  # Provider TPM quota to stay under; 0 = unlimited
 
 @dataclass
 class MCPServer:
@@ -31,6 +38,7 @@ class MCPServer:
     required_env_vars: List[str]
     optional: bool = True
     suggested: bool = False
+    url_env: Optional[str] = None  # Env var with the server's HTTP endpoint, probed for reachability
 
 @dataclass
 class PlatformConfig:
@@ -40,55 +48,130 @@ class PlatformConfig:
     auth_type: str  # 'api_key', 'oauth', 'app_password'
     required_env_vars: List[str]
 
+@dataclass(frozen=True)
+class ConfigState:
+    """One immutable generation of configuration; reloads replace it whole"""
+    version: int
+    ai_providers: List[AIProvider]
+    mcp_servers: List[MCPServer]
+    platforms: List[PlatformConfig]
+    service_config: Dict[str, Any]
+    env: Dict[str, str]
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Validation and serialized configuration computed once per config version"""
+    version: int
+    validation: Dict[str, Any]
+    data: Dict[str, Any]
+    json_bytes: bytes
+    etag: str
+    built_at: float
+
+# Service settings that hold secrets and are never serialized
+SECRET_SETTINGS = ('bluesky_session_key',)
+
 class ScuttleConfig:
     """Main configuration class for Scuttle service"""
     
-    def __init__(self):
-        self.ai_providers = self._load_ai_providers()
-        self.mcp_servers = self._load_mcp_servers()
-        self.platforms = self._load_platforms()
-        self.service_config = self._load_service_config()
+    def __init__(self, env_file: Optional[str] = None):
+        self.env_file = env_file or os.getenv('SCUTTLE_ENV_FILE') or find_dotenv() or '.env'
+        self._state = self._load_state(1, self._merged_env())
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._snapshot_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+    
+    def _merged_env(self) -> Dict[str, str]:
+        """The env file's values with the process environment layered on top"""
+        values = dotenv_values(self.env_file) if os.path.exists(self.env_file) else {}
+        env = {key: value for key, value in values.items() if value is not None}
+        env.update({key: value for key, value in os.environ.items() if key in _PROCESS_ENV_KEYS})
+        return env
+    
+    def _load_state(self, version: int, env: Dict[str, str]) -> ConfigState:
+        return ConfigState(
+            version=version,
+            ai_providers=self._load_ai_providers(env),
+            mcp_servers=self._load_mcp_servers(env),
+            platforms=self._load_platforms(env),
+            service_config=self._load_service_config(env),
+            env=env
+        )
+    
+    # Readers always see one whole generation: each property reads the current
+    # state reference, and current() hands out that reference for multi-field use
+    @property
+    def ai_providers(self) -> List[AIProvider]:
+        return self._state.ai_providers
+    
+    @property
+    def mcp_servers(self) -> List[MCPServer]:
+        return self._state.mcp_servers
+    
+    @property
+    def platforms(self) -> List[PlatformConfig]:
+        return self._state.platforms
+    
+    @property
+    def service_config(self) -> Dict[str, Any]:
+        return self._state.service_config
+    
+    @property
+    def version(self) -> int:
+        return self._state.version
+    
+    def current(self) -> ConfigState:
+        """The live configuration generation, consistent across all its fields"""
+        return self._state
     
-    def _load_ai_providers(self) -> List[AIProvider]:
+    def getenv(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Environment variable as of the live generation, including reloaded env file values"""
+        return self._state.env.get(key, default)
+    
+    def _load_ai_providers(self, env: Dict[str, str]) -> List[AIProvider]:
         """Load configured AI providers"""
         providers = []
         
         # Anthropic Claude (Primary recommendation)
-        if os.getenv('ANTHROPIC_API_KEY'):
+        if env.get('ANTHROPIC_API_KEY'):
             providers.append(AIProvider(
                 name='Claude',
                 type='anthropic',
                 api_key_env='ANTHROPIC_API_KEY',
                 model='claude-3-5-sonnet-20241022',
                 max_tokens=500,
-                enabled=True
+                enabled=True,
+                max_concurrency=int(env.get('ANTHROPIC_MAX_CONCURRENCY', 4)),
+                tokens_per_minute=int(env.get('ANTHROPIC_TOKENS_PER_MINUTE', 0))
             ))
         
         # OpenAI (Secondary option)
-        if os.getenv('OPENAI_API_KEY'):
+        if env.get('OPENAI_API_KEY'):
             providers.append(AIProvider(
                 name='OpenAI',
                 type='openai',
                 api_key_env='OPENAI_API_KEY',
                 model='gpt-4',
                 max_tokens=500,
-                enabled=bool(os.getenv('OPENAI_ENABLED', 'false').lower() == 'true')
+                enabled=bool(env.get('OPENAI_ENABLED', 'false').lower() == 'true'),
+                max_concurrency=int(env.get('OPENAI_MAX_CONCURRENCY', 4)),
+                tokens_per_minute=int(env.get('OPENAI_TOKENS_PER_MINUTE', 0))
             ))
         
         # Local LLM (Future expansion)
-        if os.getenv('LOCAL_LLM_ENDPOINT'):
+        if env.get('LOCAL_LLM_ENDPOINT'):
             providers.append(AIProvider(
                 name='Local LLM',
                 type='local_llm',
                 api_key_env='LOCAL_LLM_ENDPOINT',
-                model=os.getenv('LOCAL_LLM_MODEL', 'llama2'),
+                model=env.get('LOCAL_LLM_MODEL', 'llama2'),
                 max_tokens=500,
-                enabled=bool(os.getenv('LOCAL_LLM_ENABLED', 'false').lower() == 'true')
+                enabled=bool(env.get('LOCAL_LLM_ENABLED', 'false').lower() == 'true')
             ))
         
         return providers
     
-    def _load_mcp_servers(self) -> List[MCPServer]:
+    def _load_mcp_servers(self, env: Dict[str, str]) -> List[MCPServer]:
         """Load suggested MCP server configurations"""
         return [
             MCPServer(
@@ -97,7 +180,8 @@ class ScuttleConfig:
                 capabilities=['calendar', 'notes', 'contacts', 'mail', 'reminders', 'messages'],
                 required_env_vars=[],  # Uses system authentication
                 optional=True,
-                suggested=True
+                suggested=True,
+                url_env='APPLE_MCP_URL'
             ),
             MCPServer(
                 name='Notion MCP',
@@ -105,7 +189,8 @@ class ScuttleConfig:
                 capabilities=['databases', 'pages', 'blocks', 'comments'],
                 required_env_vars=['NOTION_TOKEN', 'NOTION_DATABASE_ID'],
                 optional=True,
-                suggested=True
+                suggested=True,
+                url_env='NOTION_MCP_URL'
             ),
             MCPServer(
                 name='GitHub MCP',
@@ -113,7 +198,8 @@ class ScuttleConfig:
                 capabilities=['issues', 'pull_requests', 'repositories', 'workflows'],
                 required_env_vars=['GITHUB_TOKEN'],
                 optional=True,
-                suggested=False
+                suggested=False,
+                url_env='GITHUB_MCP_URL'
             ),
             MCPServer(
                 name='Twinning Analytics MCP',
@@ -121,91 +207,205 @@ class ScuttleConfig:
                 capabilities=['metrics', 'insights', 'reporting'],
                 required_env_vars=['TWINNING_API_KEY'],
                 optional=True,
-                suggested=False
+                suggested=False,
+                url_env='TWINNING_ANALYTICS_MCP_URL'
             )
         ]
     
-    def _load_platforms(self) -> List[PlatformConfig]:
+    def _load_platforms(self, env: Dict[str, str]) -> List[PlatformConfig]:
         """Load social media platform configurations"""
         return [
             PlatformConfig(
                 name='Bluesky',
-                enabled=bool(os.getenv('BLUESKY_PERSONAL_HANDLE') or os.getenv('BLUESKY_BUSINESS_HANDLE')),
+                enabled=bool(env.get('BLUESKY_PERSONAL_HANDLE') or env.get('BLUESKY_BUSINESS_HANDLE')),
                 auth_type='app_password',
                 required_env_vars=['BLUESKY_HANDLE', 'BLUESKY_PASSWORD']
             ),
             PlatformConfig(
                 name='LinkedIn',
-                enabled=bool(os.getenv('LINKEDIN_ACCESS_TOKEN')),
+                enabled=bool(env.get('LINKEDIN_ACCESS_TOKEN')),
                 auth_type='oauth',
                 required_env_vars=['LINKEDIN_ACCESS_TOKEN']
             ),
             PlatformConfig(
                 name='WordPress',
-                enabled=bool(os.getenv('WORDPRESS_URL')),
+                enabled=bool(env.get('WORDPRESS_URL')),
                 auth_type='app_password',
                 required_env_vars=['WORDPRESS_URL', 'WORDPRESS_USER', 'WORDPRESS_APP_PASSWORD']
             )
         ]
     
-    def _load_service_config(self) -> Dict[str, Any]:
+    def _load_service_config(self, env: Dict[str, str]) -> Dict[str, Any]:
         """Load general service configuration"""
         return {
-            'test_mode': os.getenv('TEST_MODE', 'true').lower() == 'true',
-            'service_port': int(os.getenv('SERVICE_PORT', 8080)),
-            'twinning_api_url': os.getenv('TWINNING_API_URL', 'http://twinning-core:3000'),
-            'log_level': os.getenv('LOG_LEVEL', 'INFO'),
-            'rate_limit_posts_per_hour': int(os.getenv('RATE_LIMIT_POSTS_PER_HOUR', 10)),
-            'default_ai_provider': os.getenv('DEFAULT_AI_PROVIDER', 'anthropic')
+            'test_mode': env.get('TEST_MODE', 'true').lower() == 'true',
+            'service_port': int(env.get('SERVICE_PORT', 8080)),
+            'twinning_api_url': env.get('TWINNING_API_URL', 'http://twinning-core:3000'),
+            'log_level': env.get('LOG_LEVEL', 'INFO'),
+            'rate_limit_posts_per_hour': int(env.get('RATE_LIMIT_POSTS_PER_HOUR', 10)),
+            'rate_limit_burst': int(env.get('RATE_LIMIT_BURST', 3)),
+            'platform_rate_limits': {
+                platform: int(env.get(f'RATE_LIMIT_{platform.upper()}_POSTS_PER_HOUR'))
+                for platform in ('bluesky', 'linkedin', 'wordpress')
+                if env.get(f'RATE_LIMIT_{platform.upper()}_POSTS_PER_HOUR')
+            },
+            'post_max_workers': int(env.get('POST_MAX_WORKERS', 8)),
+            'data_dir': env.get('SCUTTLE_DATA_DIR', '/app/data'),
+            'http_connect_timeout': float(env.get('HTTP_CONNECT_TIMEOUT', 3.05)),
+            'http_read_timeout': float(env.get('HTTP_READ_TIMEOUT', 20)),
+            'http_max_retries': int(env.get('HTTP_MAX_RETRIES', 3)),
+            'http_backoff_max': float(env.get('HTTP_BACKOFF_MAX', 30)),
+            'http_pool_maxsize': int(env.get('HTTP_POOL_MAXSIZE', 10)),
+            'identity_cache_ttl': int(env.get('IDENTITY_CACHE_TTL', 86400)),
+            'bluesky_session_dir': env.get('BLUESKY_SESSION_DIR',
+                                             os.path.join(env.get('SCUTTLE_DATA_DIR', '/app/data'), 'bluesky')),
+            'bluesky_session_key': env.get('BLUESKY_SESSION_KEY'),
+            'bluesky_session_refresh_margin': float(env.get('BLUESKY_SESSION_REFRESH_MARGIN', 1800)),
+            'bluesky_session_check_interval': float(env.get('BLUESKY_SESSION_CHECK_INTERVAL', 300)),
+            'ai_failover': env.get('AI_FAILOVER', 'true').lower() == 'true',
+            'ai_hedge': env.get('AI_HEDGE', 'false').lower() == 'true',
+            'ai_hedge_min_delay': float(env.get('AI_HEDGE_MIN_DELAY', 1.0)),
+            'ai_hedge_default_delay': float(env.get('AI_HEDGE_DEFAULT_DELAY', 5.0)),
+            'ai_request_timeout': float(env.get('AI_REQUEST_TIMEOUT', 60.0)),
+            'ai_router_max_workers': int(env.get('AI_ROUTER_MAX_WORKERS', 8)),
+            'ai_router_window': int(env.get('AI_ROUTER_WINDOW', 100)),
+            'ai_router_error_threshold': float(env.get('AI_ROUTER_ERROR_THRESHOLD', 0.5)),
+            'ai_router_cooldown': float(env.get('AI_ROUTER_COOLDOWN', 30)),
+            'ai_cache_enabled': env.get('AI_CACHE_ENABLED', 'true').lower() == 'true',
+            'ai_cache_max_entries': int(env.get('AI_CACHE_MAX_ENTRIES', 1024)),
+            'ai_cache_ttl': int(env.get('AI_CACHE_TTL', 86400)),
+            'ai_cache_persist': env.get('AI_CACHE_PERSIST', 'false').lower() == 'true',
+            'ai_batch_max_items': int(env.get('AI_BATCH_MAX_ITEMS', 500)),
+            'config_watch_interval': float(env.get('CONFIG_WATCH_INTERVAL', 5)),
+            'mcp_probe_interval': float(env.get('MCP_PROBE_INTERVAL', 30)),
+            'mcp_probe_timeout': float(env.get('MCP_PROBE_TIMEOUT', 2)),
+            'mcp_probe_jitter': float(env.get('MCP_PROBE_JITTER', 0.2)),
+            'mcp_probe_history': int(env.get('MCP_PROBE_HISTORY', 32)),
+            'metrics_enabled': env.get('METRICS_ENABLED', 'true').lower() == 'true',
+            'tracing_enabled': env.get('TRACING_ENABLED', 'false').lower() == 'true',
+            'tracing_sample_rate': float(env.get('TRACING_SAMPLE_RATE', 0.1)),
+            'tracing_exporter': env.get('TRACING_EXPORTER', 'console').lower(),
+            'tracing_file': env.get('TRACING_FILE',
+                                      os.path.join(env.get('SCUTTLE_DATA_DIR', '/app/data'), 'traces.jsonl')),
+            'integration_wait_timeout': float(env.get('INTEGRATION_WAIT_TIMEOUT', 15)),
+            'post_job_workers': int(env.get('POST_JOB_WORKERS', 4)),
+            'post_job_lease_seconds': float(env.get('POST_JOB_LEASE_SECONDS', 60)),
+            'post_job_poll_interval': float(env.get('POST_JOB_POLL_INTERVAL', 5)),
+            'default_ai_provider': env.get('DEFAULT_AI_PROVIDER', 'anthropic')
         }
     
-    def get_active_ai_provider(self) -> Optional[AIProvider]:
+    def get_active_ai_provider(self, state: Optional[ConfigState] = None) -> Optional[AIProvider]:
         """Get the currently active AI provider"""
+        state = state or self._state
         # Try default provider first
-        default_type = self.service_config['default_ai_provider']
-        for provider in self.ai_providers:
+        default_type = state.service_config['default_ai_provider']
+        for provider in state.ai_providers:
             if provider.type == default_type and provider.enabled:
                 return provider
         
         # Fall back to first enabled provider
-        for provider in self.ai_providers:
+        for provider in state.ai_providers:
             if provider.enabled:
                 return provider
         
         return None
     
-    def get_enabled_platforms(self) -> List[PlatformConfig]:
+    def get_enabled_platforms(self, state: Optional[ConfigState] = None) -> List[PlatformConfig]:
         """Get list of enabled social media platforms"""
-        return [platform for platform in self.platforms if platform.enabled]
+        return [platform for platform in (state or self._state).platforms if platform.enabled]
     
-    def get_suggested_mcp_servers(self) -> List[MCPServer]:
+    def get_suggested_mcp_servers(self, state: Optional[ConfigState] = None) -> List[MCPServer]:
         """Get list of suggested MCP servers"""
-        return [server for server in self.mcp_servers if server.suggested]
+        return [server for server in (state or self._state).mcp_servers if server.suggested]
+    
+    def snapshot(self) -> ConfigSnapshot:
+        """
+        Current snapshot, built on first use after each version bump
+        
+        Probes and status endpoints read this instead of re-validating (and
+        re-reading the environment for every MCP server) on each request.
+        """
+        state = self._state
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == state.version:
+            return snapshot
+        
+        with self._snapshot_lock:
+            if self._snapshot is None or self._snapshot.version != state.version:
+                version = state.version
+                validation = self._validate(state)
+                data = {
+                    'ai_providers': [asdict(p) for p in state.ai_providers],
+                    'mcp_servers': [asdict(m) for m in state.mcp_servers],
+                    'platforms': [asdict(p) for p in state.platforms],
+                    'service_config': {k: v for k, v in state.service_config.items() if k not in SECRET_SETTINGS},
+                    'validation': validation,
+                    'version': version
+                }
+                json_bytes = json.dumps(data, default=str).encode('utf-8')
+                self._snapshot = ConfigSnapshot(
+                    version=version,
+                    validation=validation,
+                    data=data,
+                    json_bytes=json_bytes,
+                    etag=f"{version}-{hashlib.sha256(json_bytes).hexdigest()[:16]}",
+                    built_at=time.time()
+                )
+            return self._snapshot
+    
+    def invalidate(self):
+        """Hot-reload hook: bump the version so the next read rebuilds the snapshot"""
+        with self._reload_lock:
+            self._state = replace(self._state, version=self._state.version + 1)
+    
+    def reload(self) -> Dict[str, Any]:
+        """
+        Re-read the env file and rebuild every section as a new generation
+        
+        The new generation reads a private merge of the env file and the
+        process environment; os.environ itself is never modified. Variables
+        set by the container or shell win over the file, and keys removed
+        from the file drop out of the next generation. The new state is built
+        off to the side and swapped in with one reference assignment, so
+        in-flight readers finish on the generation they started with. If the
+        new values do not parse, the error is raised with the current
+        generation still live. Returns the old and new state and the
+        environment variables that changed.
+        """
+        with self._reload_lock:
+            old = self._state
+            new = self._load_state(old.version + 1, self._merged_env())
+            changed = {key for key in set(old.env) | set(new.env) if old.env.get(key) != new.env.get(key)}
+            self._state = new
+        return {'old': old, 'new': new, 'changed_env': changed}
     
     def validate_configuration(self) -> Dict[str, Any]:
-        """Validate current configuration and return status"""
+        """Validate current configuration and return status (memoized per version; treat as read-only)"""
+        return self.snapshot().validation
+    
+    def _validate(self, state: ConfigState) -> Dict[str, Any]:
         validation = {
             'valid': True,
             'warnings': [],
             'errors': [],
-            'ai_providers': len([p for p in self.ai_providers if p.enabled]),
-            'platforms': len(self.get_enabled_platforms()),
-            'suggested_mcp': len(self.get_suggested_mcp_servers())
+            'ai_providers': len([p for p in state.ai_providers if p.enabled]),
+            'platforms': len(self.get_enabled_platforms(state)),
+            'suggested_mcp': len(self.get_suggested_mcp_servers(state))
         }
         
         # Check AI providers
-        if not self.get_active_ai_provider():
+        if not self.get_active_ai_provider(state):
             validation['errors'].append('No active AI provider configured')
             validation['valid'] = False
         
         # Check platforms
-        if not self.get_enabled_platforms():
+        if not self.get_enabled_platforms(state):
             validation['warnings'].append('No social media platforms enabled')
         
         # Check MCP servers
         available_mcp = []
-        for server in self.mcp_servers:
-            missing_vars = [var for var in server.required_env_vars if not os.getenv(var)]
+        for server in state.mcp_servers:
+            missing_vars = [var for var in server.required_env_vars if not state.env.get(var)]
             if not missing_vars:
                 available_mcp.append(server.name)
             elif server.suggested:
@@ -216,14 +416,8 @@ class ScuttleConfig:
         return validation
     
     def to_dict(self) -> Dict[str, Any]:
-        """Export configuration as dictionary"""
-        return {
-            'ai_providers': [asdict(p) for p in self.ai_providers],
-            'mcp_servers': [asdict(m) for m in self.mcp_servers],
-            'platforms': [asdict(p) for p in self.platforms],
-            'service_config': self.service_config,
-            'validation': self.validate_configuration()
-        }
+        """Export configuration as dictionary (memoized per version; treat as read-only)"""
+        return self.snapshot().data
 
 # Global configuration instance
 config = ScuttleConfig()
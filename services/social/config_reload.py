@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Scuttle Config Reload
+Rebuilds configuration on SIGHUP or when the env file changes
+"""
+
+import logging
+import os
+import signal
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from config import ScuttleConfig
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigReloader:
+    """
+    Triggers ScuttleConfig.reload() and hands the result to `on_reload`
+
+    The env file's modification time is polled every `watch_interval`
+    seconds (0 disables watching), and SIGHUP requests a reload when the
+    process's main thread installs the handler. Reloads are serialized and
+    run off the signal handler, so a burst of triggers costs one reload each.
+    """
+
+    def __init__(self, config: ScuttleConfig, on_reload: Callable[[Dict[str, Any]], Any],
+                 watch_interval: float = 5.0):
+        self.config = config
+        self.on_reload = on_reload
+        self.watch_interval = watch_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._mtime = self._env_file_mtime()
+        self.reloads = 0
+        self.last_reload: Optional[Dict[str, Any]] = None
+
+    def _env_file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.config.env_file).st_mtime
+        except OSError:
+            return None
+
+    def start(self):
+        if threading.current_thread() is threading.main_thread() and hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(
+                target=self.reload, args=('SIGHUP',), name='scuttle-config-reload', daemon=True).start())
+        if self.watch_interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name='scuttle-config-watch', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            mtime = self._env_file_mtime()
+            if mtime != self._mtime:
+                self._mtime = mtime
+                self.reload(f'{self.config.env_file} changed')
+
+    def reload(self, reason: str = 'requested') -> Dict[str, Any]:
+        """
+        Reload now; returns the new version and what on_reload re-initialized
+
+        A config that fails to load leaves the current generation live and is
+        reported under 'error'. Once the new generation is swapped in it stays
+        live, so an exception from on_reload is reported as
+        'reinitialize_error' on an otherwise successful reload.
+        """
+        with self._lock:
+            try:
+                result = self.config.reload()
+            except Exception as e:
+                logger.error(f"Configuration reload ({reason}) failed: {e}")
+                self.last_reload = {'reason': reason, 'error': str(e)}
+                return self.last_reload
+            self.reloads += 1
+            self.last_reload = {
+                'reason': reason,
+                'version': result['new'].version,
+                'changed_env': sorted(result['changed_env'])
+            }
+            try:
+                applied = self.on_reload(result)
+            except Exception as e:
+                logger.error(f"Configuration reloaded ({reason}) as version {result['new'].version}, "
+                             f"but re-initializing integrations failed: {e}")
+                self.last_reload['reinitialized'] = None
+                self.last_reload['reinitialize_error'] = str(e)
+                return self.last_reload
+            self.last_reload['reinitialized'] = applied
+            logger.info(f"Configuration reloaded ({reason}): version {result['new'].version}, "
+                        f"re-initialized {applied or 'nothing'}")
+            return self.last_reload
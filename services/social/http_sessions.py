@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Scuttle Platform HTTP
+Shared keep-alive session for outbound platform API calls
+"""
+
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Statuses that guarantee a POST was not acted on, so it is safe to resend
+SAFE_TO_RESEND_STATUSES = {429, 503}
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class PlatformHTTP:
+    """
+    One requests session shared by every platform call
+
+    The session's adapter keeps a keep-alive pool per host, so repeated
+    posts to LinkedIn or a WordPress site reuse open TLS connections instead
+    of handshaking each time. Every call gets (connect, read) timeouts.
+    429 and 5xx answers and connection errors are retried with jittered
+    exponential backoff, waiting for Retry-After when the platform sends one.
+    Non-idempotent requests (POST) are not resent after a read timeout or a
+    5xx other than 503, since the platform may already have published them.
+    """
+
+    def __init__(self, connect_timeout: float = 3.05, read_timeout: float = 20.0, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0, pool_maxsize: int = 10,
+                 pool_connections: int = 10):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, float]] = {}
+
+    def _record(self, host: str, **counters: float):
+        with self._lock:
+            stats = self._hosts.setdefault(host, {'requests': 0, 'retries': 0, 'errors': 0, 'total_ms': 0.0})
+            for name, value in counters.items():
+                stats[name] += value
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> Optional[float]:
+        """Delay before the next attempt, or None if Retry-After asks for longer than we wait"""
+        if retry_after is not None:
+            return retry_after if retry_after <= self.backoff_max else None
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request through the pooled session, retrying transient failures"""
+        method = method.upper()
+        host = urlsplit(url).netloc
+        idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault('timeout', self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record(host, requests=1, errors=1, total_ms=(time.perf_counter() - started) * 1000)
+                # After a read timeout the platform may already have acted on the request
+                resend = idempotent or not isinstance(e, requests.exceptions.ReadTimeout)
+                if not resend or attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, None)
+                logger.warning(f"{method} {host} failed ({type(e).__name__}); retrying in {delay:.2f}s")
+            else:
+                self._record(host, requests=1, total_ms=(time.perf_counter() - started) * 1000)
+                retryable = RETRYABLE_STATUSES if idempotent else SAFE_TO_RESEND_STATUSES
+                if response.status_code not in retryable or attempt == self.max_retries:
+                    return response
+                delay = self._backoff(attempt, retry_after_seconds(response.headers.get('Retry-After')))
+                if delay is None:
+                    return response
+                logger.warning(f"{method} {host} returned {response.status_code}; retrying in {delay:.2f}s")
+                response.close()
+
+            self._record(host, retries=1)
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-host request counters and connection reuse from the urllib3 pools"""
+        pools = {}
+        manager = self.adapter.poolmanager
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            opened, served = pool.num_connections, pool.num_requests
+            host = f"{pool.host}:{pool.port}" if pool.port not in (None, 80, 443) else pool.host
+            pools[host] = {
+                'connections_opened': opened,
+                'requests_sent': served,
+                'connection_reuse_ratio': round(1 - opened / served, 4) if served else 0.0
+            }
+
+        with self._lock:
+            hosts = {
+                host: {
+                    'requests': int(s['requests']),
+                    'retries': int(s['retries']),
+                    'errors': int(s['errors']),
+                    'mean_latency_ms': round(s['total_ms'] / s['requests'], 1) if s['requests'] else 0.0
+                }
+                for host, s in self._hosts.items()
+            }
+        return {
+            'connect_timeout': self.timeout[0],
+            'read_timeout': self.timeout[1],
+            'max_retries': self.max_retries,
+            'hosts': hosts,
+            'pools': pools
+        }
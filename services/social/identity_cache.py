@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Scuttle Identity Cache
+Platform account identities (LinkedIn URN, Bluesky DID, WordPress user ID)
+cached per credential
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def credential_fingerprint(credential: str) -> str:
+    """Cache key component for a credential; the secret itself is never stored"""
+    return hashlib.sha256(credential.encode('utf-8')).hexdigest()[:16]
+
+
+class IdentityCache:
+    """
+    Who each configured credential posts as, looked up once per TTL
+
+    Entries are keyed by platform and a fingerprint of the credential, so a
+    rotated token or password starts with a fresh lookup. Concurrent misses
+    on the same key share one fetch. Callers invalidate an entry when the
+    platform answers 401, and the next use fetches it again; failed fetches
+    (None) are not cached.
+    """
+
+    def __init__(self, ttl: float = 86400):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, str], Tuple[Dict[str, Any], float]] = {}
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _key(self, platform: str, credential: str) -> Tuple[str, str]:
+        return platform, credential_fingerprint(credential)
+
+    def get_or_fetch(self, platform: str, credential: str,
+                     fetch: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """Cached identity for the credential, calling `fetch` on a miss or after expiry"""
+        key = self._key(platform, credential)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.monotonic():
+                self.hits += 1
+                return entry[0]
+            key_lock = self._locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have fetched it while we waited
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.monotonic():
+                with self._lock:
+                    self.hits += 1
+                return entry[0]
+
+            with self._lock:
+                self.misses += 1
+            identity = fetch()
+            if identity is not None:
+                with self._lock:
+                    self._entries[key] = (identity, time.monotonic() + self.ttl)
+                logger.info(f"Cached {platform} identity: {identity}")
+            return identity
+
+    def invalidate(self, platform: str, credential: str):
+        with self._lock:
+            if self._entries.pop(self._key(platform, credential), None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'identities': {
+                    f"{platform}:{fingerprint}": {'identity': identity, 'expires_in_seconds': round(expires - now)}
+                    for (platform, fingerprint), (identity, expires) in self._entries.items()
+                }
+            }
@@ -4,50 +4,155 @@ Scuttle MCP Integration
 Handles user-configurable MCP server integrations for enhanced functionality
 """
 
-import os
 import logging
+import random
 import subprocess
 import json
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Any
 from datetime import datetime
-from config import config
+import requests
+from config import config, MCPServer
 
 logger = logging.getLogger(__name__)
 
+class ProbeHistory:
+    """Ring buffer of a server's recent probes: float32 latency and one outcome byte each"""
+    
+    def __init__(self, size: int = 32):
+        self.size = max(1, size)
+        self.latencies = array('f', bytes(4 * self.size))
+        self.outcomes = bytearray(self.size)
+        self.index = 0
+        self.count = 0
+    
+    def record(self, latency_ms: float, ok: bool):
+        self.latencies[self.index] = latency_ms
+        self.outcomes[self.index] = 1 if ok else 0
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+    
+    def summary(self) -> Dict[str, Any]:
+        ok_latencies = sorted(self.latencies[i] for i in range(self.count) if self.outcomes[i])
+        pick = lambda q: round(ok_latencies[min(len(ok_latencies) - 1, int(q * len(ok_latencies)))], 1)
+        return {
+            'samples': self.count,
+            'availability': round(sum(self.outcomes[:self.count]) / self.count, 4) if self.count else None,
+            'p50_ms': pick(0.5) if ok_latencies else None,
+            'p95_ms': pick(0.95) if ok_latencies else None
+        }
+
 class MCPIntegration:
-    """Handles MCP server integrations for Scuttle"""
+    """
+    Handles MCP server integrations for Scuttle
     
-    def __init__(self):
+    A background prober re-checks every configured server on a jittered
+    interval: required environment variables, and for servers with an
+    endpoint (`url_env`) an HTTP request bounded by `probe_timeout`. Results
+    land in a per-server ring buffer, and the status and suggestion payloads
+    are rebuilt after each round, so the /mcp endpoints only read a cached
+    dict and never wait on a slow server.
+    """
+    
+    def __init__(self, probe_timeout: float = 2.0, history_size: int = 32):
         self.available_servers = {}
         self.active_connections = {}
-        self._discover_available_servers()
+        self.probe_timeout = probe_timeout
+        self.history_size = history_size
+        self._history: Dict[str, ProbeHistory] = {}
+        self._session = requests.Session()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._cache: Dict[str, Any] = {}
+        self.probe_rounds = 0
+        # Startup only checks configuration; endpoints are first probed by the prober thread
+        self._discover_available_servers(probe=False)
     
-    def _discover_available_servers(self):
-        """Discover which MCP servers are available and configured"""
-        for server in config.mcp_servers:
-            # Check if required environment variables are present
-            missing_vars = [var for var in server.required_env_vars if not os.getenv(var)]
-            
-            if not missing_vars:
-                self.available_servers[server.name] = {
-                    'config': server,
-                    'status': 'available',
-                    'last_check': datetime.now().isoformat()
-                }
-            else:
-                self.available_servers[server.name] = {
-                    'config': server,
-                    'status': 'missing_config',
-                    'missing_vars': missing_vars,
-                    'last_check': datetime.now().isoformat()
-                }
+    def _probe_endpoint(self, url: str):
+        """(reachable, latency_ms, error) for one HTTP request to the server's endpoint"""
+        started = time.perf_counter()
+        try:
+            response = self._session.get(url, timeout=self.probe_timeout)
+            response.close()
+            # Any answer short of a server error means something is listening
+            reachable, error = response.status_code < 500, None if response.status_code < 500 else f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            reachable, error = False, type(e).__name__
+        return reachable, (time.perf_counter() - started) * 1000, error
+    
+    def _check_server(self, server: MCPServer, probe: bool = True) -> Dict[str, Any]:
+        missing_vars = [var for var in server.required_env_vars if not config.getenv(var)]
+        info = {'config': server, 'last_check': datetime.now().isoformat()}
+        if missing_vars:
+            info.update(status='missing_config', missing_vars=missing_vars, reachability='not_probed')
+            return info
+        
+        url = config.getenv(server.url_env) if server.url_env else None
+        if not (url and probe):
+            info.update(status='available', reachability='not_probed')
+            return info
+        
+        reachable, latency_ms, error = self._probe_endpoint(url)
+        history = self._history.get(server.name)
+        if history is None:
+            history = self._history[server.name] = ProbeHistory(self.history_size)
+        history.record(latency_ms, reachable)
+        info.update(status='available' if reachable else 'unreachable',
+                    reachability='reachable' if reachable else 'unreachable',
+                    probe=dict(history.summary(), last_latency_ms=round(latency_ms, 1)))
+        if error:
+            info['probe']['last_error'] = error
+        return info
+    
+    def _discover_available_servers(self, probe: bool = True):
+        """Check every configured MCP server and rebuild the cached payloads"""
+        servers = config.mcp_servers
+        with ThreadPoolExecutor(max_workers=max(1, len(servers)), thread_name_prefix='scuttle-mcp-probe') as pool:
+            checked = list(pool.map(lambda server: self._check_server(server, probe), servers))
+        
+        # Swap in whole new dicts so readers never see a half-finished round
+        self.available_servers = {info['config'].name: info for info in checked}
+        if probe:
+            self.probe_rounds += 1
+        suggestions = self._build_suggestions()
+        self._cache = {
+            'suggestions': suggestions,
+            'integration_status': self._build_integration_status(suggestions)
+        }
+    
+    def start_prober(self, interval: float = 30.0, jitter: float = 0.2):
+        """Re-probe every `interval` seconds, spread by +/- `jitter` so replicas do not probe in step"""
+        if self._thread is not None or interval <= 0:
+            return
+        
+        def run():
+            while True:
+                try:
+                    self._discover_available_servers()
+                except Exception as e:
+                    logger.error(f"MCP probe round failed: {e}")
+                if self._stop.wait(interval * random.uniform(1 - jitter, 1 + jitter)):
+                    return
+        
+        self._thread = threading.Thread(target=run, name='scuttle-mcp-prober', daemon=True)
+        self._thread.start()
+    
+    def stop_prober(self):
+        self._stop.set()
     
     def get_suggestions(self) -> Dict[str, Any]:
-        """Get MCP server suggestions for the user"""
+        """Get MCP server suggestions for the user (from the last probe round)"""
+        return self._cache['suggestions']
+    
+    def _build_suggestions(self) -> Dict[str, Any]:
         suggestions = {
             'suggested_servers': [],
             'available_servers': [],
-            'configuration_needed': []
+            'configuration_needed': [],
+            'unreachable_servers': []
         }
         
         for name, info in self.available_servers.items():
@@ -55,8 +160,12 @@ class MCPIntegration:
                 'name': name,
                 'description': info['config'].description,
                 'capabilities': info['config'].capabilities,
-                'status': info['status']
+                'status': info['status'],
+                'reachability': info['reachability'],
+                'last_check': info['last_check']
             }
+            if 'probe' in info:
+                server_info['probe'] = info['probe']
             
             if info['config'].suggested:
                 suggestions['suggested_servers'].append(server_info)
@@ -66,6 +175,8 @@ class MCPIntegration:
             elif info['status'] == 'missing_config':
                 server_info['missing_vars'] = info['missing_vars']
                 suggestions['configuration_needed'].append(server_info)
+            elif info['status'] == 'unreachable':
+                suggestions['unreachable_servers'].append(server_info)
         
         return suggestions
     
@@ -115,6 +226,8 @@ class MCPIntegration:
             return {'status': 'unavailable', 'reason': 'Notion MCP not configured'}
         
         server_info = self.available_servers['Notion MCP']
+        if server_info['status'] == 'unreachable':
+            return {'status': 'unreachable', 'probe': server_info['probe']}
         if server_info['status'] != 'available':
             return {
                 'status': 'configuration_needed',
@@ -169,6 +282,8 @@ class MCPIntegration:
             return {'status': 'unavailable', 'reason': 'GitHub MCP not configured'}
         
         server_info = self.available_servers['GitHub MCP']
+        if server_info['status'] == 'unreachable':
+            return {'status': 'unreachable', 'probe': server_info['probe']}
         if server_info['status'] != 'available':
             return {
                 'status': 'configuration_needed',
@@ -210,17 +325,22 @@ class MCPIntegration:
             return {'status': 'error', 'reason': str(e)}
     
     def get_integration_status(self) -> Dict[str, Any]:
-        """Get comprehensive integration status"""
+        """Get comprehensive integration status (from the last probe round)"""
+        return self._cache['integration_status']
+    
+    def _build_integration_status(self, suggestions: Dict[str, Any]) -> Dict[str, Any]:
         return {
             'available_servers': len([s for s in self.available_servers.values() if s['status'] == 'available']),
             'suggested_servers': len([s for s in config.mcp_servers if s.suggested]),
             'configuration_needed': len([s for s in self.available_servers.values() if s['status'] == 'missing_config']),
+            'unreachable_servers': len([s for s in self.available_servers.values() if s['status'] == 'unreachable']),
             'integrations': {
                 'apple_mcp': self.apple_mcp_integration(),
                 'notion_mcp': self.notion_mcp_integration(),
                 'github_mcp': self.github_mcp_integration()
             },
-            'suggestions': self.get_suggestions(),
+            'suggestions': suggestions,
+            'probe_rounds': self.probe_rounds,
             'last_updated': datetime.now().isoformat()
         }
     
@@ -262,7 +382,7 @@ class MCPIntegration:
         # MCP server suggestions
         for server in config.mcp_servers:
             if server.suggested:
-                missing_vars = [var for var in server.required_env_vars if not os.getenv(var)]
+                missing_vars = [var for var in server.required_env_vars if not config.getenv(var)]
                 if missing_vars:
                     guide['optional_enhancements'].append({
                         'title': f'Enable {server.name}',
@@ -284,4 +404,7 @@ class MCPIntegration:
         return guide
 
 # Global MCP integration instance
-mcp = MCPIntegration()
+mcp = MCPIntegration(
+    probe_timeout=config.service_config['mcp_probe_timeout'],
+    history_size=config.service_config['mcp_probe_history']
+)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Scuttle Metrics
+Prometheus instrumentation for the Scuttle API process
+"""
+
+import logging
+import time
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+    METRICS_AVAILABLE = True
+except ImportError:
+    logger.warning("prometheus-client not installed - /metrics will be empty")
+    METRICS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _NoopMetric:
+    """Stands in for any metric when prometheus-client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, *args, **kwargs):
+        pass
+
+    def inc(self, *args, **kwargs):
+        pass
+
+    def dec(self, *args, **kwargs):
+        pass
+
+    def set(self, *args, **kwargs):
+        pass
+
+
+if METRICS_AVAILABLE:
+    HTTP_REQUEST_DURATION = Histogram(
+        'scuttle_http_request_duration_seconds', 'HTTP request latency by route',
+        ['method', 'route', 'status'], buckets=_LATENCY_BUCKETS)
+    PLATFORM_POST_DURATION = Histogram(
+        'scuttle_platform_post_duration_seconds', 'Time to publish to a platform',
+        ['platform'], buckets=_LATENCY_BUCKETS)
+    PLATFORM_POSTS = Counter(
+        'scuttle_platform_posts_total', 'Publish attempts by outcome (posted, failed, rate_limited)',
+        ['platform', 'status'])
+    AI_REQUEST_DURATION = Histogram(
+        'scuttle_ai_request_duration_seconds', 'AI completion latency by provider',
+        ['provider', 'path', 'outcome'], buckets=_LATENCY_BUCKETS)
+    AI_TOKENS = Histogram(
+        'scuttle_ai_tokens', 'Tokens used per AI completion',
+        ['provider', 'kind'], buckets=(16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192))
+    AI_ROUTER_EVENTS = Counter(
+        'scuttle_ai_router_events_total', 'Hedged requests and failovers', ['event'])
+    AI_CACHE_LOOKUPS = Counter(
+        'scuttle_ai_cache_lookups_total', 'AI response cache lookups (memory_hit, disk_hit, miss)', ['result'])
+    AI_BATCH_IN_FLIGHT = Gauge(
+        'scuttle_ai_batch_in_flight', 'Batch completions currently running', ['provider'])
+    # Set from the job and schedule stores at scrape time
+    POST_JOBS = Gauge('scuttle_post_jobs', 'Post jobs waiting or running', ['status'])
+    SCHEDULED_POSTS = Gauge('scuttle_scheduled_posts', 'Posts scheduled for later')
+else:
+    HTTP_REQUEST_DURATION = PLATFORM_POST_DURATION = PLATFORM_POSTS = _NoopMetric()
+    AI_REQUEST_DURATION = AI_TOKENS = AI_ROUTER_EVENTS = AI_CACHE_LOOKUPS = _NoopMetric()
+    AI_BATCH_IN_FLIGHT = POST_JOBS = SCHEDULED_POSTS = _NoopMetric()
+
+
+def record_tokens(provider_type: str, input_tokens: Optional[int], output_tokens: Optional[int]):
+    if input_tokens is not None:
+        AI_TOKENS.labels(provider_type, 'input').observe(input_tokens)
+    if output_tokens is not None:
+        AI_TOKENS.labels(provider_type, 'output').observe(output_tokens)
+
+
+def instrument_app(app, exclude: Tuple[str, ...] = ('/metrics',)):
+    """Record every request's latency under its route template (not the raw path)"""
+    if not METRICS_AVAILABLE:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        started = getattr(g, '_metrics_started', None)
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        if started is not None and route not in exclude:
+            HTTP_REQUEST_DURATION.labels(request.method, route, str(response.status_code)).observe(
+                time.perf_counter() - started)
+        return response
+
+
+def render(refresh: Optional[Callable[[], None]] = None) -> Tuple[bytes, str]:
+    """Exposition payload and content type; `refresh` sets scrape-time gauges first"""
+    if not METRICS_AVAILABLE:
+        return b'# prometheus-client not installed\n', CONTENT_TYPE_LATEST
+    if refresh is not None:
+        try:
+            refresh()
+        except Exception as e:
+            logger.warning(f"Metrics refresh failed: {e}")
+    return generate_latest(), CONTENT_TYPE_LATEST
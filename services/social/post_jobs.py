@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Scuttle Post Jobs
+SQLite-backed queue of posting jobs drained by a background worker pool
+"""
+
+import json
+import logging
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS post_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    results TEXT NOT NULL DEFAULT '{}',
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    claimed_by TEXT,
+    lease_until REAL,
+    run_after REAL
+);
+CREATE INDEX IF NOT EXISTS post_jobs_status ON post_jobs (status, created_at);
+"""
+
+# Added after the first release; older databases get them on open
+_LEASE_COLUMNS = (('claimed_by', 'TEXT'), ('lease_until', 'REAL'), ('run_after', 'REAL'))
+
+TERMINAL_STATUSES = ('completed', 'partial', 'failed')
+
+
+class PostJobQueue:
+    """
+    Posting jobs that outlive the request that created them
+
+    `submit` writes the job to SQLite and returns at once; a pool of worker
+    threads runs `publish(request, on_result)` for each job and records every
+    platform's result as it arrives. Every process sharing the database
+    (Gunicorn workers, the debug reloader) runs its own pool, so a job is
+    only executed after claiming it: a conditional UPDATE that sets
+    `claimed_by` and a `lease_until` the owner keeps renewing. A poller picks
+    up jobs queued by other processes and jobs whose lease expired because
+    their owner died; those resume with the platforms not posted yet.
+    Platforms turned away by the rate limiter are retried once their
+    retry-after has passed instead of failing the job.
+    """
+
+    def __init__(self, db_path: str, publish: Callable[[Dict[str, Any], Callable], Dict[str, Any]],
+                 workers: int = 4, lease_seconds: float = 60.0, poll_interval: float = 5.0):
+        self.db_path = db_path
+        self.publish = publish
+        self.workers = max(1, workers)
+        self.lease_seconds = max(1.0, lease_seconds)
+        self.poll_interval = max(0.1, min(poll_interval, self.lease_seconds / 3))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.deferred = 0
+        self._local = threading.local()
+        self._queue: 'queue.Queue[str]' = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._changed = threading.Condition()
+        self._versions: Dict[str, int] = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        existing = {row[1] for row in conn.execute('PRAGMA table_info(post_jobs)')}
+        for column, kind in _LEASE_COLUMNS:
+            if column not in existing:
+                conn.execute(f'ALTER TABLE post_jobs ADD COLUMN {column} {kind}')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _notify(self, job_id: str):
+        with self._changed:
+            self._versions[job_id] = self._versions.get(job_id, 0) + 1
+            self._changed.notify_all()
+
+    def start(self):
+        """Start the workers and the poller that renews leases and finds claimable jobs"""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'scuttle-job-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._poll, name='scuttle-job-poller', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _poll(self):
+        while True:
+            try:
+                now = time.time()
+                conn = self._connection()
+                conn.execute("UPDATE post_jobs SET lease_until = ? WHERE status = 'running' AND claimed_by = ?",
+                             (now + self.lease_seconds, self.owner))
+                rows = conn.execute(
+                    "SELECT id FROM post_jobs WHERE (status = 'queued' AND COALESCE(run_after, 0) <= ?) "
+                    "OR (status = 'running' AND COALESCE(lease_until, 0) < ?) ORDER BY created_at",
+                    (now, now)).fetchall()
+                for (job_id,) in rows:
+                    self._queue.put(job_id)
+            except sqlite3.Error as e:
+                logger.warning(f"Post job poll failed: {e}")
+            time.sleep(self.poll_interval)
+
+    def _claim(self, job_id: str) -> bool:
+        """Take ownership of a due queued job, or of a running one whose owner's lease expired"""
+        now = time.time()
+        cursor = self._connection().execute(
+            "UPDATE post_jobs SET status = 'running', claimed_by = ?, lease_until = ?, run_after = NULL, "
+            "started_at = COALESCE(started_at, ?) WHERE id = ? AND ("
+            "(status = 'queued' AND COALESCE(run_after, 0) <= ?) OR "
+            "(status = 'running' AND COALESCE(lease_until, 0) < ?))",
+            (self.owner, now + self.lease_seconds, now, job_id, now, now))
+        return cursor.rowcount == 1
+
+    def submit(self, request: Dict[str, Any], job_id: Optional[str] = None) -> Dict[str, Any]:
+        """Persist a posting request and queue it; returns the job (the existing one if `job_id` is taken)"""
+        job_id = job_id or f"job-{uuid.uuid4().hex}"
+        cursor = self._connection().execute(
+            "INSERT OR IGNORE INTO post_jobs (id, status, request, created_at) VALUES (?, 'queued', ?, ?)",
+            (job_id, json.dumps(request), time.time()))
+        if cursor.rowcount == 0:
+            return self.get(job_id)
+        self._queue.put(job_id)
+        logger.info(f"Post job {job_id} queued for {request.get('platforms')}")
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            'SELECT id, status, request, results, error, created_at, started_at, finished_at, run_after '
+            'FROM post_jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        query = ('SELECT id, status, request, results, error, created_at, started_at, finished_at, run_after '
+                 'FROM post_jobs')
+        params: tuple = ()
+        if status:
+            query += ' WHERE status = ?'
+            params = (status,)
+        rows = self._connection().execute(query + ' ORDER BY created_at DESC LIMIT ?', params + (limit,))
+        return [self._to_job(row) for row in rows]
+
+    def _to_job(self, row) -> Dict[str, Any]:
+        job_id, status, request, results, error, created_at, started_at, finished_at, run_after = row
+        request = json.loads(request)
+        iso = lambda ts: datetime.fromtimestamp(ts).isoformat() if ts else None
+        return {
+            'job_id': job_id,
+            'status': status,
+            'platforms': request.get('platforms', []),
+            'results': json.loads(results),
+            'error': error,
+            'created_at': iso(created_at),
+            'started_at': iso(started_at),
+            'finished_at': iso(finished_at),
+            'retry_at': iso(run_after) if status == 'queued' else None
+        }
+
+    def wait_for_update(self, job_id: str, seen: int, timeout: float = 15.0) -> int:
+        """Block until the job changes after version `seen` (or timeout); returns the current version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self._versions.get(job_id, 0) != seen, timeout)
+            return self._versions.get(job_id, 0)
+
+    def version(self, job_id: str) -> int:
+        with self._changed:
+            return self._versions.get(job_id, 0)
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                if not self._claim(job_id):
+                    continue
+            except sqlite3.Error as e:
+                logger.warning(f"Could not claim post job {job_id}: {e}")
+                continue
+            try:
+                self._execute(job_id)
+            except Exception as e:
+                logger.error(f"Post job {job_id} crashed: {e}")
+                self._finish(job_id, 'failed', error=str(e))
+
+    def _execute(self, job_id: str):
+        """Run a job this process has claimed"""
+        conn = self._connection()
+        row = conn.execute('SELECT request, results FROM post_jobs WHERE id = ?', (job_id,)).fetchone()
+        request, results = json.loads(row[0]), json.loads(row[1])
+        self._notify(job_id)
+
+        # A resumed or retried job only publishes to platforms not posted yet
+        done = {p for p, detail in results.items() if detail.get('status') == 'posted'}
+        remaining = dict(request, platforms=[p for p in request.get('platforms', []) if p.lower() not in done])
+        lock = threading.Lock()
+
+        def on_result(platform: str, detail: Dict[str, Any]):
+            with lock:
+                results[platform] = detail
+                self._connection().execute('UPDATE post_jobs SET results = ? WHERE id = ? AND claimed_by = ?',
+                                           (json.dumps(results), job_id, self.owner))
+            self._notify(job_id)
+
+        if remaining['platforms']:
+            self.publish(remaining, on_result)
+
+        # Rate-limited platforms are not failures: retry the job once the earliest slot frees up
+        waits = [detail['retry_after_seconds'] for detail in results.values()
+                 if detail.get('status') == 'rate_limited' and detail.get('retry_after_seconds') is not None]
+        if waits:
+            self._defer(job_id, results, time.time() + min(waits))
+            return
+
+        posted = sum(1 for detail in results.values() if detail.get('status') == 'posted')
+        status = 'completed' if results and posted == len(results) else ('partial' if posted else 'failed')
+        self._finish(job_id, status, results)
+        logger.info(f"Post job {job_id} {status}: {posted}/{len(results)} platforms posted")
+
+    def _defer(self, job_id: str, results: Dict[str, Any], run_after: float):
+        self._connection().execute(
+            "UPDATE post_jobs SET status = 'queued', results = ?, run_after = ?, claimed_by = NULL, "
+            "lease_until = NULL WHERE id = ? AND claimed_by = ?",
+            (json.dumps(results), run_after, job_id, self.owner))
+        self.deferred += 1
+        self._notify(job_id)
+        logger.info(f"Post job {job_id} deferred for rate limits until "
+                    f"{datetime.fromtimestamp(run_after).isoformat()}")
+
+    def _finish(self, job_id: str, status: str, results: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None):
+        conn = self._connection()
+        if results is None:
+            cursor = conn.execute(
+                'UPDATE post_jobs SET status = ?, error = ?, finished_at = ?, lease_until = NULL '
+                'WHERE id = ? AND claimed_by = ?', (status, error, time.time(), job_id, self.owner))
+        else:
+            cursor = conn.execute(
+                'UPDATE post_jobs SET status = ?, results = ?, error = ?, finished_at = ?, lease_until = NULL '
+                'WHERE id = ? AND claimed_by = ?',
+                (status, json.dumps(results), error, time.time(), job_id, self.owner))
+        if cursor.rowcount == 0:
+            logger.warning(f"Post job {job_id} was reclaimed by another process before it finished here")
+        self._notify(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        counts = dict(self._connection().execute('SELECT status, COUNT(*) FROM post_jobs GROUP BY status'))
+        return {
+            'workers': self.workers,
+            'owner': self.owner,
+            'lease_seconds': self.lease_seconds,
+            'queue_depth': self._queue.qsize(),
+            'deferred_for_rate_limits': self.deferred,
+            'jobs': {status: counts.get(status, 0) for status in ('queued', 'running') + TERMINAL_STATUSES}
+        }
+
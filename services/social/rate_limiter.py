@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Scuttle Rate Limiting
+Non-blocking token buckets per platform and account
+"""
+
+import math
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+BLUESKY_ACCOUNTS = ('personal', 'business')
+
+
+def platform_account(platform: str, bluesky_account: str = 'business') -> str:
+    """Rate-limit account key for a platform; only Bluesky has several accounts"""
+    if platform.lower() != 'bluesky':
+        return 'default'
+    # Buckets are created per key, so arbitrary account names must not get one each
+    if bluesky_account not in BLUESKY_ACCOUNTS:
+        raise ValueError(f"bluesky_account must be one of {list(BLUESKY_ACCOUNTS)}")
+    return bluesky_account
+
+
+def is_disabled(retry_after: float) -> bool:
+    """True for the retry-after of a platform configured with 0 posts per hour, which never frees up"""
+    return math.isinf(retry_after)
+
+
+class TokenBucket:
+    """
+    Refills `rate_per_hour` tokens an hour up to `capacity`; never sleeps.
+    A rate of 0 disables posting: the wait is always infinite.
+    """
+
+    def __init__(self, rate_per_hour: float, capacity: float):
+        self.rate = rate_per_hour / 3600.0
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity if self.rate > 0 else 0.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, now: float) -> float:
+        """Take a token and return 0, or return the seconds until one is available"""
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        if self.rate <= 0:
+            return float('inf')
+        return (1.0 - self.tokens) / self.rate
+
+    def reserve(self, now: float) -> float:
+        """
+        Take the next token even if it has not been earned yet and return the
+        seconds until it is; later callers queue behind the reservation
+        """
+        self._refill(now)
+        self.tokens -= 1.0
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate if self.rate > 0 else float('inf')
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available, without taking it"""
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+
+class PlatformRateLimiter:
+    """
+    Posting limits keyed by (platform, account)
+
+    Each account on each platform gets its own bucket, so the personal and
+    business Bluesky accounts are limited independently. Callers are told
+    how long to wait instead of being put to sleep, which keeps request
+    threads free while a platform is cooling down.
+    """
+
+    def __init__(self, default_per_hour: int, burst: int = 1,
+                 per_platform: Optional[Dict[str, int]] = None):
+        self.default_per_hour = default_per_hour
+        self.burst = burst
+        self.per_platform = {k.lower(): v for k, v in (per_platform or {}).items()}
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def _bucket(self, platform: str, account: str) -> TokenBucket:
+        key = (platform.lower(), account)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate = self.per_platform.get(key[0], self.default_per_hour)
+            bucket = self._buckets[key] = TokenBucket(rate, min(self.burst, max(1, rate)))
+        return bucket
+
+    def try_acquire(self, platform: str, account: str = 'default') -> float:
+        """0 if the post may go ahead now, otherwise the retry-after in seconds"""
+        with self._lock:
+            retry_after = self._bucket(platform, account).try_acquire(time.monotonic())
+            if retry_after:
+                self.limited += 1
+            else:
+                self.allowed += 1
+            return retry_after
+
+    def reserve(self, platform: str, account: str = 'default') -> float:
+        """Book a post slot; returns how many seconds from now the post may be sent"""
+        with self._lock:
+            self.allowed += 1
+            return self._bucket(platform, account).reserve(time.monotonic())
+
+    def wait_time(self, platform: str, account: str = 'default') -> float:
+        with self._lock:
+            return self._bucket(platform, account).wait_time(time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'default_posts_per_hour': self.default_per_hour,
+                'burst': self.burst,
+                'per_platform': self.per_platform,
+                'allowed': self.allowed,
+                'limited': self.limited,
+                'buckets': {
+                    f"{platform}:{account}": {
+                        'retry_after_seconds': None if is_disabled(bucket.wait_time(now))
+                        else round(bucket.wait_time(now), 1),
+                        'tokens': round(bucket.tokens, 2),
+                        'capacity': bucket.capacity
+                    }
+                    for (platform, account), bucket in self._buckets.items()
+                }
+            }
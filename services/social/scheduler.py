@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Scuttle Scheduler
+Time-indexed queue of future posts dispatched by a single timer thread
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from rate_limiter import PlatformRateLimiter, is_disabled, platform_account
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled_posts (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    run_at REAL NOT NULL,
+    request TEXT NOT NULL,
+    job_ids TEXT NOT NULL DEFAULT '[]',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    claimed_by TEXT,
+    deferred TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS scheduled_posts_due ON scheduled_posts (status, run_at);
+"""
+
+# Added after the first release; older databases get them on open
+_CLAIM_COLUMNS = (('claimed_by', 'TEXT'), ('deferred', "TEXT NOT NULL DEFAULT '[]'"))
+
+# Longest single sleep, so wall-clock jumps and other processes' schedules are noticed within a minute
+_MAX_WAIT = 60.0
+
+# A schedule left 'dispatching' this long belonged to a process that died mid-dispatch
+_CLAIM_TIMEOUT = 300.0
+
+
+class PostScheduler:
+    """
+    Future posts held in a min-heap ordered by due time
+
+    One timer thread sleeps on a condition until the earliest entry is due
+    and is woken early only when an earlier post is added, so an idle
+    schedule costs nothing. Inserts are O(log n) heap pushes; cancels mark
+    the schedule dead and its heap entry is dropped when it reaches the top,
+    with a rebuild once dead entries outnumber live ones.
+
+    When a post comes due, every (platform, account) it targets reserves the
+    next slot from the rate limiter. Platforms with a slot available now are
+    handed to `dispatch` as one job; the rest are stored as deferred groups,
+    each with the time of its own reserved slot, and the schedule comes due
+    again at the earliest of them. A burst of posts scheduled for the same
+    minute is therefore spread out per platform instead of tripping its limits.
+
+    Schedules live in SQLite shared by every process (Gunicorn workers, the
+    debug reloader), each with its own timer. A process only dispatches a
+    schedule after claiming it with a conditional UPDATE to 'dispatching';
+    the others see rowcount 0 and skip it. Job ids are derived from the
+    schedule, so a schedule taken over from a process that died mid-dispatch
+    cannot create the same job twice.
+    """
+
+    def __init__(self, db_path: str, dispatch: Callable[[Dict[str, Any], str], Dict[str, Any]],
+                 rate_limiter: PlatformRateLimiter):
+        """`dispatch(job_request, job_id)` must return the existing job when `job_id` was already submitted"""
+        self.db_path = db_path
+        self.dispatch = dispatch
+        self.rate_limiter = rate_limiter
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._live: Dict[str, int] = {}
+        self._dead_entries = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.dispatched = 0
+        self.deferred = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        existing = {row[1] for row in conn.execute('PRAGMA table_info(scheduled_posts)')}
+        for column, kind in _CLAIM_COLUMNS:
+            if column not in existing:
+                conn.execute(f'ALTER TABLE scheduled_posts ADD COLUMN {column} {kind}')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _push(self, run_at: float, schedule_id: str):
+        """Add a heap entry (caller holds the condition); wakes the timer if it is the new earliest"""
+        entry = (run_at, next(self._seq), schedule_id)
+        heapq.heappush(self._heap, entry)
+        self._live[schedule_id] = self._live.get(schedule_id, 0) + 1
+        if self._heap[0] is entry:
+            self._cond.notify()
+
+    def _sync(self, horizon: float) -> int:
+        """
+        Index schedules due before `horizon` that this process has no entry
+        for (added or deferred by another process), after releasing claims
+        abandoned by a process that died
+        """
+        now = time.time()
+        conn = self._connection()
+        released = conn.execute(
+            "UPDATE scheduled_posts SET status = 'scheduled', claimed_by = NULL "
+            "WHERE status = 'dispatching' AND updated_at < ?", (now - _CLAIM_TIMEOUT,)).rowcount
+        if released:
+            logger.warning(f"Released {released} scheduled posts abandoned mid-dispatch")
+        rows = conn.execute("SELECT id, run_at FROM scheduled_posts WHERE status = 'scheduled' AND run_at <= ?",
+                            (horizon,)).fetchall()
+        with self._cond:
+            for schedule_id, run_at in rows:
+                if schedule_id not in self._live:
+                    self._push(run_at, schedule_id)
+        return len(rows)
+
+    def start(self):
+        """Load pending schedules and start the timer thread"""
+        if self._thread is not None:
+            return
+        loaded = self._sync(float('inf'))
+        if loaded:
+            logger.info(f"Loaded {loaded} scheduled posts")
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='scuttle-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+
+    def schedule(self, request: Dict[str, Any], run_at: float) -> Dict[str, Any]:
+        """Persist a post for `run_at` (epoch seconds) and index it"""
+        schedule_id = f"sched-{uuid.uuid4().hex}"
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO scheduled_posts (id, status, run_at, request, created_at, updated_at) "
+            "VALUES (?, 'scheduled', ?, ?, ?, ?)", (schedule_id, run_at, json.dumps(request), now, now))
+        with self._cond:
+            self._push(run_at, schedule_id)
+        logger.info(f"Post {schedule_id} scheduled for {datetime.fromtimestamp(run_at).isoformat()}")
+        return self.get(schedule_id)
+
+    def cancel(self, schedule_id: str) -> bool:
+        """Cancel a post that has not been fully dispatched yet"""
+        cursor = self._connection().execute(
+            "UPDATE scheduled_posts SET status = 'cancelled', updated_at = ? WHERE id = ? AND status = 'scheduled'",
+            (time.time(), schedule_id))
+        if cursor.rowcount == 0:
+            return False
+        with self._cond:
+            self._dead_entries += self._live.pop(schedule_id, 0)
+            if self._dead_entries > len(self._heap) // 2:
+                self._heap = [e for e in self._heap if e[2] in self._live]
+                heapq.heapify(self._heap)
+                self._dead_entries = 0
+        return True
+
+    def get(self, schedule_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            'SELECT id, status, run_at, request, job_ids, created_at FROM scheduled_posts WHERE id = ?',
+            (schedule_id,)).fetchone()
+        return self._to_schedule(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        query = 'SELECT id, status, run_at, request, job_ids, created_at FROM scheduled_posts'
+        params: tuple = ()
+        if status:
+            query += ' WHERE status = ?'
+            params = (status,)
+        rows = self._connection().execute(query + ' ORDER BY run_at LIMIT ?', params + (limit,))
+        return [self._to_schedule(row) for row in rows]
+
+    def _to_schedule(self, row) -> Dict[str, Any]:
+        schedule_id, status, run_at, request, job_ids, created_at = row
+        request = json.loads(request)
+        return {
+            'schedule_id': schedule_id,
+            'status': status,
+            'run_at': datetime.fromtimestamp(run_at).isoformat(),
+            'platforms': request.get('platforms', []),
+            'title': request.get('title'),
+            'job_ids': json.loads(job_ids),
+            'created_at': datetime.fromtimestamp(created_at).isoformat()
+        }
+
+    def _run(self):
+        synced = time.monotonic()
+        while True:
+            if time.monotonic() - synced >= _MAX_WAIT:
+                synced = time.monotonic()
+                try:
+                    self._sync(time.time() + _MAX_WAIT)
+                except sqlite3.Error as e:
+                    logger.warning(f"Scheduler sync failed: {e}")
+            with self._cond:
+                if self._stopping:
+                    return
+                while self._heap and self._heap[0][2] not in self._live:
+                    heapq.heappop(self._heap)
+                    self._dead_entries = max(0, self._dead_entries - 1)
+                if not self._heap:
+                    self._cond.wait(_MAX_WAIT)
+                    continue
+                delay = self._heap[0][0] - time.time()
+                if delay > 0:
+                    self._cond.wait(min(delay, _MAX_WAIT))
+                    continue
+                _, _, schedule_id = heapq.heappop(self._heap)
+                remaining = self._live.get(schedule_id, 0) - 1
+                if remaining > 0:
+                    self._live[schedule_id] = remaining
+                else:
+                    self._live.pop(schedule_id, None)
+
+            try:
+                self._fire(schedule_id)
+            except Exception as e:
+                logger.error(f"Failed to dispatch scheduled post {schedule_id}: {e}")
+
+    def _fire(self, schedule_id: str):
+        """
+        Claim a due schedule, then dispatch what may be posted now: deferred
+        groups whose slot has arrived, plus platforms that have no slot
+        reserved yet and get one now. Everything else stays deferred.
+        """
+        conn = self._connection()
+        now = time.time()
+        cursor = conn.execute(
+            "UPDATE scheduled_posts SET status = 'dispatching', claimed_by = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'scheduled' AND run_at <= ?", (self.owner, now, schedule_id, now))
+        if cursor.rowcount != 1:
+            return
+        row = conn.execute('SELECT request, job_ids, deferred FROM scheduled_posts WHERE id = ?',
+                           (schedule_id,)).fetchone()
+        request, job_ids, deferred = json.loads(row[0]), json.loads(row[1]), json.loads(row[2])
+        pending = [p.lower() for p in request.get('platforms', [])]
+        account = request.get('bluesky_account', 'business')
+
+        try:
+            reserved = {p for group in deferred for p in group['platforms']}
+            ready = [p for group in deferred if group['run_at'] <= now for p in group['platforms'] if p in pending]
+            deferred = [group for group in deferred if group['run_at'] > now]
+            later: Dict[int, List[str]] = {}
+            disabled = []
+            for platform in pending:
+                if platform in reserved:
+                    continue
+                delay = self.rate_limiter.reserve(platform, platform_account(platform, account))
+                if is_disabled(delay):
+                    disabled.append(platform)
+                elif delay <= 0:
+                    ready.append(platform)
+                else:
+                    # Slots in the same second go out together as one job
+                    later.setdefault(math.ceil(delay), []).append(platform)
+            deferred += [{'run_at': now + delay, 'platforms': group} for delay, group in later.items()]
+
+            if ready:
+                job = self.dispatch(dict(request, platforms=ready, reserved=True),
+                                    f"job-{schedule_id}-{len(job_ids)}")
+                job_ids.append(job['job_id'])
+                self.dispatched += 1
+        except Exception:
+            conn.execute("UPDATE scheduled_posts SET status = 'scheduled', claimed_by = NULL "
+                         'WHERE id = ? AND claimed_by = ?', (schedule_id, self.owner))
+            raise
+
+        if disabled:
+            logger.warning(f"Scheduled post {schedule_id}: dropping {disabled}, posting is disabled "
+                           f"(0 posts per hour)")
+        pending = [p for p in pending if p not in ready and p not in disabled]
+        next_run = min(group['run_at'] for group in deferred) if deferred else now
+        conn.execute(
+            'UPDATE scheduled_posts SET status = ?, run_at = ?, request = ?, job_ids = ?, deferred = ?, '
+            "claimed_by = NULL, updated_at = ? WHERE id = ? AND status = 'dispatching' AND claimed_by = ?",
+            ('scheduled' if pending else 'dispatched', next_run, json.dumps(dict(request, platforms=pending)),
+             json.dumps(job_ids), json.dumps(deferred), time.time(), schedule_id, self.owner))
+
+        if pending:
+            with self._cond:
+                self._push(next_run, schedule_id)
+        if later:
+            self.deferred += 1
+            logger.info(f"Scheduled post {schedule_id}: {len(ready)} platforms dispatched, "
+                        f"{len(pending)} deferred up to {max(later)}s for rate limits")
+
+    def stats(self) -> Dict[str, Any]:
+        """`scheduled` counts the shared store; the heap figures are this process's timer"""
+        counts = dict(self._connection().execute(
+            "SELECT status, COUNT(*) FROM scheduled_posts WHERE status IN ('scheduled', 'dispatching') "
+            "GROUP BY status"))
+        with self._cond:
+            heap_entries = len(self._heap)
+            next_due = self._heap[0][0] if self._heap else None
+        return {
+            'scheduled': counts.get('scheduled', 0),
+            'dispatching': counts.get('dispatching', 0),
+            'heap_entries': heap_entries,
+            'next_due': datetime.fromtimestamp(next_due).isoformat() if next_due else None,
+            'dispatched': self.dispatched,
+            'deferred_for_rate_limits': self.deferred
+        }
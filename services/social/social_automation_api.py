@@ -5,30 +5,65 @@ Full-featured social media automation with AI content processing,
 multi-platform posting, and user-configurable providers.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 import os
+import json
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from datetime import datetime, date
-from notion_client import Client
-from atproto import Client as BlueSkyClient
-import anthropic
-import openai
-import requests
+from dateutil import parser as date_parser
 from dotenv import load_dotenv
 from config import config, AIProvider, PlatformConfig
 from mcp_integration import mcp
+from rate_limiter import BLUESKY_ACCOUNTS, PlatformRateLimiter, is_disabled, platform_account
+from http_sessions import PlatformHTTP
+from identity_cache import IdentityCache
+from bluesky_sessions import BlueskySessions
+from ai_batch import AIBatchProcessor
+from ai_cache import AIResponseCache, response_key
+from ai_router import ProviderRouter
+from post_jobs import PostJobQueue, TERMINAL_STATUSES
+from scheduler import PostScheduler
+from config_reload import ConfigReloader
+import metrics
+import tracing
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+DEBUG = os.getenv('NODE_ENV') != 'production'
+# The debug reloader runs this script twice: a watcher parent that only restarts
+# the server, and the serving child (WERKZEUG_RUN_MAIN set). Background workers
+# start in the child alone.
+RELOADER_PARENT = __name__ == '__main__' and DEBUG and not os.getenv('WERKZEUG_RUN_MAIN')
+if config.service_config['metrics_enabled']:
+    metrics.instrument_app(app)
 
 # Configure logging
 log_level = getattr(logging, config.service_config['log_level'], logging.INFO)
 logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+if tracing.configure('scuttle', config.service_config['tracing_enabled'],
+                     sample_rate=config.service_config['tracing_sample_rate'],
+                     exporter=config.service_config['tracing_exporter'],
+                     file_path=config.service_config['tracing_file']):
+    tracing.instrument_app(app)
+
+SUPPORTED_PLATFORMS = ('bluesky', 'linkedin', 'wordpress')
+
+# Environment each integration is initialized from; a reload that changes
+# any of them re-runs just that initializer (AI clients follow ai_providers)
+INTEGRATION_ENV = {
+    'notion': ('NOTION_TOKEN', 'NOTION_DATABASE_ID'),
+    'bluesky_personal': ('BLUESKY_PERSONAL_HANDLE', 'BLUESKY_PERSONAL_PASSWORD'),
+    'bluesky_business': ('BLUESKY_BUSINESS_HANDLE', 'BLUESKY_BUSINESS_PASSWORD'),
+    'wordpress': ('WORDPRESS_URL', 'WORDPRESS_USER', 'WORDPRESS_APP_PASSWORD'),
+    'linkedin': ('LINKEDIN_ACCESS_TOKEN',)
+}
+
 class ScuttleService:
     """Main Scuttle service class handling AI processing and social media posting"""
     
@@ -37,66 +72,167 @@ class ScuttleService:
         self.notion = None
         self.bluesky_accounts = {}
         self.ai_clients = {}
+        self.ai_batch = AIBatchProcessor()
+        self.ai_router = ProviderRouter(
+            window=self.config.service_config['ai_router_window'],
+            error_threshold=self.config.service_config['ai_router_error_threshold'],
+            cooldown=self.config.service_config['ai_router_cooldown'],
+            failover=self.config.service_config['ai_failover'],
+            hedge=self.config.service_config['ai_hedge'],
+            hedge_min_delay=self.config.service_config['ai_hedge_min_delay'],
+            hedge_default_delay=self.config.service_config['ai_hedge_default_delay'],
+            request_timeout=self.config.service_config['ai_request_timeout'],
+            max_workers=self.config.service_config['ai_router_max_workers']
+        )
+        self.ai_cache = None
+        if self.config.service_config['ai_cache_enabled']:
+            self.ai_cache = AIResponseCache(
+                max_entries=self.config.service_config['ai_cache_max_entries'],
+                ttl=self.config.service_config['ai_cache_ttl'],
+                db_path=os.path.join(self.config.service_config['data_dir'], 'ai_cache.db')
+                if self.config.service_config['ai_cache_persist'] else None
+            )
+        self.rate_limiter = PlatformRateLimiter(
+            default_per_hour=self.config.service_config['rate_limit_posts_per_hour'],
+            burst=self.config.service_config['rate_limit_burst'],
+            per_platform=self.config.service_config['platform_rate_limits']
+        )
+        self.post_executor = ThreadPoolExecutor(
+            max_workers=self.config.service_config['post_max_workers'],
+            thread_name_prefix='scuttle-post'
+        )
+        self.http = PlatformHTTP(
+            connect_timeout=self.config.service_config['http_connect_timeout'],
+            read_timeout=self.config.service_config['http_read_timeout'],
+            max_retries=self.config.service_config['http_max_retries'],
+            backoff_max=self.config.service_config['http_backoff_max'],
+            pool_maxsize=self.config.service_config['http_pool_maxsize']
+        )
+        self.identities = IdentityCache(ttl=self.config.service_config['identity_cache_ttl'])
+        self.bluesky_sessions = BlueskySessions(
+            directory=self.config.service_config['bluesky_session_dir'],
+            key=self.config.service_config['bluesky_session_key'],
+            refresh_margin=self.config.service_config['bluesky_session_refresh_margin'],
+            check_interval=self.config.service_config['bluesky_session_check_interval']
+        )
         
-        # Initialize integrations
-        self._init_notion()
-        self._init_bluesky_accounts()
-        self._init_ai_clients()
-        self._init_wordpress()
-        self._init_linkedin()
+        # Integrations are filled in by start_integrations(); until then they read as unconfigured
+        self.database_id = None
+        self.wordpress_url = self.wordpress_user = self.wordpress_password = None
+        self.linkedin_token = None
+        self.integrations = {}
+        self._integration_futures = {}
     
-    def _init_notion(self):
-        """Initialize Notion client if configured"""
-        try:
-            notion_token = os.getenv('NOTION_TOKEN')
-            if notion_token:
-                self.notion = Client(auth=notion_token)
-                self.database_id = os.getenv('NOTION_DATABASE_ID')
-                logger.info("Notion integration initialized")
-            else:
-                logger.warning("Notion token not found - Notion integration disabled")
-        except Exception as e:
-            logger.error(f"Failed to initialize Notion: {e}")
+    def _initializers(self):
+        """Integration name -> initializer returning True if configured"""
+        return {
+            'notion': self._init_notion,
+            'bluesky_personal': lambda: self._init_bluesky_account('personal'),
+            'bluesky_business': lambda: self._init_bluesky_account('business'),
+            'ai_clients': self._init_ai_clients,
+            'wordpress': self._init_wordpress,
+            'linkedin': self._init_linkedin
+        }
     
-    def _init_bluesky_accounts(self):
-        """Initialize Bluesky accounts"""
-        self.bluesky_accounts = {}
+    def start_integrations(self):
+        """
+        Initialize all integrations concurrently in the background
         
-        # Personal account
-        try:
-            personal_handle = os.getenv('BLUESKY_PERSONAL_HANDLE')
-            personal_password = os.getenv('BLUESKY_PERSONAL_PASSWORD')
-            
-            if personal_handle and personal_password:
-                personal_client = BlueSkyClient()
-                personal_client.login(personal_handle, personal_password)
-                self.bluesky_accounts['personal'] = {
-                    'client': personal_client,
-                    'handle': personal_handle
-                }
-                logger.info(f"Bluesky personal account initialized: {personal_handle}")
-        except Exception as e:
-            logger.error(f"Failed to initialize Bluesky personal account: {e}")
+        Returns immediately, so startup never waits on a slow Bluesky PDS or
+        provider SDK. The SDKs themselves are imported by the initializers,
+        since importing them is a large share of cold start. Progress is
+        reported by readiness(); code that needs an integration waits for
+        just that one via wait_for_integration().
+        """
+        self._launch_initializers(self._initializers())
+        self.bluesky_sessions.start()
+    
+    def _launch_initializers(self, initializers):
+        executor = ThreadPoolExecutor(max_workers=len(initializers), thread_name_prefix='scuttle-init')
+        for name, init in initializers.items():
+            self.integrations[name] = {'state': 'initializing'}
+            self._integration_futures[name] = executor.submit(self._run_initializer, name, init)
+        executor.shutdown(wait=False)
+    
+    def apply_config_reload(self, reload):
+        """
+        Re-initialize only the integrations whose settings changed in a reload
+        
+        Each initializer builds its client off to the side and swaps it in, so
+        requests already using the old client finish on it; new requests wait
+        for the re-initialized one as they do at startup.
+        """
+        old, new, changed = reload['old'], reload['new'], reload['changed_env']
+        names = [name for name, env in INTEGRATION_ENV.items() if changed.intersection(env)]
+        provider_env = {p.api_key_env for p in old.ai_providers + new.ai_providers}
+        if old.ai_providers != new.ai_providers or changed & provider_env:
+            names.append('ai_clients')
         
-        # Business account
+        initializers = self._initializers()
+        if names:
+            self._launch_initializers({name: initializers[name] for name in names})
+        return names
+    
+    def _run_initializer(self, name, init):
+        started = time.perf_counter()
         try:
-            business_handle = os.getenv('BLUESKY_BUSINESS_HANDLE')
-            business_password = os.getenv('BLUESKY_BUSINESS_PASSWORD')
-            
-            if business_handle and business_password:
-                business_client = BlueSkyClient()
-                business_client.login(business_handle, business_password)
-                self.bluesky_accounts['business'] = {
-                    'client': business_client,
-                    'handle': business_handle
-                }
-                logger.info(f"Bluesky business account initialized: {business_handle}")
+            state, error = ('ready' if init() else 'disabled'), None
         except Exception as e:
-            logger.error(f"Failed to initialize Bluesky business account: {e}")
+            state, error = 'failed', str(e) or type(e).__name__
+            logger.error(f"Failed to initialize {name}: {error}")
+        self.integrations[name] = {
+            'state': state,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+        if error:
+            self.integrations[name]['error'] = error
+    
+    def wait_for_integration(self, name, timeout=None):
+        """Block until one integration has finished initializing (or `timeout` passes)"""
+        future = self._integration_futures.get(name)
+        if future is not None:
+            wait([future], timeout=self.config.service_config['integration_wait_timeout'] if timeout is None else timeout)
+    
+    def readiness(self):
+        """Per-integration init state; ready once none is still initializing"""
+        integrations = dict(self.integrations)
+        return {
+            'ready': bool(integrations) and all(i['state'] != 'initializing' for i in integrations.values()),
+            'integrations': integrations
+        }
+    
+    def _init_notion(self):
+        """Initialize Notion client if configured"""
+        notion_token = self.config.getenv('NOTION_TOKEN')
+        if not notion_token:
+            logger.warning("Notion token not found - Notion integration disabled")
+            self.notion = None
+            return False
+        from notion_client import Client
+        self.notion = Client(auth=notion_token)
+        self.database_id = self.config.getenv('NOTION_DATABASE_ID')
+        logger.info("Notion integration initialized")
+        return True
+    
+    def _init_bluesky_account(self, account_type):
+        """Log in one Bluesky account (personal or business), reusing its stored session if any"""
+        handle = self.config.getenv(f'BLUESKY_{account_type.upper()}_HANDLE')
+        password = self.config.getenv(f'BLUESKY_{account_type.upper()}_PASSWORD')
+        if not (handle and password):
+            self.bluesky_accounts.pop(account_type, None)
+            return False
+        
+        client = self.bluesky_sessions.login(handle, password)
+        self.bluesky_accounts[account_type] = {
+            'client': client,
+            'handle': handle
+        }
+        logger.info(f"Bluesky {account_type} account initialized: {handle}")
+        return True
     
     def _init_ai_clients(self):
         """Initialize AI provider clients"""
-        self.ai_clients = {}
+        ai_clients = {}
         
         for provider in self.config.ai_providers:
             if not provider.enabled:
@@ -104,92 +240,193 @@ class ScuttleService:
                 
             try:
                 if provider.type == 'anthropic':
-                    api_key = os.getenv(provider.api_key_env)
+                    api_key = self.config.getenv(provider.api_key_env)
                     if api_key:
-                        self.ai_clients[provider.type] = anthropic.Anthropic(api_key=api_key)
+                        import anthropic
+                        ai_clients[provider.type] = anthropic.Anthropic(
+                            api_key=api_key, timeout=self.config.service_config['ai_request_timeout'])
                         logger.info(f"Anthropic client initialized: {provider.name}")
                 
                 elif provider.type == 'openai':
-                    api_key = os.getenv(provider.api_key_env)
+                    api_key = self.config.getenv(provider.api_key_env)
                     if api_key:
-                        self.ai_clients[provider.type] = openai.OpenAI(api_key=api_key)
+                        import openai
+                        ai_clients[provider.type] = openai.OpenAI(
+                            api_key=api_key, timeout=self.config.service_config['ai_request_timeout'])
                         logger.info(f"OpenAI client initialized: {provider.name}")
                 
                 elif provider.type == 'local_llm':
-                    endpoint = os.getenv(provider.api_key_env)
+                    endpoint = self.config.getenv(provider.api_key_env)
                     if endpoint:
                         # TODO: Implement local LLM client
                         logger.info(f"Local LLM endpoint configured: {endpoint}")
                         
             except Exception as e:
                 logger.error(f"Failed to initialize {provider.name}: {e}")
+        
+        self.ai_clients = ai_clients
+        return bool(ai_clients)
     
     def _init_wordpress(self):
         """Initialize WordPress configuration"""
-        self.wordpress_url = os.getenv('WORDPRESS_URL')
-        self.wordpress_user = os.getenv('WORDPRESS_USER')
-        self.wordpress_password = os.getenv('WORDPRESS_APP_PASSWORD')
+        self.wordpress_url = self.config.getenv('WORDPRESS_URL')
+        self.wordpress_user = self.config.getenv('WORDPRESS_USER')
+        self.wordpress_password = self.config.getenv('WORDPRESS_APP_PASSWORD')
         
         if all([self.wordpress_url, self.wordpress_user, self.wordpress_password]):
             logger.info("WordPress configuration loaded")
-        else:
-            logger.warning("WordPress credentials incomplete")
+            return True
+        logger.warning("WordPress credentials incomplete")
+        return False
     
     def _init_linkedin(self):
         """Initialize LinkedIn configuration"""
-        self.linkedin_token = os.getenv('LINKEDIN_ACCESS_TOKEN')
+        self.linkedin_token = self.config.getenv('LINKEDIN_ACCESS_TOKEN')
         if self.linkedin_token:
             logger.info("LinkedIn configuration loaded")
+            return True
+        logger.warning("LinkedIn token not found")
+        return False
+    
+    def _ai_provider(self, provider_type=None):
+        """Requested (or default active) AI provider, if its client is available"""
+        if provider_type:
+            provider = next((p for p in self.config.ai_providers if p.type == provider_type), None)
         else:
-            logger.warning("LinkedIn token not found")
+            provider = self.config.get_active_ai_provider()
+        
+        if not provider or provider.type not in self.ai_clients:
+            raise Exception("No active AI provider available")
+        return provider
     
-    def process_with_ai(self, content, custom_prompt=None, provider_type=None):
-        """Process content with AI using configured provider"""
-        try:
-            # Get AI provider
-            if provider_type:
-                provider = next((p for p in self.config.ai_providers if p.type == provider_type), None)
-            else:
-                provider = self.config.get_active_ai_provider()
-            
-            if not provider or provider.type not in self.ai_clients:
-                raise Exception("No active AI provider available")
-            
-            # Default prompt
-            prompt = custom_prompt or """
+    def _ai_prompt(self, content, custom_prompt=None):
+        # Default prompt
+        prompt = custom_prompt or """
             Rewrite this content to be engaging for social media while maintaining the core message.
             Make it conversational, add value, and include relevant hashtags if appropriate.
             Keep the tone professional but approachable.
             """
-            
-            full_prompt = f"{prompt}\n\nContent to rewrite:\n{content}"
-            
-            # Process with appropriate client
-            if provider.type == 'anthropic':
-                response = self.ai_clients['anthropic'].messages.create(
-                    model=provider.model,
-                    max_tokens=provider.max_tokens,
-                    messages=[{"role": "user", "content": full_prompt}]
-                )
-                return response.content[0].text.strip()
-            
-            elif provider.type == 'openai':
-                response = self.ai_clients['openai'].chat.completions.create(
-                    model=provider.model,
-                    max_tokens=provider.max_tokens,
-                    messages=[{"role": "user", "content": full_prompt}]
-                )
-                return response.choices[0].message.content.strip()
-            
-            else:
-                raise Exception(f"AI provider type '{provider.type}' not implemented")
-                
+        
+        return f"{prompt}\n\nContent to rewrite:\n{content}"
+    
+    def _cache_key(self, provider, full_prompt, use_cache):
+        """Response cache key, or None when caching is off for this call"""
+        if not (use_cache and self.ai_cache):
+            return None
+        return response_key(provider.type, provider.model, provider.max_tokens, full_prompt)
+    
+    def _ai_complete(self, provider, full_prompt):
+        """One blocking completion from a provider's SDK client"""
+        if provider.type == 'anthropic':
+            response = self.ai_clients['anthropic'].messages.create(
+                model=provider.model,
+                max_tokens=provider.max_tokens,
+                messages=[{"role": "user", "content": full_prompt}]
+            )
+            metrics.record_tokens(provider.type, response.usage.input_tokens, response.usage.output_tokens)
+            return response.content[0].text.strip()
+        
+        elif provider.type == 'openai':
+            response = self.ai_clients['openai'].chat.completions.create(
+                model=provider.model,
+                max_tokens=provider.max_tokens,
+                messages=[{"role": "user", "content": full_prompt}]
+            )
+            if response.usage:
+                metrics.record_tokens(provider.type, response.usage.prompt_tokens, response.usage.completion_tokens)
+            return response.choices[0].message.content.strip()
+        
+        else:
+            raise Exception(f"AI provider type '{provider.type}' not implemented")
+    
+    def rewrite(self, content, custom_prompt=None, provider_type=None, use_cache=True):
+        """
+        Rewrite content, returning generated_content, the provider that
+        answered and whether it came from cache; raises if every provider fails
+        
+        The requested (or default) provider is preferred when its client is
+        available; otherwise every available provider is routed as usual. The
+        router fails over to, or hedges with, the other configured providers,
+        and a cached answer from any provider it would use is served.
+        """
+        self.wait_for_integration('ai_clients')
+        providers = [p for p in self.config.ai_providers if p.enabled and p.type in self.ai_clients]
+        if not providers:
+            raise Exception("No active AI provider available")
+        wanted = provider_type or (self.config.get_active_ai_provider() or providers[0]).type
+        preferred = next((p for p in providers if p.type == wanted), None)
+        full_prompt = self._ai_prompt(content, custom_prompt)
+        
+        if use_cache and self.ai_cache:
+            # Answers are cached under the provider that gave them, which may be a failover
+            for candidate in self.ai_router.order(providers, preferred):
+                cached = self.ai_cache.get(self._cache_key(candidate, full_prompt, use_cache))
+                if cached is not None:
+                    return {'generated_content': cached, 'provider': candidate.name, 'cached': True}
+        
+        text, provider = self.ai_router.call(providers, lambda p: self._ai_complete(p, full_prompt), preferred)
+        
+        # Stored under the provider that actually answered
+        if use_cache and self.ai_cache:
+            self.ai_cache.put(self._cache_key(provider, full_prompt, use_cache), text)
+        return {'generated_content': text, 'provider': provider.name, 'cached': False}
+    
+    def process_with_ai(self, content, custom_prompt=None, provider_type=None, use_cache=True):
+        """Process content with AI using configured provider; identical requests are served from cache"""
+        try:
+            return self.rewrite(content, custom_prompt, provider_type, use_cache)['generated_content']
         except Exception as e:
             logger.error(f"Error processing content with AI: {e}")
             return None
     
+    def process_batch(self, items, custom_prompt=None, provider_type=None, use_cache=True):
+        """
+        Rewrite many contents concurrently, yielding each result as it finishes
+        
+        Items may override the prompt, provider and cache use. Cached rewrites
+        are yielded first; the rest run through the async provider clients,
+        bounded per provider by AIProvider's max_concurrency and
+        tokens_per_minute. Closing the generator early cancels whatever has
+        not started yet.
+        """
+        self.wait_for_integration('ai_clients')
+        futures = {}
+        for index, item in enumerate(items):
+            item_id = item.get('id', index)
+            try:
+                provider = self._ai_provider(item.get('provider_type') or provider_type)
+                prompt = self._ai_prompt(item['content'], item.get('custom_prompt') or custom_prompt)
+            except Exception as e:
+                yield {'index': index, 'id': item_id, 'status': 'failed', 'error': str(e)}
+                continue
+            
+            cache_key = self._cache_key(provider, prompt, item.get('cache', use_cache))
+            cached = self.ai_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                yield {'index': index, 'id': item_id, 'provider': provider.name, 'status': 'success',
+                       'generated_content': cached, 'cached': True}
+                continue
+            futures[self.ai_batch.submit(provider, prompt)] = (index, item_id, provider, cache_key)
+        
+        try:
+            for future in as_completed(futures):
+                index, item_id, provider, cache_key = futures[future]
+                result = {'index': index, 'id': item_id, 'provider': provider.name}
+                try:
+                    result.update(status='success', cached=False, **future.result())
+                    if cache_key:
+                        self.ai_cache.put(cache_key, result['generated_content'])
+                except Exception as e:
+                    logger.error(f"Batch item {item_id} failed on {provider.name}: {e}")
+                    result.update(status='failed', error=str(e))
+                yield result
+        finally:
+            for future in futures:
+                future.cancel()
+    
     def post_to_bluesky(self, content, account_type='business'):
         """Post to Bluesky account"""
+        self.wait_for_integration(f'bluesky_{account_type}')
         if account_type not in self.bluesky_accounts:
             logger.warning(f"Bluesky {account_type} account not available")
             return None
@@ -199,27 +436,79 @@ class ScuttleService:
             if self.config.service_config['test_mode']:
                 content = f"[TEST] {content}"
             
+            from atproto_client.exceptions import UnauthorizedError
             account = self.bluesky_accounts[account_type]
             client = account['client']
-            handle = account['handle']
+            identity = self._bluesky_identity(account_type) or {'handle': account['handle']}
             
-            response = client.send_post(content)
+            # A rejected session is renewed (from the store, a refresh or a login) and the post retried once
+            self.bluesky_sessions.ensure_fresh(account['handle'])
+            try:
+                response = client.send_post(content)
+            except UnauthorizedError as e:
+                logger.warning(f"Bluesky {account_type} session rejected ({e}); renewing")
+                self.identities.invalidate('bluesky', account['handle'])
+                self.bluesky_sessions.ensure_fresh(account['handle'], force=True)
+                response = client.send_post(content)
             
             if response and response.uri:
                 parts = response.uri.split('/')
                 rkey = parts[-1]
-                bluesky_url = f"https://bsky.app/profile/{handle}/post/{rkey}"
+                bluesky_url = f"https://bsky.app/profile/{identity['handle']}/post/{rkey}"
                 
                 logger.info(f"Posted to Bluesky ({account_type}): {bluesky_url}")
                 return bluesky_url
             
         except Exception as e:
-            logger.error(f"Error posting to Bluesky {account_type}: {e}")
+            from atproto_client.exceptions import UnauthorizedError
+            if isinstance(e, UnauthorizedError):
+                self.identities.invalidate('bluesky', self.bluesky_accounts[account_type]['handle'])
+                logger.error(f"Bluesky {account_type} session rejected: {e}")
+            else:
+                logger.error(f"Error posting to Bluesky {account_type}: {e}")
         
         return None
     
+    def _bluesky_identity(self, account_type):
+        """DID and current handle of a Bluesky account, from its session profile"""
+        account = self.bluesky_accounts[account_type]
+        
+        def fetch():
+            me = account['client'].me
+            if me is None:
+                return None
+            return {'did': me.did, 'handle': me.handle}
+        
+        return self.identities.get_or_fetch('bluesky', account['handle'], fetch)
+    
+    def _linkedin_identity(self, headers):
+        """Author URN for the LinkedIn token, fetched from the profile endpoint on a miss"""
+        def fetch():
+            profile_response = self.http.get("https://api.linkedin.com/v2/people/~", headers=headers)
+            if profile_response.status_code != 200:
+                logger.error(f"Failed to get LinkedIn profile: {profile_response.status_code}")
+                return None
+            return {'author_urn': f"urn:li:person:{profile_response.json()['id']}"}
+        
+        return self.identities.get_or_fetch('linkedin', self.linkedin_token, fetch)
+    
+    def _wordpress_identity(self, auth):
+        """WordPress user ID for the application password, fetched from users/me on a miss"""
+        def fetch():
+            response = self.http.get(f"{self.wordpress_url.rstrip('/')}/wp-json/wp/v2/users/me", auth=auth)
+            if response.status_code != 200:
+                logger.error(f"Failed to get WordPress user: {response.status_code}")
+                return None
+            return {'user_id': response.json()['id']}
+        
+        return self.identities.get_or_fetch('wordpress', self._wordpress_credential(), fetch)
+    
+    def _wordpress_credential(self):
+        return f"{self.wordpress_url}|{self.wordpress_user}|{self.wordpress_password}"
+    
     def post_to_linkedin(self, content):
         """Post to LinkedIn"""
+        self.wait_for_integration('linkedin')
         if not self.linkedin_token:
             logger.warning("LinkedIn token not available")
             return None
@@ -228,38 +517,37 @@ class ScuttleService:
             if self.config.service_config['test_mode']:
                 content = f"[TEST] {content}"
             
-            # Get user profile
-            profile_url = "https://api.linkedin.com/v2/people/~"
             headers = {
                 'Authorization': f'Bearer {self.linkedin_token}',
                 'Content-Type': 'application/json'
             }
             
-            profile_response = requests.get(profile_url, headers=headers)
-            if profile_response.status_code != 200:
-                logger.error(f"Failed to get LinkedIn profile: {profile_response.status_code}")
-                return None
-            
-            profile_data = profile_response.json()
-            author_urn = profile_data['id']
-            
-            # Create post
-            url = "https://api.linkedin.com/v2/ugcPosts"
-            payload = {
-                "author": f"urn:li:person:{author_urn}",
-                "lifecycleState": "PUBLISHED",
-                "specificContent": {
-                    "com.linkedin.ugc.ShareContent": {
-                        "shareCommentary": {"text": content},
-                        "shareMediaCategory": "NONE"
+            # A 401 may mean the cached author belongs to a revoked grant: refetch once
+            for attempt in range(2):
+                identity = self._linkedin_identity(headers)
+                if identity is None:
+                    return None
+                
+                url = "https://api.linkedin.com/v2/ugcPosts"
+                payload = {
+                    "author": identity['author_urn'],
+                    "lifecycleState": "PUBLISHED",
+                    "specificContent": {
+                        "com.linkedin.ugc.ShareContent": {
+                            "shareCommentary": {"text": content},
+                            "shareMediaCategory": "NONE"
+                        }
+                    },
+                    "visibility": {
+                        "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
                     }
-                },
-                "visibility": {
-                    "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
                 }
-            }
-            
-            response = requests.post(url, headers=headers, json=payload)
+                
+                response = self.http.post(url, headers=headers, json=payload)
+                if response.status_code != 401 or attempt:
+                    break
+                self.identities.invalidate('linkedin', self.linkedin_token)
+                logger.warning("LinkedIn rejected the post with 401; refreshing author identity")
             
             if response.status_code == 201:
                 post_data = response.json()
@@ -278,6 +566,7 @@ class ScuttleService:
     
     def post_to_wordpress(self, title, content):
         """Post to WordPress"""
+        self.wait_for_integration('wordpress')
         if not all([self.wordpress_url, self.wordpress_user, self.wordpress_password]):
             logger.warning("WordPress credentials not complete")
             return None
@@ -287,19 +576,27 @@ class ScuttleService:
                 title = f"[TEST] {title}"
             
             api_url = f"{self.wordpress_url.rstrip('/')}/wp-json/wp/v2/posts"
+            auth = (self.wordpress_user, self.wordpress_password)
             
-            post_data = {
-                'title': title,
-                'content': content,
-                'status': 'publish',
-                'meta': {
-                    'scuttle_posted': True,
-                    'post_date': datetime.now().isoformat()
+            for attempt in range(2):
+                post_data = {
+                    'title': title,
+                    'content': content,
+                    'status': 'publish',
+                    'meta': {
+                        'scuttle_posted': True,
+                        'post_date': datetime.now().isoformat()
+                    }
                 }
-            }
-            
-            auth = (self.wordpress_user, self.wordpress_password)
-            response = requests.post(api_url, json=post_data, auth=auth)
+                identity = self._wordpress_identity(auth)
+                if identity is not None:
+                    post_data['author'] = identity['user_id']
+                
+                response = self.http.post(api_url, json=post_data, auth=auth)
+                if response.status_code != 401 or attempt:
+                    break
+                self.identities.invalidate('wordpress', self._wordpress_credential())
+                logger.warning("WordPress rejected the post with 401; refreshing user identity")
             
             if response.status_code == 201:
                 post_data = response.json()
@@ -315,19 +612,156 @@ class ScuttleService:
         
         return None
 
+    def _post_to_platform(self, platform, content, title, account):
+        if platform == 'bluesky':
+            return self.post_to_bluesky(content, account)
+        if platform == 'linkedin':
+            return self.post_to_linkedin(content)
+        return self.post_to_wordpress(title, content)
+    
+    def _timed_post(self, platform, content, title, account):
+        started = time.perf_counter()
+        with tracing.span('social.post', platform=platform, account=account) as current:
+            url = self._post_to_platform(platform, content, title, account)
+            if current is not None:
+                current.set_attribute('social.posted', bool(url))
+        elapsed = time.perf_counter() - started
+        metrics.PLATFORM_POST_DURATION.labels(platform).observe(elapsed)
+        return url, round(elapsed * 1000, 1)
+    
+    def publish(self, content, platforms, title='Scuttle Post', bluesky_account='business', on_result=None,
+                acquire=True):
+        """
+        Post to all requested platforms concurrently
+        
+        Each (platform, account) pair must take a token from its rate limiter
+        first; a platform that is out of tokens is reported as rate_limited
+        with a retry-after instead of delaying the others. Unknown platforms
+        are ignored. Returns per-platform details keyed by platform name;
+        `on_result(platform, detail)` is also called as each one is known.
+        Pass `acquire=False` when the slots were already reserved (scheduler).
+        """
+        with tracing.span('social.publish', platforms=','.join(map(str, platforms))):
+            return self._publish(content, platforms, title, bluesky_account, on_result, acquire)
+    
+    def _publish(self, content, platforms, title, bluesky_account, on_result, acquire):
+        targets = {}
+        for platform in platforms:
+            platform = platform.lower()
+            if platform in SUPPORTED_PLATFORMS:
+                targets[platform] = platform_account(platform, bluesky_account)
+        
+        details, futures = {}, {}
+        for platform, account in targets.items():
+            retry_after = self.rate_limiter.try_acquire(platform, account) if acquire else 0
+            if retry_after and is_disabled(retry_after):
+                logger.warning(f"Posting to {platform} is disabled (0 posts per hour)")
+                details[platform] = {
+                    'status': 'rate_limited',
+                    'account': account,
+                    'url': None,
+                    'retry_after_seconds': None,
+                    'error': 'Posting disabled: rate limit is 0 posts per hour'
+                }
+                metrics.PLATFORM_POSTS.labels(platform, 'rate_limited').inc()
+                if on_result:
+                    on_result(platform, details[platform])
+            elif retry_after:
+                logger.warning(f"Rate limit reached for {platform} ({account}); retry in {retry_after:.0f}s")
+                details[platform] = {
+                    'status': 'rate_limited',
+                    'account': account,
+                    'url': None,
+                    'retry_after_seconds': round(retry_after, 1)
+                }
+                metrics.PLATFORM_POSTS.labels(platform, 'rate_limited').inc()
+                if on_result:
+                    on_result(platform, details[platform])
+            else:
+                futures[self.post_executor.submit(tracing.bind(self._timed_post), platform, content, title,
+                                                  account)] = platform
+        
+        for future in as_completed(futures):
+            platform = futures[future]
+            url, duration_ms = future.result()
+            details[platform] = {
+                'status': 'posted' if url else 'failed',
+                'account': targets[platform],
+                'url': url,
+                'duration_ms': duration_ms
+            }
+            metrics.PLATFORM_POSTS.labels(platform, details[platform]['status']).inc()
+            if on_result:
+                on_result(platform, details[platform])
+        
+        return {platform: details[platform] for platform in targets}
+
 # Initialize service
 scuttle = ScuttleService()
 
+config_reloader = ConfigReloader(config, scuttle.apply_config_reload,
+                                 watch_interval=config.service_config['config_watch_interval'])
+
+def _run_post_job(job_request, on_result):
+    # Continues the trace of the request that queued the job, when there was one
+    with tracing.span('social.post_job', carrier=job_request.get('trace_context')):
+        return scuttle.publish(job_request['content'], job_request['platforms'], job_request.get('title', 'Scuttle Post'),
+                               job_request.get('bluesky_account', 'business'), on_result=on_result,
+                               acquire=not job_request.get('reserved'))
+
+post_jobs = PostJobQueue(
+    db_path=os.path.join(config.service_config['data_dir'], 'post_jobs.db'),
+    publish=_run_post_job,
+    workers=config.service_config['post_job_workers'],
+    lease_seconds=config.service_config['post_job_lease_seconds'],
+    poll_interval=config.service_config['post_job_poll_interval']
+)
+
+post_scheduler = PostScheduler(
+    db_path=os.path.join(config.service_config['data_dir'], 'scheduled_posts.db'),
+    dispatch=lambda job_request, job_id: post_jobs.submit(job_request, job_id=job_id),
+    rate_limiter=scuttle.rate_limiter
+)
+
+if not RELOADER_PARENT:
+    scuttle.start_integrations()
+    mcp.start_prober(interval=config.service_config['mcp_probe_interval'],
+                     jitter=config.service_config['mcp_probe_jitter'])
+    config_reloader.start()
+    post_jobs.start()
+    post_scheduler.start()
+
+def _refresh_metrics():
+    """Set the gauges read from the job and schedule stores"""
+    jobs = post_jobs.stats()['jobs']
+    for status in ('queued', 'running'):
+        metrics.POST_JOBS.labels(status).set(jobs[status])
+    metrics.SCHEDULED_POSTS.set(post_scheduler.stats()['scheduled'])
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus exposition of this process's metrics"""
+    if not config.service_config['metrics_enabled']:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    payload, content_type = metrics.render(_refresh_metrics)
+    return Response(payload, content_type=content_type)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     validation = config.validate_configuration()
+    readiness = scuttle.readiness()
+    if not readiness['ready']:
+        status = 'starting'
+    else:
+        status = 'healthy' if validation['valid'] else 'degraded'
     return jsonify({
         'service': 'scuttle',
-        'status': 'healthy' if validation['valid'] else 'degraded',
+        'status': status,
         'version': '2.0.0',
         'timestamp': datetime.now().isoformat(),
         'twinning_integration': 'active',
+        'readiness': readiness,
         'configuration': {
             'ai_providers': validation['ai_providers'],
             'platforms': validation['platforms'],
@@ -342,13 +776,38 @@ def service_status():
         'service': 'scuttle',
         'status': 'operational',
         'configuration': config.to_dict(),
+        'rate_limits': scuttle.rate_limiter.stats(),
+        'http': scuttle.http.stats(),
+        'identities': scuttle.identities.stats(),
+        'bluesky_sessions': scuttle.bluesky_sessions.stats(),
+        'config_reload': {
+            'version': config.version,
+            'reloads': config_reloader.reloads,
+            'last_reload': config_reloader.last_reload
+        },
+        'ai_router': scuttle.ai_router.stats(),
+        'ai_batch': scuttle.ai_batch.stats(),
+        'ai_cache': scuttle.ai_cache.stats() if scuttle.ai_cache else {'enabled': False},
+        'post_jobs': post_jobs.stats(),
+        'scheduler': post_scheduler.stats(),
         'timestamp': datetime.now().isoformat()
     })
 
 @app.route('/config', methods=['GET'])
 def get_configuration():
-    """Get current configuration"""
-    return jsonify(config.to_dict())
+    """Get current configuration, served from the pre-encoded snapshot"""
+    snapshot = config.snapshot()
+    response = Response(snapshot.json_bytes, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    return response.make_conditional(request)
+
+@app.route('/config/reload', methods=['POST'])
+def reload_configuration():
+    """Reload configuration from the env file and re-initialize changed integrations"""
+    result = config_reloader.reload('api')
+    if 'error' in result:
+        return jsonify(result), 500
+    return jsonify(result)
 
 @app.route('/api/process', methods=['POST'])
 def process_content():
@@ -358,27 +817,69 @@ def process_content():
         content = data.get('content')
         custom_prompt = data.get('custom_prompt')
         provider_type = data.get('provider_type')
+        use_cache = data.get('cache', True) and 'no-cache' not in request.headers.get('Cache-Control', '')
         
         if not content:
             return jsonify({'error': 'Content is required'}), 400
         
-        generated_content = scuttle.process_with_ai(content, custom_prompt, provider_type)
+        try:
+            result = scuttle.rewrite(content, custom_prompt, provider_type, use_cache)
+        except Exception as e:
+            logger.error(f"Error processing content with AI: {e}")
+            return jsonify({'error': 'Failed to process content', 'details': str(e)}), 500
         
-        if generated_content:
-            return jsonify({
-                'status': 'success',
-                'original_content': content,
-                'generated_content': generated_content,
-                'provider': config.get_active_ai_provider().name if config.get_active_ai_provider() else 'unknown',
-                'timestamp': datetime.now().isoformat()
-            })
-        else:
-            return jsonify({'error': 'Failed to process content'}), 500
+        return jsonify({
+            'status': 'success',
+            'original_content': content,
+            'generated_content': result['generated_content'],
+            'provider': result['provider'],
+            'cached': result['cached'],
+            'timestamp': datetime.now().isoformat()
+        })
             
     except Exception as e:
         logger.error(f"Error in process_content: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/process/batch', methods=['POST'])
+def process_content_batch():
+    """
+    Process many contents with AI; streams one NDJSON line per item as it
+    finishes, then a summary line
+    """
+    data = request.get_json() or {}
+    items = data.get('items')
+    if items is None:
+        items = [{'content': content} for content in data.get('contents', [])]
+    
+    if not items:
+        return jsonify({'error': 'items (or contents) is required'}), 400
+    if any(not isinstance(item, dict) or not item.get('content') for item in items):
+        return jsonify({'error': 'Every item needs content'}), 400
+    max_items = config.service_config['ai_batch_max_items']
+    if len(items) > max_items:
+        return jsonify({'error': f'At most {max_items} items per batch'}), 413
+    
+    def generate():
+        started = time.perf_counter()
+        succeeded = failed = 0
+        use_cache = data.get('cache', True) and 'no-cache' not in request.headers.get('Cache-Control', '')
+        for result in scuttle.process_batch(items, data.get('custom_prompt'), data.get('provider_type'), use_cache):
+            if result['status'] == 'success':
+                succeeded += 1
+            else:
+                failed += 1
+            yield json.dumps(result) + '\n'
+        yield json.dumps({'summary': {
+            'total': len(items),
+            'succeeded': succeeded,
+            'failed': failed,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'timestamp': datetime.now().isoformat()
+        }}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/post', methods=['POST'])
 def post_to_platforms():
     """Post content to social media platforms"""
@@ -390,25 +891,50 @@ def post_to_platforms():
         
         if not content:
             return jsonify({'error': 'Content is required'}), 400
+        if data.get('bluesky_account', 'business') not in BLUESKY_ACCOUNTS:
+            return jsonify({'error': f'bluesky_account must be one of {list(BLUESKY_ACCOUNTS)}'}), 400
         
-        results = {}
+        # Job mode: accept now, publish on the worker pool, poll /api/jobs/<id>
+        if data.get('async') or request.args.get('mode') == 'job':
+            job = post_jobs.submit({
+                'content': content,
+                'platforms': platforms,
+                'title': title,
+                'bluesky_account': data.get('bluesky_account', 'business'),
+                'trace_context': tracing.inject() or None
+            })
+            response = jsonify({
+                'status': 'accepted',
+                'job': job,
+                'status_url': f"/api/jobs/{job['job_id']}",
+                'stream_url': f"/api/jobs/{job['job_id']}/stream"
+            })
+            response.headers['Location'] = f"/api/jobs/{job['job_id']}"
+            return response, 202
         
-        for platform in platforms:
-            if platform.lower() == 'bluesky':
-                account_type = data.get('bluesky_account', 'business')
-                results['bluesky'] = scuttle.post_to_bluesky(content, account_type)
-                time.sleep(2)  # Rate limiting
-                
-            elif platform.lower() == 'linkedin':
-                results['linkedin'] = scuttle.post_to_linkedin(content)
-                time.sleep(3)  # Rate limiting
-                
-            elif platform.lower() == 'wordpress':
-                results['wordpress'] = scuttle.post_to_wordpress(title, content)
+        details = scuttle.publish(content, platforms, title, data.get('bluesky_account', 'business'))
+        results = {platform: detail['url'] for platform, detail in details.items()}
+        
+        limited = [d for d in details.values() if d['status'] == 'rate_limited']
+        if details and len(limited) == len(details):
+            # Disabled platforms (0 posts per hour) have no retry-after
+            waits = [d['retry_after_seconds'] for d in limited if d['retry_after_seconds'] is not None]
+            retry_after = min(waits) if waits else None
+            response = jsonify({
+                'status': 'rate_limited',
+                'results': results,
+                'platforms': details,
+                'retry_after_seconds': retry_after,
+                'timestamp': datetime.now().isoformat()
+            })
+            if retry_after is not None:
+                response.headers['Retry-After'] = str(int(retry_after) + 1)
+            return response, 429
         
         return jsonify({
             'status': 'success',
             'results': results,
+            'platforms': details,
             'timestamp': datetime.now().isoformat()
         })
         
@@ -416,6 +942,108 @@ def post_to_platforms():
         logger.error(f"Error in post_to_platforms: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs', methods=['GET'])
+def list_post_jobs():
+    """List recent post jobs, optionally filtered by status"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 500))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify({
+        'jobs': post_jobs.list(request.args.get('status'), limit),
+        'queue': post_jobs.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_post_job(job_id):
+    """Current status and per-platform results of a post job"""
+    job = post_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+def stream_post_job(job_id):
+    """NDJSON stream of a post job: one line per change until it finishes"""
+    if post_jobs.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        seen = post_jobs.version(job_id)
+        while True:
+            job = post_jobs.get(job_id)
+            yield json.dumps(job) + '\n'
+            if job['status'] in TERMINAL_STATUSES:
+                return
+            seen = post_jobs.wait_for_update(job_id, seen)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/schedule', methods=['POST'])
+def schedule_post():
+    """Schedule content to be posted at `run_at` (ISO 8601) or after `delay_seconds`"""
+    try:
+        data = request.get_json()
+        content = data.get('content')
+        platforms = [p.lower() for p in data.get('platforms', [])]
+        
+        if not content:
+            return jsonify({'error': 'Content is required'}), 400
+        unsupported = [p for p in platforms if p not in SUPPORTED_PLATFORMS]
+        if not platforms or unsupported:
+            return jsonify({'error': f'Platforms must be chosen from {list(SUPPORTED_PLATFORMS)}',
+                            'unsupported': unsupported}), 400
+        if data.get('bluesky_account', 'business') not in BLUESKY_ACCOUNTS:
+            return jsonify({'error': f'bluesky_account must be one of {list(BLUESKY_ACCOUNTS)}'}), 400
+        
+        if data.get('run_at'):
+            run_at = date_parser.isoparse(data['run_at']).timestamp()
+        else:
+            run_at = time.time() + float(data.get('delay_seconds', 0))
+        
+        scheduled = post_scheduler.schedule({
+            'content': content,
+            'platforms': platforms,
+            'title': data.get('title', 'Scuttle Post'),
+            'bluesky_account': data.get('bluesky_account', 'business')
+        }, run_at)
+        return jsonify(scheduled), 201
+        
+    except ValueError as e:
+        return jsonify({'error': f'Invalid run_at or delay_seconds: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Error in schedule_post: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/schedule', methods=['GET'])
+def list_scheduled_posts():
+    """List scheduled posts by due time (`?status=scheduled|dispatched|cancelled`)"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 500))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify({
+        'scheduled_posts': post_scheduler.list(request.args.get('status'), limit),
+        'scheduler': post_scheduler.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/api/schedule/<schedule_id>', methods=['GET'])
+def get_scheduled_post(schedule_id):
+    """A scheduled post with the IDs of the jobs it has dispatched"""
+    scheduled = post_scheduler.get(schedule_id)
+    if scheduled is None:
+        return jsonify({'error': 'Scheduled post not found'}), 404
+    return jsonify(scheduled)
+
+@app.route('/api/schedule/<schedule_id>', methods=['DELETE'])
+def cancel_scheduled_post(schedule_id):
+    """Cancel a scheduled post that has not been fully dispatched"""
+    if not post_scheduler.cancel(schedule_id):
+        return jsonify({'error': 'Scheduled post not found or already dispatched'}), 404
+    return jsonify(post_scheduler.get(schedule_id))
+
 @app.route('/api/analytics', methods=['GET'])
 def get_analytics():
     """Get social media analytics"""
@@ -481,5 +1109,5 @@ if __name__ == '__main__':
     app.run(
         host='0.0.0.0',
         port=config.service_config['service_port'],
-        debug=os.getenv('NODE_ENV') != 'production'
+        debug=DEBUG
     )
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Scuttle Tracing
+Opt-in OpenTelemetry spans with W3C trace context propagation
+"""
+
+import contextlib
+import logging
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import propagate, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    TRACING_AVAILABLE = True
+except ImportError:
+    TRACING_AVAILABLE = False
+
+_NOOP = contextlib.nullcontext()
+_tracer = None
+
+
+def _exporter(kind: str, file_path: Optional[str]):
+    if kind == 'otlp':
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    if kind == 'file':
+        out = open(file_path, 'a', buffering=1)
+        return ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + '\n')
+    return ConsoleSpanExporter()
+
+
+def configure(service_name: str, enabled: bool, sample_rate: float = 0.1, exporter: str = 'console',
+              file_path: Optional[str] = None) -> bool:
+    """
+    Install the tracer provider; returns whether tracing is on
+
+    New traces are sampled at `sample_rate`, and a caller's sampling decision
+    (the traceparent flags) is always honoured, so a trace is complete or
+    absent across services. Spans are exported off the request path in batches.
+    """
+    global _tracer
+    if not enabled:
+        return False
+    if not TRACING_AVAILABLE:
+        logger.warning("Tracing enabled but opentelemetry-sdk is not installed - running without spans")
+        return False
+    try:
+        span_exporter = _exporter(exporter, file_path)
+    except Exception as e:
+        logger.error(f"Tracing exporter '{exporter}' unavailable, running without spans: {e}")
+        return False
+
+    provider = TracerProvider(
+        resource=Resource.create({'service.name': service_name}),
+        sampler=ParentBased(TraceIdRatioBased(max(0.0, min(1.0, sample_rate))))
+    )
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer(service_name)
+    logger.info(f"Tracing enabled: {exporter} exporter, sample rate {sample_rate}")
+    return True
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, carrier: Optional[Dict[str, str]] = None, **attributes: Any):
+    """
+    Context manager timing `name` as a child of the current span, or of the
+    trace context in `carrier` (headers saved by inject()); free when tracing is off
+    """
+    if _tracer is None:
+        return _NOOP
+    parent = propagate.extract(carrier) if carrier else None
+    return _tracer.start_as_current_span(name, context=parent, attributes=attributes or None)
+
+
+def inject(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Add traceparent/tracestate for the current span to `headers`, e.g. to continue the trace in a post job"""
+    headers = {} if headers is None else headers
+    if _tracer is not None:
+        propagate.inject(headers)
+    return headers
+
+
+def bind(fn: Callable) -> Callable:
+    """Wrap `fn` to run in the caller's trace context, e.g. on an executor thread"""
+    if _tracer is None:
+        return fn
+    captured = otel_context.get_current()
+
+    def run(*args, **kwargs):
+        token = otel_context.attach(captured)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            otel_context.detach(token)
+    return run
+
+
+def instrument_app(app, exclude=('/health', '/metrics')):
+    """
+    Open a server span per request, continuing the caller's traceparent;
+    X-User-Id is recorded as enduser.id
+    """
+    if _tracer is None:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_span():
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        if route in exclude:
+            return
+        manager = _tracer.start_as_current_span(
+            f"{request.method} {route}",
+            context=propagate.extract(request.headers),
+            kind=trace.SpanKind.SERVER,
+            attributes={'http.request.method': request.method, 'http.route': route,
+                        'enduser.id': request.headers.get('X-User-Id', 'anonymous')})
+        g._trace_span = manager.__enter__()
+        g._trace_manager = manager
+
+    @app.after_request
+    def _record_status(response):
+        current = getattr(g, '_trace_span', None)
+        if current is not None:
+            current.set_attribute('http.response.status_code', response.status_code)
+            if response.status_code >= 500:
+                current.set_status(trace.Status(trace.StatusCode.ERROR))
+        return response
+
+    @app.teardown_request
+    def _end_span(error=None):
+        manager = g.pop('_trace_manager', None)
+        if manager is not None:
+            g.pop('_trace_span', None)
+            if error is not None:
+                manager.__exit__(type(error), error, error.__traceback__)
+            else:
+                manager.__exit__(None, None, None)
@@ -0,0 +1,83 @@
+const { AsyncLocalStorage } = require('async_hooks');
+const crypto = require('crypto');
+const axios = require('axios');
+
+// W3C trace context: version-traceid-parentid-flags
+const TRACEPARENT = /^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$/;
+
+const enabled = process.env.TRACING_ENABLED === 'true';
+const sampleRate = Math.min(1, Math.max(0, parseFloat(process.env.TRACING_SAMPLE_RATE || '0.1')));
+// Core writes its own spans to stdout; with any other exporter it only propagates
+const recording = enabled && (process.env.TRACING_EXPORTER || 'console').toLowerCase() === 'console';
+
+const storage = new AsyncLocalStorage();
+
+function randomHex(bytes) {
+  return crypto.randomBytes(bytes).toString('hex');
+}
+
+// Continue the caller's trace (with a span of our own when recording), or
+// start one, sampled at TRACING_SAMPLE_RATE, when tracing is enabled here
+function spanContext(req) {
+  const match = TRACEPARENT.exec(req.get('traceparent') || '');
+  if (match) {
+    return { traceId: match[1], parentId: match[2], spanId: recording ? randomHex(8) : match[2], flags: match[3] };
+  }
+  if (!enabled) {
+    return null;
+  }
+  return {
+    traceId: randomHex(16),
+    parentId: null,
+    spanId: randomHex(8),
+    flags: Math.random() < sampleRate ? '01' : '00'
+  };
+}
+
+function middleware(req, res, next) {
+  const span = spanContext(req);
+  const context = {
+    span,
+    tracestate: req.get('tracestate'),
+    userId: req.get('X-User-Id')
+  };
+
+  if (span && recording && span.flags === '01') {
+    const started = process.hrtime.bigint();
+    res.on('finish', () => {
+      console.log(JSON.stringify({
+        trace_id: span.traceId,
+        span_id: span.spanId,
+        parent_id: span.parentId,
+        name: `${req.method} ${req.baseUrl}${req.route ? req.route.path : ''}`,
+        service: 'twinning-core',
+        status: res.statusCode,
+        user_id: context.userId || 'anonymous',
+        duration_ms: Number(process.hrtime.bigint() - started) / 1e6
+      }));
+    });
+  }
+
+  storage.run(context, next);
+}
+
+// Outgoing calls to Twinning services carry the trace and the caller's X-User-Id
+axios.interceptors.request.use((config) => {
+  const context = storage.getStore();
+  if (!context) {
+    return config;
+  }
+  config.headers = config.headers || {};
+  if (context.span) {
+    config.headers.traceparent = `00-${context.span.traceId}-${context.span.spanId}-${context.span.flags}`;
+    if (context.tracestate) {
+      config.headers.tracestate = context.tracestate;
+    }
+  }
+  if (context.userId && !config.headers['X-User-Id']) {
+    config.headers['X-User-Id'] = context.userId;
+  }
+  return config;
+});
+
+module.exports = { middleware };